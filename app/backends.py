@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Protocol
+
+try:
+    # vertexai is provided by google-cloud-aiplatform
+    from vertexai import init as vertexai_init  # type: ignore
+    from vertexai.preview import caching  # type: ignore
+    from vertexai.preview.generative_models import GenerativeModel, GenerationConfig  # type: ignore
+except Exception:  # pragma: no cover - import-time fallback for environments without lib
+    vertexai_init = None
+    caching = None  # type: ignore
+    GenerativeModel = None  # type: ignore
+    GenerationConfig = None  # type: ignore
+
+
+@dataclass
+class ModelResponse:
+    text: str
+    # Token usage reported by the service; None when unavailable
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    # Part of input_tokens served from a context cache
+    cached_tokens: int | None = None
+
+
+class ModelBackend(Protocol):
+    """
+    What `GeminiClassifier` needs from a model: generate text for a list of content parts.
+
+    `system_instruction` is the static prefix shared by every call of a classifier; backends
+    may cache it server-side instead of resending it. `json_output` asks for a JSON response
+    at temperature 0 (all structured calls); it is False only for the free-text label
+    fallback. Rate limiting must surface as an exception that
+    `ratelimit.is_rate_limit_error` recognises.
+    """
+
+    def generate(
+        self, contents: List[str], json_output: bool = True, system_instruction: str | None = None
+    ) -> ModelResponse: ...
+
+    async def agenerate(
+        self, contents: List[str], json_output: bool = True, system_instruction: str | None = None
+    ) -> ModelResponse: ...
+
+
+def _usage(resp: Any) -> tuple[int | None, int | None, int | None]:
+    meta = getattr(resp, "usage_metadata", None)
+    if meta is None:
+        return None, None, None
+    return (
+        getattr(meta, "prompt_token_count", None),
+        getattr(meta, "candidates_token_count", None),
+        getattr(meta, "cached_content_token_count", None),
+    )
+
+
+@dataclass
+class _Prefix:
+    model: Any
+    cached: Any = None
+    # time.monotonic() after which the cached content must be extended
+    refresh_at: float = math.inf
+
+
+class VertexBackend:
+    """
+    Gemini on Vertex AI through the vertexai SDK.
+
+    The system instruction is bound to the model as a real system instruction, so it forms a
+    stable prefix across calls. With `context_cache` it is additionally stored once as Vertex
+    AI cached content living `cache_ttl` seconds; the TTL is extended shortly before it
+    runs out, and the cache is recreated if it has already expired. If cached content cannot
+    be created (for example the instruction is below the model's minimum cacheable size),
+    the backend logs it once and keeps sending the instruction with each call.
+    """
+
+    def __init__(
+        self,
+        project: str,
+        location: str,
+        model_name: str,
+        context_cache: bool = False,
+        cache_ttl: int = 3600,
+    ):
+        if vertexai_init is None or GenerativeModel is None:
+            raise RuntimeError(
+                "google-cloud-aiplatform (vertexai) is not available. Install dependencies and retry."
+            )
+        vertexai_init(project=project, location=location)
+        self.model_name = model_name
+        self.context_cache = context_cache and caching is not None
+        self.cache_ttl = max(60, int(cache_ttl))
+        self._model = GenerativeModel(model_name)
+        self._prefixes: Dict[str, _Prefix] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _config(json_output: bool) -> "GenerationConfig | None":
+        if not json_output:
+            return None
+        return GenerationConfig(
+            response_mime_type="application/json",
+            temperature=0.0,
+        )
+
+    def _model_for(self, system_instruction: str | None) -> Any:
+        if system_instruction is None:
+            return self._model
+        # Refreshes are rare RPCs; callers on an event loop accept the short block
+        with self._lock:
+            prefix = self._prefixes.get(system_instruction)
+            if prefix is None or time.monotonic() >= prefix.refresh_at:
+                prefix = self._build_prefix(system_instruction, prefix)
+                self._prefixes[system_instruction] = prefix
+            return prefix.model
+
+    def _build_prefix(self, system_instruction: str, old: _Prefix | None) -> _Prefix:
+        log = logging.getLogger("backends")
+        # Extend a little before expiry so in-flight calls never reference an expired cache
+        margin = min(300.0, self.cache_ttl / 4)
+        if self.context_cache:
+            if old is not None and old.cached is not None:
+                try:
+                    old.cached.update(ttl=timedelta(seconds=self.cache_ttl))
+                    old.refresh_at = time.monotonic() + self.cache_ttl - margin
+                    return old
+                except Exception as e:
+                    log.info(f"Context cache refresh failed; recreating | error={e}")
+            try:
+                cached = caching.CachedContent.create(
+                    model_name=self.model_name,
+                    system_instruction=system_instruction,
+                    ttl=timedelta(seconds=self.cache_ttl),
+                )
+                model = GenerativeModel.from_cached_content(cached_content=cached)
+                log.info(f"Context cache created | name={cached.name} | ttl={self.cache_ttl}s")
+                return _Prefix(model, cached, time.monotonic() + self.cache_ttl - margin)
+            except Exception as e:
+                log.warning(f"Context caching unavailable; sending the system instruction with each call | error={e}")
+                self.context_cache = False
+        return _Prefix(GenerativeModel(self.model_name, system_instruction=system_instruction))
+
+    def generate(
+        self, contents: List[str], json_output: bool = True, system_instruction: str | None = None
+    ) -> ModelResponse:
+        model = self._model_for(system_instruction)
+        resp = model.generate_content(contents, generation_config=self._config(json_output))
+        return ModelResponse(resp.text or "", *_usage(resp))
+
+    async def agenerate(
+        self, contents: List[str], json_output: bool = True, system_instruction: str | None = None
+    ) -> ModelResponse:
+        model = self._model_for(system_instruction)
+        resp = await model.generate_content_async(contents, generation_config=self._config(json_output))
+        return ModelResponse(resp.text or "", *_usage(resp))
+
+    def close(self) -> None:
+        """Delete cached content now instead of waiting for its TTL."""
+        with self._lock:
+            prefixes, self._prefixes = list(self._prefixes.values()), {}
+        for prefix in prefixes:
+            if prefix.cached is not None:
+                try:
+                    prefix.cached.delete()
+                except Exception as e:
+                    logging.getLogger("backends").info(f"Context cache delete failed | error={e}")
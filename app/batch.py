@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Protocol
+from uuid import uuid4
+
+from .backends import ModelResponse
+
+try:
+    # vertexai is provided by google-cloud-aiplatform
+    from vertexai import init as vertexai_init  # type: ignore
+    from vertexai.batch_prediction import BatchPredictionJob  # type: ignore
+except Exception:  # pragma: no cover - import-time fallback for environments without lib
+    vertexai_init = None
+    BatchPredictionJob = None  # type: ignore
+
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class BatchRequest:
+    # Returned with the response so results can be matched to requests in any order
+    key: str
+    contents: List[str]
+
+
+class BatchRunner(Protocol):
+    """
+    Submit, poll and fetch a batch prediction job (Vertex AI, or a local stand-in).
+
+    `submit` returns a job ID. `poll` returns `JOB_RUNNING`, `JOB_SUCCEEDED` or `JOB_FAILED`.
+    `fetch` returns the responses of a finished job by request key; requests that failed
+    inside the job are left out. `cancel` is best effort.
+    """
+
+    def submit(self, requests: List[BatchRequest], system_instruction: str | None = None) -> str: ...
+
+    def poll(self, job_id: str) -> str: ...
+
+    def fetch(self, job_id: str) -> Dict[str, ModelResponse]: ...
+
+    def cancel(self, job_id: str) -> None: ...
+
+
+@dataclass
+class BatchPrediction:
+    """When a run classifies through `runner` instead of online calls."""
+
+    runner: BatchRunner
+    # Rows a classification must cover before a batch job is used
+    min_rows: int = 0
+    poll_interval: float = 30.0
+
+
+def request_line(req: BatchRequest, system_instruction: str | None = None) -> Dict[str, Any]:
+    """One JSONL input line in the Gemini batch prediction format."""
+    body: Dict[str, Any] = {
+        "contents": [{"role": "user", "parts": [{"text": c} for c in req.contents]}],
+        # Same settings as VertexBackend uses for structured calls
+        "generationConfig": {"responseMimeType": "application/json", "temperature": 0.0},
+        # Labels are echoed in the output even where extra top-level fields are not
+        "labels": {"key": req.key},
+    }
+    if system_instruction:
+        body["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    return {"key": req.key, "request": body}
+
+
+def parse_output_line(obj: Dict[str, Any]) -> tuple[str | None, ModelResponse | None]:
+    """(request key, response) of one output line; the response is None for failed requests."""
+    request = obj.get("request") or {}
+    key = obj.get("key") or (request.get("labels") or {}).get("key")
+    response = obj.get("response")
+    # Failed requests carry an error message in `status`
+    if obj.get("status") or not isinstance(response, dict):
+        return key, None
+    candidates = response.get("candidates") or []
+    parts = ((candidates[0].get("content") or {}).get("parts") or []) if candidates else []
+    text = "".join(str(p.get("text", "")) for p in parts if isinstance(p, dict))
+    usage = response.get("usageMetadata") or {}
+    return key, ModelResponse(
+        text,
+        usage.get("promptTokenCount"),
+        usage.get("candidatesTokenCount"),
+        usage.get("cachedContentTokenCount"),
+    )
+
+
+def parse_output(lines: List[str]) -> Dict[str, ModelResponse]:
+    results: Dict[str, ModelResponse] = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        key, resp = parse_output_line(json.loads(line))
+        if key is not None and resp is not None:
+            results[key] = resp
+    return results
+
+
+class VertexBatchRunner:
+    """
+    Gemini batch prediction on Vertex AI.
+
+    Requests are staged as `gs://<bucket>/<prefix>/<name>/requests.jsonl`, and the job writes
+    its results under `.../<name>/output/`. Batch jobs use their own quota, separate from online
+    `generate_content` calls.
+    """
+
+    def __init__(self, project: str, location: str, model_name: str, bucket: str, prefix: str, client: Any = None):
+        if vertexai_init is None or BatchPredictionJob is None:
+            raise RuntimeError(
+                "google-cloud-aiplatform (vertexai) is not available. Install dependencies and retry."
+            )
+        vertexai_init(project=project, location=location)
+        self.model_name = model_name
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client = client
+        self._jobs: Dict[str, Any] = {}
+
+    def _storage(self) -> Any:
+        if self._client is None:
+            from google.cloud import storage
+
+            self._client = storage.Client()
+        return self._client
+
+    def submit(self, requests: List[BatchRequest], system_instruction: str | None = None) -> str:
+        base = f"{self.prefix}/classify-{uuid4().hex[:12]}"
+        blob = self._storage().bucket(self.bucket).blob(f"{base}/requests.jsonl")
+        body = "".join(json.dumps(request_line(r, system_instruction), ensure_ascii=False) + "\n" for r in requests)
+        blob.upload_from_string(body, content_type="application/jsonl")
+        job = BatchPredictionJob.submit(
+            source_model=self.model_name,
+            input_dataset=f"gs://{self.bucket}/{base}/requests.jsonl",
+            output_uri_prefix=f"gs://{self.bucket}/{base}/output",
+        )
+        self._jobs[job.resource_name] = job
+        logging.getLogger("batch").info(
+            f"Submitted batch prediction job | job={job.resource_name} | requests={len(requests)} | input=gs://{self.bucket}/{base}"
+        )
+        return job.resource_name
+
+    def _job(self, job_id: str) -> Any:
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._jobs[job_id] = BatchPredictionJob(job_id)
+        return job
+
+    def poll(self, job_id: str) -> str:
+        job = self._job(job_id)
+        job.refresh()
+        if not job.has_ended:
+            return JOB_RUNNING
+        return JOB_SUCCEEDED if job.has_succeeded else JOB_FAILED
+
+    def fetch(self, job_id: str) -> Dict[str, ModelResponse]:
+        location = self._job(job_id).output_location
+        bucket, _, path = location[len("gs://") :].partition("/")
+        lines: List[str] = []
+        for blob in self._storage().list_blobs(bucket, prefix=path.rstrip("/") + "/"):
+            if blob.name.endswith(".jsonl"):
+                lines.extend(blob.download_as_text().splitlines())
+        return parse_output(lines)
+
+    def cancel(self, job_id: str) -> None:
+        try:
+            self._job(job_id).cancel()
+        except Exception as e:
+            logging.getLogger("batch").warning(f"Could not cancel batch prediction job | job={job_id} | error={e}")
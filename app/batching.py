@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, List
+
+from .ratelimit import estimate_tokens
+
+# Expected output per item: {"c1": "C01", "s1": 0.95, "c2": "C02", "s2": 0.05} plus separators
+OUTPUT_TOKENS_PER_ITEM = 24
+# Per-item prompt framing ("12. " + newline)
+ITEM_OVERHEAD_TOKENS = 3
+
+
+class BatchSizeLearner:
+    """
+    Learns the largest batch size whose responses parse reliably.
+
+    Every first-attempt batch call reports its size and whether the JSON array parsed. When
+    batches of the current size or larger fail more often than `max_failure_rate`, the cap
+    shrinks by a quarter; after a streak of clean batches at the cap it grows by one, unless
+    that size is already known to be unreliable.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        max_failure_rate: float = 0.1,
+        min_samples: int = 5,
+    ):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.cap = min(max(int(initial), self.minimum), self.maximum)
+        self.max_failure_rate = float(max_failure_rate)
+        self.min_samples = max(1, int(min_samples))
+        self._stats: Dict[int, List[int]] = {}  # size -> [attempts, failures]
+        self._streak = 0
+        self._lock = threading.Lock()
+
+    def _unreliable(self, size: int) -> bool:
+        attempts = failures = 0
+        for n, (a, f) in self._stats.items():
+            if n >= size:
+                attempts += a
+                failures += f
+        return attempts >= self.min_samples and failures / attempts > self.max_failure_rate
+
+    def record(self, size: int, ok: bool) -> None:
+        with self._lock:
+            st = self._stats.setdefault(size, [0, 0])
+            st[0] += 1
+            if not ok:
+                st[1] += 1
+                self._streak = 0
+                if size >= self.cap and self._unreliable(self.cap):
+                    old = self.cap
+                    self.cap = max(self.minimum, min(self.cap - 1, int(self.cap * 0.75)))
+                    logging.getLogger("batching").info(f"Batch size cap lowered | {old} -> {self.cap}")
+                return
+            if size < self.cap:
+                return
+            self._streak += 1
+            if self._streak >= 2 * self.min_samples and self.cap < self.maximum and not self._unreliable(self.cap + 1):
+                self._streak = 0
+                self.cap += 1
+
+
+class BatchPacker:
+    """
+    Builds request batches from a queue of descriptions under token budgets.
+
+    Items are added while the estimated input tokens (prompt overhead plus items) stay within
+    `max_input_tokens`, the expected output stays within `max_output_tokens`, and the count
+    stays within the learner's current cap. Every batch holds at least one item.
+    """
+
+    def __init__(
+        self,
+        learner: BatchSizeLearner,
+        max_input_tokens: int | None = None,
+        max_output_tokens: int | None = None,
+        overhead_tokens: int = 0,
+    ):
+        self.learner = learner
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.overhead_tokens = overhead_tokens
+
+    def next_chunk(self, queue: Deque[str]) -> List[str]:
+        chunk: List[str] = []
+        in_tokens = self.overhead_tokens
+        out_tokens = 0
+        cap = self.learner.cap
+        while queue and len(chunk) < cap:
+            t = estimate_tokens(queue[0]) + ITEM_OVERHEAD_TOKENS
+            if chunk and self.max_input_tokens is not None and in_tokens + t > self.max_input_tokens:
+                break
+            if chunk and self.max_output_tokens is not None and out_tokens + OUTPUT_TOKENS_PER_ITEM > self.max_output_tokens:
+                break
+            chunk.append(queue.popleft())
+            in_tokens += t
+            out_tokens += OUTPUT_TOKENS_PER_ITEM
+        return chunk
+
+
+def fixed_chunks(descriptions: List[str], batch_size: int) -> Deque[List[str]]:
+    size = max(1, batch_size)
+    return deque(descriptions[i : i + size] for i in range(0, len(descriptions), size))
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .config import Config
+from .fakes import FakeBigQueryClient, FakeGeminiBackend, LocalBatchRunner, synthetic_invoices
+from .pipeline import run_pipeline
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _percentile(values: List[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _count_missing(path: str) -> int:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return sum(1 for r in csv.DictReader(f) if not r.get("predicted_category"))
+
+
+def run_scenario(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the full pipeline once against the fakes and return its measurements."""
+    logging.basicConfig(level=getattr(logging, params["log_level"]))
+    rows = synthetic_invoices(params["rows"], month=params["month"], unique_ratio=params["unique_ratio"], seed=params["seed"])
+    bq = FakeBigQueryClient(rows)
+    backend = FakeGeminiBackend(
+        base_latency=params["latency"],
+        per_item_latency=params["per_item_latency"],
+        rate_limit_rate=params["rate_limit_rate"],
+        malformed_rate=params["malformed_rate"],
+        partial_rate=params["partial_rate"],
+        straggler_rate=params["straggler_rate"],
+        seed=params["seed"],
+    )
+    cfg = Config(
+        gcp_project_id="bench",
+        gcp_location="local",
+        gemini_model="fake-gemini",
+        service_account_path=None,
+        table_id="bench.invoices",
+        categories_path=str(REPO_ROOT / "allowed_categories.json"),
+        gcs_bucket="unused",
+        gcs_output_prefix="unused",
+        classify_batch_size=params["batch_size"],
+        classify_concurrency=params["concurrency"],
+        classify_progress_every=None,
+        category_keywords_path=str(REPO_ROOT / "category_keywords.json") if params["prefilter"] else None,
+        category_aliases_path=str(REPO_ROOT / "category_aliases.json"),
+        category_rules_path=str(REPO_ROOT / "category_rules.json") if params["rules"] else None,
+        classify_max_input_tokens=params["max_input_tokens"],
+        gemini_call_timeout=params["call_timeout"],
+        gemini_hedge=params["hedge"],
+        batch_prediction_poll_seconds=0.05,
+        classify_cluster_threshold=params["cluster_threshold"],
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        # Outputs land in ./output; keep them out of the working tree
+        os.chdir(tmp)
+        runner = LocalBatchRunner(os.path.join(tmp, "batch"), backend) if params["batch_prediction"] else None
+        started = time.perf_counter()
+        summary = run_pipeline(
+            cfg,
+            month=params["month"],
+            dry_run=True,
+            progress_every=10**9,
+            batch_size=params["batch_size"],
+            concurrency=params["concurrency"],
+            stream=params["stream"],
+            page_size=params["page_size"],
+            engine=params["engine"],
+            prefilter=params["prefilter"],
+            checkpoint=False,
+            bq_client=bq,
+            model_backend=backend,
+            batch_runner=runner,
+        )
+        elapsed = time.perf_counter() - started
+        missing = _count_missing(summary["local_path"])
+
+    calls = sum(backend.calls.values())
+    counters = summary["metrics"]["counters"]
+    p50, p95 = _percentile(backend.latencies, 0.5), _percentile(backend.latencies, 0.95)
+    return {
+        "engine": summary["engine"],
+        "batch_size": params["batch_size"],
+        "concurrency": params["concurrency"],
+        "stream": params["stream"],
+        "rows": summary["total_rows"],
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(summary["total_rows"] / elapsed, 1) if elapsed else None,
+        "model_calls": calls,
+        "calls_per_row": round(calls / summary["total_rows"], 4) if summary["total_rows"] else None,
+        "items_sent": backend.items_requested,
+        "p50_call_s": round(p50, 3) if p50 is not None else None,
+        "p95_call_s": round(p95, 3) if p95 is not None else None,
+        "calls_by_tier": dict(backend.calls),
+        "fallback_calls": backend.calls["strict"] + backend.calls["single"] + backend.calls["label"],
+        "rate_limited": backend.rate_limited,
+        "batch_jobs": runner.jobs if runner is not None else 0,
+        "hedges": sum(v for k, v in counters.items() if k.startswith("model_hedges_total")),
+        "hedge_wins": sum(v for k, v in counters.items() if k.startswith("model_hedge_wins_total")),
+        "timeouts": sum(v for k, v in counters.items() if k.startswith("model_calls_total") and "outcome=timeout" in k),
+        "prefilter_hits": summary["prefilter_hits"],
+        "clustered": summary["clustered"],
+        "rule_hits": summary["rule_hits"],
+        "missing_predictions": missing,
+        "stage_seconds": {
+            k[len("pipeline_stage_seconds_total{stage=") : -1]: v
+            for k, v in counters.items()
+            if k.startswith("pipeline_stage_seconds_total{")
+        },
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark run_pipeline offline against a fake Gemini backend and a local BigQuery stand-in",
+    )
+    parser.add_argument("--rows", type=int, default=5000, help="Synthetic invoice rows (default: 5000)")
+    parser.add_argument("--unique-ratio", type=float, default=0.3, help="Distinct descriptions per row (default: 0.3)")
+    parser.add_argument("--month", default="09-2025", help="Month of the synthetic rows")
+    parser.add_argument("--batch-size", type=_int_list, default=[8], help="Comma-separated batch sizes to compare")
+    parser.add_argument("--concurrency", type=_int_list, default=[4], help="Comma-separated concurrencies to compare")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming (paged) pipeline")
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--no-prefilter", action="store_true", help="Disable the keyword pre-classifier")
+    parser.add_argument("--max-input-tokens", type=int, default=None, help="Token-budgeted batching (CLASSIFY_MAX_INPUT_TOKENS)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Base seconds per model call (default: 0.2)")
+    parser.add_argument("--per-item-latency", type=float, default=0.01, help="Extra seconds per item in a call")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of calls returning truncated JSON")
+    parser.add_argument("--partial-rate", type=float, default=0.0, help="Fraction of batch calls dropping items")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="Fraction of calls taking 10x as long")
+    parser.add_argument("--call-timeout", type=float, default=None, help="Per-call deadline in seconds (GEMINI_CALL_TIMEOUT)")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow calls (GEMINI_HEDGE)")
+    parser.add_argument(
+        "--cluster-threshold", type=float, default=None, help="Near-duplicate clustering (CLASSIFY_CLUSTER_THRESHOLD)"
+    )
+    parser.add_argument("--rules", action="store_true", help="Apply category_rules.json (CATEGORY_RULES_PATH)")
+    parser.add_argument(
+        "--batch-prediction", action="store_true", help="Classify through a local batch prediction stand-in"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--log-level",
+        default="WARNING",
+        choices=["CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"],
+        help="Logging level inside each run (default: WARNING)",
+    )
+    args = parser.parse_args(argv)
+
+    base = {
+        "rows": args.rows,
+        "unique_ratio": args.unique_ratio,
+        "month": args.month,
+        "engine": args.engine,
+        "stream": args.stream,
+        "page_size": args.page_size,
+        "prefilter": not args.no_prefilter,
+        "max_input_tokens": args.max_input_tokens,
+        "latency": args.latency,
+        "per_item_latency": args.per_item_latency,
+        "rate_limit_rate": args.rate_limit_rate,
+        "malformed_rate": args.malformed_rate,
+        "partial_rate": args.partial_rate,
+        "straggler_rate": args.straggler_rate,
+        "call_timeout": args.call_timeout,
+        "hedge": args.hedge,
+        "batch_prediction": args.batch_prediction,
+        "cluster_threshold": args.cluster_threshold,
+        "rules": args.rules,
+        "seed": args.seed,
+        "log_level": args.log_level,
+    }
+    ctx = multiprocessing.get_context("spawn")
+    for batch_size, concurrency in itertools.product(args.batch_size, args.concurrency):
+        params = dict(base, batch_size=batch_size, concurrency=concurrency)
+        # A fresh process per scenario so peak RSS and caches are not shared between runs
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            result = pool.submit(run_scenario, params).result()
+        print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,24 +1,53 @@
-from typing import List, Dict, Any
+from datetime import date
+from typing import List, Dict, Any, Iterator, Sequence
 import logging
+import re
+import tempfile
 
 from google.cloud import bigquery
 
+from .writers import AUDIT_COLS, PRED_COLS, ParquetOutput, enrich_row
 
-def query_invoices_by_month(
-    bq_client: bigquery.Client,
-    table_id: str,
-    month_str: str,
-    limit: int | None = None,
-) -> List[Dict[str, Any]]:
-    """
-    Query BigQuery rows for a given month (MM-YYYY) when `check_invoice_date` is stored as STRING.
-    Attempts to parse the string into DATE using common formats, then filters by month.
+try:
+    # Optional: BigQuery Storage Read API for faster Arrow-based downloads
+    from google.cloud import bigquery_storage  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    bigquery_storage = None  # type: ignore
 
-    Returns a list of dict rows containing at least: check_invoice_date, item_description, and all columns selected.
+
+_COLUMN_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _projection(alias: str, columns: List[str] | None, helper_column: str) -> str:
+    if not columns:
+        return f"{alias}.* EXCEPT({helper_column})"
+    bad = [c for c in columns if not _COLUMN_RE.match(c)]
+    if bad:
+        raise ValueError(f"invalid BigQuery column name(s): {', '.join(bad)}")
+    if "item_description" not in columns:
+        columns = list(columns) + ["item_description"]
+    return ", ".join(f"{alias}.`{c}`" for c in columns)
+
+
+def _month_query(
+    table_id: str,
+    limit: int | None,
+    stable_order: bool = False,
+    columns: List[str] | None = None,
+    month_table: str | None = None,
+) -> str:
+    if month_table:
+        # Helper table partitioned by `invoice_month` DATE: BigQuery only scans the month's partition
+        return f"""
+    SELECT {_projection("t", columns, "invoice_month")}
+    FROM `{month_table}` t
+    WHERE t.invoice_month = @month_start
+    {"ORDER BY FARM_FINGERPRINT(TO_JSON_STRING(t))" if stable_order else ""}
+    {"LIMIT @limit" if limit is not None else ""}
     """
     # Simplified for STRING month-year values like 'MM-YYYY' (or 'MM/YYYY').
     # We treat the value as the first day of that month and filter by the requested month bounds.
-    query = f"""
+    return f"""
     WITH src AS (
       SELECT
         *,
@@ -29,26 +58,365 @@ def query_invoices_by_month(
         SAFE.PARSE_DATE('%m-%Y-%d', CONCAT(@month_str, '-01')) AS start_month,
         DATE_ADD(SAFE.PARSE_DATE('%m-%Y-%d', CONCAT(@month_str, '-01')), INTERVAL 1 MONTH) AS next_month
     )
-    SELECT s.* EXCEPT(parsed_month_start)
+    SELECT {_projection("s", columns, "parsed_month_start")}
     FROM src s, bounds b
     WHERE s.parsed_month_start IS NOT NULL
       AND s.parsed_month_start >= b.start_month
       AND s.parsed_month_start < b.next_month
-    ORDER BY s.parsed_month_start
+    ORDER BY s.parsed_month_start{", FARM_FINGERPRINT(TO_JSON_STRING(s))" if stable_order else ""}
     {"LIMIT @limit" if limit is not None else ""}
     """
 
-    params: List[bigquery.ScalarQueryParameter] = [
-        bigquery.ScalarQueryParameter("month_str", "STRING", month_str),
-    ]
+
+def _month_rows_query(
+    table_id: str,
+    select: str,
+    where: str = "",
+    columns: List[str] | None = None,
+    month_table: str | None = None,
+) -> str:
+    # The month's rows as `_month_query` selects them; `select`/`where` refer to them as `m`
+    return f"""
+    WITH month_rows AS ({_month_query(table_id, None, columns=columns, month_table=month_table)}
+    ), fingerprinted AS (
+      SELECT m.*, FARM_FINGERPRINT(TO_JSON_STRING(m)) AS _row_fp
+      FROM month_rows m
+    )
+    SELECT {select}
+    FROM fingerprinted m
+    {where}
+    ORDER BY m._row_fp
+    """
+
+
+def _month_job_config(month_str: str, limit: int | None, month_table: str | None = None) -> bigquery.QueryJobConfig:
+    if month_table:
+        mm, yyyy = month_str.replace("/", "-").split("-")
+        params: List[bigquery.ScalarQueryParameter] = [
+            bigquery.ScalarQueryParameter("month_start", "DATE", date(int(yyyy), int(mm), 1)),
+        ]
+    else:
+        params = [bigquery.ScalarQueryParameter("month_str", "STRING", month_str)]
     if limit is not None:
         params.append(bigquery.ScalarQueryParameter("limit", "INT64", int(limit)))
+    return bigquery.QueryJobConfig(query_parameters=params)
+
 
-    job_config = bigquery.QueryJobConfig(query_parameters=params)
+def query_invoices_by_month(
+    bq_client: bigquery.Client,
+    table_id: str,
+    month_str: str,
+    limit: int | None = None,
+    columns: List[str] | None = None,
+    month_table: str | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Query BigQuery rows for a given month (MM-YYYY) when `check_invoice_date` is stored as STRING.
+    Attempts to parse the string into DATE using common formats, then filters by month.
+
+    Returns a list of dict rows containing at least: check_invoice_date, item_description, and all columns selected.
+
+    `columns` limits the selected columns (item_description is always included) so less
+    data is billed and transferred. `month_table` reads from a helper table partitioned by
+    an `invoice_month` DATE column instead of parsing the date of every row of `table_id`.
+    """
     log = logging.getLogger("bq")
     log.debug("Submitting BigQuery job")
-    query_job = bq_client.query(query, job_config=job_config)
+    query_job = bq_client.query(
+        _month_query(table_id, limit, columns=columns, month_table=month_table),
+        job_config=_month_job_config(month_str, limit, month_table),
+    )
     results = list(query_job.result())
     # Convert Row to dict
     rows: List[Dict[str, Any]] = [dict(row) for row in results]
     return rows
+
+
+def iter_invoice_pages(
+    bq_client: bigquery.Client,
+    table_id: str,
+    month_str: str,
+    limit: int | None = None,
+    page_size: int = 5000,
+    use_storage_api: bool = False,
+    start_index: int = 0,
+    stable_order: bool = False,
+    columns: List[str] | None = None,
+    month_table: str | None = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Same query as `query_invoices_by_month`, but yields the result in pages of at most
+    `page_size` dict rows so callers never hold the whole month in memory.
+
+    With `use_storage_api` (and google-cloud-bigquery-storage installed) pages are downloaded
+    as Arrow record batches through the BigQuery Storage Read API; otherwise the REST
+    paging API is used.
+
+    `start_index` skips rows already processed by an earlier run; pass `stable_order=True` in
+    both runs so ties within the month are ordered deterministically.
+
+    `columns` and `month_table` work as in `query_invoices_by_month`.
+    """
+    log = logging.getLogger("bq")
+    page_size = max(1, int(page_size))
+    log.debug("Submitting BigQuery job (paged)")
+    query_job = bq_client.query(
+        _month_query(table_id, limit, stable_order=stable_order, columns=columns, month_table=month_table),
+        job_config=_month_job_config(month_str, limit, month_table),
+    )
+    if start_index:
+        result = query_job.result(page_size=page_size, start_index=start_index)
+    else:
+        result = query_job.result(page_size=page_size)
+    log.info(f"BigQuery result ready | total_rows={result.total_rows} | page_size={page_size} | start_index={start_index}")
+
+    # The Storage Read API cannot start mid-result; resumed reads use REST paging
+    if use_storage_api and bigquery_storage is not None and not start_index:
+        read_client = bigquery_storage.BigQueryReadClient()
+        buf: List[Dict[str, Any]] = []
+        for batch in result.to_arrow_iterable(bqstorage_client=read_client):
+            buf.extend(batch.to_pylist())
+            while len(buf) >= page_size:
+                yield buf[:page_size]
+                buf = buf[page_size:]
+        if buf:
+            yield buf
+        return
+    if use_storage_api and bigquery_storage is None:
+        log.warning("google-cloud-bigquery-storage is not installed; falling back to REST paging")
+
+    for page in result.pages:
+        yield [dict(row) for row in page]
+
+
+def query_month_descriptions(
+    bq_client: bigquery.Client,
+    table_id: str,
+    month_str: str,
+    month_table: str | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Distinct trimmed item descriptions of the month with their row counts (`item_description`,
+    `n`), most frequent first. The aggregation runs in BigQuery, so only one row per
+    description is transferred.
+    """
+    log = logging.getLogger("bq")
+    log.debug("Submitting BigQuery distinct-description job")
+    query = f"""
+    WITH month_rows AS ({_month_query(table_id, None, columns=["item_description"], month_table=month_table)})
+    SELECT IFNULL(TRIM(CAST(item_description AS STRING)), '') AS item_description, COUNT(*) AS n
+    FROM month_rows
+    GROUP BY 1
+    ORDER BY n DESC
+    """
+    query_job = bq_client.query(query, job_config=_month_job_config(month_str, None, month_table))
+    return [dict(row) for row in query_job.result()]
+
+
+def query_month_fingerprints(
+    bq_client: bigquery.Client,
+    table_id: str,
+    month_str: str,
+    columns: List[str] | None = None,
+    month_table: str | None = None,
+) -> List[int]:
+    """
+    Fingerprint (FARM_FINGERPRINT of the row's JSON) of every row of the month, in a stable
+    order. Identical rows share a fingerprint, so the list can contain repeats.
+
+    `columns` and `month_table` work as in `query_invoices_by_month`; with `columns` the
+    fingerprint covers only the selected columns.
+    """
+    log = logging.getLogger("bq")
+    log.debug("Submitting BigQuery fingerprint job")
+    query_job = bq_client.query(
+        _month_rows_query(table_id, "m._row_fp", columns=columns, month_table=month_table),
+        job_config=_month_job_config(month_str, None, month_table),
+    )
+    return [int(row["_row_fp"]) for row in query_job.result()]
+
+
+def query_invoices_by_fingerprints(
+    bq_client: bigquery.Client,
+    table_id: str,
+    month_str: str,
+    fingerprints: List[int] | None,
+    columns: List[str] | None = None,
+    month_table: str | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rows of the month whose fingerprint is in `fingerprints` (all rows when None), each with
+    its fingerprint in a `_row_fp` column. Pass the `columns` and `month_table` given to
+    `query_month_fingerprints`.
+    """
+    job_config = _month_job_config(month_str, None, month_table)
+    where = ""
+    if fingerprints is not None:
+        if not fingerprints:
+            return []
+        job_config.query_parameters = list(job_config.query_parameters) + [
+            bigquery.ArrayQueryParameter("fps", "INT64", [int(fp) for fp in fingerprints]),
+        ]
+        where = "WHERE m._row_fp IN UNNEST(@fps)"
+    query_job = bq_client.query(
+        _month_rows_query(table_id, "m.*", where, columns=columns, month_table=month_table), job_config=job_config
+    )
+    return [dict(row) for row in query_job.result()]
+
+
+def query_invoices_by_month_range(
+    bq_client: bigquery.Client,
+    table_id: str,
+    from_month: str,
+    to_month: str,
+    columns: List[str] | None = None,
+    month_table: str | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rows of every month from `from_month` to `to_month` (MM-YYYY, inclusive) in one scan,
+    ordered by month. Each row carries its normalized month in a `_month` column (MM-YYYY).
+    `columns` and `month_table` work as in `query_invoices_by_month`.
+    """
+    log = logging.getLogger("bq")
+    log.debug("Submitting BigQuery job (month range)")
+    if month_table:
+        # Only the range's partitions of the helper table are scanned
+        query = f"""
+    SELECT {_projection("t", columns, "invoice_month")}, FORMAT_DATE('%m-%Y', t.invoice_month) AS _month
+    FROM `{month_table}` t
+    WHERE t.invoice_month BETWEEN @start_month AND @end_month
+    ORDER BY t.invoice_month
+    """
+        bounds = []
+        for name, month in (("start_month", from_month), ("end_month", to_month)):
+            mm, yyyy = month.replace("/", "-").split("-")
+            bounds.append(bigquery.ScalarQueryParameter(name, "DATE", date(int(yyyy), int(mm), 1)))
+        job_config = bigquery.QueryJobConfig(query_parameters=bounds)
+        return [dict(row) for row in bq_client.query(query, job_config=job_config).result()]
+    query = f"""
+    WITH src AS (
+      SELECT
+        *,
+        SAFE.PARSE_DATE('%m-%Y-%d', CONCAT(REPLACE(check_invoice_date, '/', '-'), '-01')) AS parsed_month_start
+      FROM `{table_id}`
+    ), bounds AS (
+      SELECT
+        SAFE.PARSE_DATE('%m-%Y-%d', CONCAT(@from_month, '-01')) AS start_month,
+        DATE_ADD(SAFE.PARSE_DATE('%m-%Y-%d', CONCAT(@to_month, '-01')), INTERVAL 1 MONTH) AS end_month
+    )
+    SELECT {_projection("s", columns, "parsed_month_start")}, FORMAT_DATE('%m-%Y', s.parsed_month_start) AS _month
+    FROM src s, bounds b
+    WHERE s.parsed_month_start IS NOT NULL
+      AND s.parsed_month_start >= b.start_month
+      AND s.parsed_month_start < b.end_month
+    ORDER BY s.parsed_month_start
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("from_month", "STRING", from_month),
+            bigquery.ScalarQueryParameter("to_month", "STRING", to_month),
+        ]
+    )
+    return [dict(row) for row in bq_client.query(query, job_config=job_config).result()]
+
+
+def _bq_type(arrow_type: Any) -> str:
+    import pyarrow as pa  # type: ignore
+
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_boolean(arrow_type):
+        return "BOOL"
+    if pa.types.is_integer(arrow_type):
+        return "INT64"
+    if pa.types.is_floating(arrow_type):
+        return "FLOAT64"
+    if pa.types.is_decimal(arrow_type):
+        return "NUMERIC"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP" if arrow_type.tz else "DATETIME"
+    if pa.types.is_binary(arrow_type):
+        return "BYTES"
+    return "STRING"
+
+
+class BigQueryOutput:
+    """
+    Output writer that loads the predictions of one month into a month-partitioned table.
+
+    Each row is reduced to `invoice_month` (DATE, first day of `month`), the `key_columns`
+    (every source column when none are given), the four prediction columns and any audit
+    columns. Rows are
+    buffered as Parquet in a temporary file and sent with a single load job on `close()`.
+    The load replaces the month's partition (`WRITE_TRUNCATE` on `table$YYYYMM`), so reruns
+    are idempotent and readers never see a partial month. The table is created partitioned
+    by month on `invoice_month` if it does not exist; new key columns are added to it.
+    """
+
+    def __init__(
+        self,
+        bq_client: bigquery.Client,
+        table_id: str,
+        month: str,
+        key_columns: List[str] | None = None,
+        row_group_size: int = 50_000,
+    ):
+        bad = [c for c in key_columns or [] if not _COLUMN_RE.match(c)]
+        if bad:
+            raise ValueError(f"invalid BigQuery column name(s): {', '.join(bad)}")
+        mm, yyyy = month.split("-")
+        self._client = bq_client
+        self.table_id = table_id
+        self.month_start = date(int(yyyy), int(mm), 1)
+        self.partition = f"{table_id}${yyyy}{mm}"
+        self.key_columns = list(key_columns or [])
+        self._file = tempfile.TemporaryFile()
+        self._parquet = ParquetOutput(self._file, row_group_size=row_group_size)
+        self.rows = 0
+
+    def _project(self, r: Dict[str, Any]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"invoice_month": self.month_start}
+        if self.key_columns:
+            out.update((c, r.get(c)) for c in self.key_columns)
+        else:
+            out.update((k, v) for k, v in r.items() if k not in PRED_COLS and k not in AUDIT_COLS)
+        out.update((c, r.get(c)) for c in PRED_COLS)
+        out.update((c, r[c]) for c in AUDIT_COLS if c in r)
+        return out
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self._parquet.write_rows([self._project(r) for r in rows])
+        self.rows += len(rows)
+
+    def write_predictions(self, rows: List[Dict[str, Any]], preds: Sequence[Dict[str, object]]) -> None:
+        self.write_rows([enrich_row(r, p) for r, p in zip(rows, preds)])
+
+    def close(self) -> None:
+        log = logging.getLogger("bq")
+        try:
+            if self.rows == 0:
+                # Nothing to load: an empty month still replaces whatever an earlier run wrote
+                self._client.delete_table(self.partition, not_found_ok=True)
+                log.info(f"Cleared results partition | partition={self.partition}")
+                return
+            self._parquet.close()
+            schema = [bigquery.SchemaField(f.name, _bq_type(f.type)) for f in self._parquet.schema]
+            partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.MONTH, field="invoice_month")
+            table = bigquery.Table(self.table_id, schema=schema)
+            table.time_partitioning = partitioning
+            self._client.create_table(table, exists_ok=True)
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                schema=schema,
+                time_partitioning=partitioning,
+                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+                schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION],
+            )
+            self._file.seek(0)
+            job = self._client.load_table_from_file(self._file, self.partition, job_config=job_config)
+            job.result()
+            log.info(f"Loaded results partition | partition={self.partition} | rows={self.rows}")
+        finally:
+            self._file.close()
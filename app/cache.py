@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+def classifier_fingerprint(
+    categories: List[str],
+    model_name: str,
+    system_instruction: str,
+    aliases: Dict[str, str] | None = None,
+) -> str:
+    """Stable fingerprint of everything that changes what the classifier would answer."""
+    payload = json.dumps(
+        {
+            "categories": categories,
+            "model": model_name,
+            "system_instruction": system_instruction,
+            "aliases": aliases or {},
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class ResultCache:
+    """
+    Persistent SQLite cache of classification results across runs.
+
+    Keys are (fingerprint, normalized description); values are the `{c1, s1, c2, s2}` dict
+    returned by the classifier. Only complete results are stored, so failed items are retried
+    on the next run. When the table grows past `max_entries`, the least recently used rows
+    are evicted. The row count is read once on open and then kept up to date by this
+    connection, so rows added by other processes sharing the file count from their next open.
+    """
+
+    def __init__(self, path: str, max_entries: int = 500_000):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS predictions (
+              fp TEXT NOT NULL,
+              key TEXT NOT NULL,
+              c1 TEXT, s1 REAL, c2 TEXT, s2 REAL,
+              last_used REAL NOT NULL,
+              PRIMARY KEY (fp, key)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions(last_used)")
+        self._conn.commit()
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()
+        with self._lock:
+            self._evict_locked()
+            self._conn.commit()
+
+    def get_many(self, fp: str, keys: Iterable[str]) -> Dict[str, Dict[str, object]]:
+        wanted = list(dict.fromkeys(keys))
+        found: Dict[str, Dict[str, object]] = {}
+        now = time.time()
+        with self._lock:
+            for key, c1, s1, c2, s2 in self._select_locked("key, c1, s1, c2, s2", fp, wanted):
+                found[key] = {"c1": c1, "s1": s1, "c2": c2, "s2": s2}
+            if found:
+                self._conn.executemany(
+                    "UPDATE predictions SET last_used = ? WHERE fp = ? AND key = ?",
+                    [(now, fp, k) for k in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(wanted) - len(found)
+        return found
+
+    def put_many(self, fp: str, results: Dict[str, Dict[str, object]]) -> int:
+        now = time.time()
+        rows = [
+            (fp, key, p.get("c1"), p.get("s1"), p.get("c2"), p.get("s2"), now)
+            for key, p in results.items()
+            if p.get("c1") is not None and p.get("s1") is not None
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            # Primary-key lookups, so the running count only grows by rows that are new
+            existing = {key for (key,) in self._select_locked("key", fp, [r[1] for r in rows])}
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO predictions (fp, key, c1, s1, c2, s2, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._count += sum(1 for r in rows if r[1] not in existing)
+            self._evict_locked()
+            self._conn.commit()
+        return len(rows)
+
+    def _select_locked(self, columns: str, fp: str, keys: List[str]) -> List[tuple]:
+        rows: List[tuple] = []
+        # SQLite limits bound parameters per statement; look up in slices
+        for i in range(0, len(keys), 500):
+            part = keys[i : i + 500]
+            marks = ",".join("?" for _ in part)
+            cur = self._conn.execute(
+                f"SELECT {columns} FROM predictions WHERE fp = ? AND key IN ({marks})",
+                [fp, *part],
+            )
+            rows.extend(cur.fetchall())
+        return rows
+
+    def _evict_locked(self) -> None:
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+        cur = self._conn.execute(
+            "DELETE FROM predictions WHERE rowid IN (SELECT rowid FROM predictions ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._count -= cur.rowcount
+        logging.getLogger("cache").info(f"Cache eviction | removed={excess} | max_entries={self.max_entries}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Protocol
+from uuid import uuid4
+
+
+class CheckpointStore(Protocol):
+    """Minimal blob store for checkpoint files (local directory or GCS prefix)."""
+
+    def write_text(self, name: str, text: str) -> None: ...
+
+    def read_text(self, name: str) -> str | None: ...
+
+    def list(self, prefix: str) -> List[str]: ...
+
+
+class LocalStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def write_text(self, name: str, text: str) -> None:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a crash never leaves a half-written checkpoint file
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        tmp.replace(path)
+
+    def read_text(self, name: str) -> str | None:
+        path = self.root / name
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def list(self, prefix: str) -> List[str]:
+        base = self.root / prefix
+        if not base.exists():
+            return []
+        return sorted(str(p.relative_to(self.root)) for p in base.rglob("*") if p.is_file() and p.suffix != ".tmp")
+
+
+class GcsStore:
+    def __init__(self, bucket: str, prefix: str):
+        from google.cloud import storage
+
+        self._bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix.strip("/")
+
+    def _path(self, name: str) -> str:
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def write_text(self, name: str, text: str) -> None:
+        self._bucket.blob(self._path(name)).upload_from_string(text, content_type="application/json")
+
+    def read_text(self, name: str) -> str | None:
+        blob = self._bucket.blob(self._path(name))
+        return blob.download_as_text() if blob.exists() else None
+
+    def list(self, prefix: str) -> List[str]:
+        strip = len(self._path(""))
+        return sorted(b.name[strip:] for b in self._bucket.list_blobs(prefix=self._path(prefix)))
+
+
+def open_store(uri: str) -> CheckpointStore:
+    """`gs://bucket/prefix` for GCS, anything else is a local directory."""
+    if uri.startswith("gs://"):
+        bucket, _, prefix = uri[len("gs://") :].partition("/")
+        return GcsStore(bucket, prefix)
+    return LocalStore(uri)
+
+
+def _classified(pred: Dict[str, object]) -> bool:
+    return pred.get("c1") is not None and pred.get("s1") is not None
+
+
+class RunCheckpoint:
+    """
+    Durable progress of one pipeline run, so a failed run can be resumed by its run ID.
+
+    - Every completed classification chunk is saved as `chunks/<seq>.json` (normalized
+      description -> prediction); a resumed run treats those as already classified.
+      Placeholders of items the model did not classify are left out, so they are retried.
+    - In streaming mode every finished page of enriched rows is saved as `pages/<n>.jsonl`
+      and the manifest records how many BigQuery rows are done, so a resumed run starts
+      reading after them and replays the saved pages into the new output.
+    """
+
+    def __init__(self, store: CheckpointStore, run_id: str, manifest: Dict[str, Any]):
+        self.store = store
+        self.run_id = run_id
+        self.manifest = manifest
+        self._lock = threading.Lock()
+        self._seq = len(store.list(f"{run_id}/chunks/"))
+
+    @classmethod
+    def create(cls, store: CheckpointStore, month: str, params: Dict[str, Any]) -> "RunCheckpoint":
+        ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        run_id = f"{month}_{ts}_{uuid4().hex[:6]}"
+        manifest = {"run_id": run_id, "month": month, "params": params, "rows_done": 0, "pages_done": 0}
+        cp = cls(store, run_id, manifest)
+        cp._save_manifest()
+        return cp
+
+    @classmethod
+    def load(cls, store: CheckpointStore, run_id: str) -> "RunCheckpoint":
+        text = store.read_text(f"{run_id}/manifest.json")
+        if text is None:
+            raise ValueError(f"No checkpoint found for run_id={run_id}")
+        return cls(store, run_id, json.loads(text))
+
+    def _save_manifest(self) -> None:
+        self.store.write_text(f"{self.run_id}/manifest.json", json.dumps(self.manifest, ensure_ascii=False))
+
+    def save_chunk(self, results: Dict[str, Dict[str, object]]) -> None:
+        # Placeholders of rate-limited or failed chunks are not kept, so a resume retries them
+        results = {k: p for k, p in results.items() if _classified(p)}
+        if not results:
+            return
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        digest = hashlib.sha1("\n".join(sorted(results)).encode("utf-8")).hexdigest()[:8]
+        self.store.write_text(f"{self.run_id}/chunks/{seq:08d}-{digest}.json", json.dumps(results, ensure_ascii=False))
+
+    def load_results(self) -> Dict[str, Dict[str, object]]:
+        out: Dict[str, Dict[str, object]] = {}
+        for name in self.store.list(f"{self.run_id}/chunks/"):
+            text = self.store.read_text(name)
+            if text:
+                out.update((k, p) for k, p in json.loads(text).items() if _classified(p))
+        return out
+
+    def save_page(self, rows: List[Dict[str, Any]], source_rows: int) -> None:
+        """Persist one finished output page, then advance the manifest past its source rows."""
+        page_no = int(self.manifest["pages_done"]) + 1
+        body = "\n".join(json.dumps(r, ensure_ascii=False, default=str) for r in rows)
+        self.store.write_text(f"{self.run_id}/pages/{page_no:06d}.jsonl", body)
+        self.manifest["pages_done"] = page_no
+        self.manifest["rows_done"] = int(self.manifest["rows_done"]) + source_rows
+        self._save_manifest()
+
+    def iter_saved_pages(self) -> Iterator[List[Dict[str, Any]]]:
+        for page_no in range(1, int(self.manifest["pages_done"]) + 1):
+            text = self.store.read_text(f"{self.run_id}/pages/{page_no:06d}.jsonl") or ""
+            yield [json.loads(line) for line in text.splitlines() if line]
+
+    def mark_complete(self, summary: Dict[str, Any]) -> None:
+        self.manifest["completed"] = True
+        self.manifest["summary"] = summary
+        self._save_manifest()
+        logging.getLogger("checkpoint").info(f"Checkpoint complete | run_id={self.run_id}")
+
+
+class IncrementalState:
+    """
+    Output of the last completed run for a month, keyed by BigQuery row fingerprint.
+
+    Stored as `incremental/<month>/rows.jsonl` (one `{"fp": ..., "row": {...}}` per output
+    row, repeats allowed) plus a small manifest. An incremental run only classifies rows whose
+    fingerprint is not covered here and reuses the stored enriched rows for the rest.
+    """
+
+    def __init__(self, store: CheckpointStore, month: str):
+        self.store = store
+        self.month = month
+        self._base = f"incremental/{month}"
+
+    def load(self) -> Dict[int, List[Dict[str, Any]]]:
+        text = self.store.read_text(f"{self._base}/rows.jsonl")
+        rows: Dict[int, List[Dict[str, Any]]] = {}
+        for line in (text or "").splitlines():
+            if line:
+                item = json.loads(line)
+                rows.setdefault(int(item["fp"]), []).append(item["row"])
+        return rows
+
+    def save(self, rows: List[tuple[int, Dict[str, Any]]], info: Dict[str, Any]) -> None:
+        body = "\n".join(json.dumps({"fp": fp, "row": r}, ensure_ascii=False, default=str) for fp, r in rows)
+        self.store.write_text(f"{self._base}/rows.jsonl", body)
+        manifest = {"month": self.month, "rows": len(rows), "updated_at": datetime.utcnow().isoformat() + "Z", **info}
+        self.store.write_text(f"{self._base}/manifest.json", json.dumps(manifest, ensure_ascii=False))
+        logging.getLogger("checkpoint").info(f"Incremental state saved | month={self.month} | rows={len(rows)}")
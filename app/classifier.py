@@ -1,20 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+import copy
 import json
 import logging
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Tuple
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, Dict, Tuple, TYPE_CHECKING
 
-try:
-    # vertexai is provided by google-cloud-aiplatform
-    from vertexai import init as vertexai_init  # type: ignore
-    from vertexai.preview.generative_models import GenerativeModel, GenerationConfig  # type: ignore
-except Exception:  # pragma: no cover - import-time fallback for environments without lib
-    vertexai_init = None
-    GenerativeModel = None  # type: ignore
+from .backends import ModelBackend, ModelResponse, VertexBackend
+from .batching import BatchPacker, BatchSizeLearner, fixed_chunks
+from .cache import classifier_fingerprint
+from .cluster import ClusterIndex
+from .metrics import REGISTRY, Metrics
+from .predictions import PredictionTable
+from .resolve import CategoryResolver
+from .ratelimit import AdaptiveConcurrency, RateLimiter, backoff_delay, estimate_tokens, is_rate_limit_error
 
-from rapidfuzz import process, fuzz
+if TYPE_CHECKING:
+    from .batch import BatchRunner
+    from .cache import ResultCache
+    from .prefilter import PreClassifier
+    from .rules import CategoryRules
 
 
 def normalize_categories(categories: List[str]) -> Dict[str, str]:
@@ -44,6 +55,44 @@ def _extract_json_object(text: str) -> str:
     return text
 
 
+def _salvage_json_objects(text: str) -> List[object]:
+    """
+    Return the elements of a JSON array in `text`, recovering every well-formed object when the
+    array as a whole does not parse (truncated output, one malformed element, stray text).
+    """
+    try:
+        arr = json.loads(_extract_json_array(text))
+        if isinstance(arr, list):
+            return arr
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    out: List[object] = []
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            obj, end = decoder.raw_decode(text, pos)
+        except ValueError:
+            pos = text.find("{", pos + 1)
+            continue
+        out.append(obj)
+        pos = text.find("{", end)
+    return out
+
+
+def _parse_index(v: object, n: int) -> int | None:
+    """Map an echoed 1-based item number to a 0-based index within a chunk of size n."""
+    try:
+        i = int(str(v).strip())
+    except Exception:
+        return None
+    return i - 1 if 1 <= i <= n else None
+
+
+def _empty_prediction() -> Dict[str, object]:
+    return {"c1": None, "s1": None, "c2": None, "s2": None}
+
+
 def _parse_score(v: object) -> float | None:
     if v is None:
         return None
@@ -62,25 +111,82 @@ def _parse_score(v: object) -> float | None:
     return f
 
 
+class ModelCallTimeout(TimeoutError):
+    """A model call (including any hedge) did not finish within the classifier's call timeout."""
+
+
+class _LatencyWindow:
+    """Durations of recent successful calls per tier, for hedging delays."""
+
+    def __init__(self, size: int = 256, min_samples: int = 20):
+        self.size = size
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._values: Dict[str, deque] = {}
+
+    def add(self, tier: str, seconds: float) -> None:
+        with self._lock:
+            self._values.setdefault(tier, deque(maxlen=self.size)).append(seconds)
+
+    def p95(self, tier: str) -> float | None:
+        with self._lock:
+            values = sorted(self._values.get(tier, ()))
+        if len(values) < self.min_samples:
+            return None
+        return values[min(len(values) - 1, int(0.95 * len(values)))]
+
+
+@contextmanager
+def _held(budget: threading.Semaphore | None) -> Iterator[None]:
+    if budget is None:
+        yield
+        return
+    with budget:
+        yield
+
+
+def _remaining(deadline: float | None, cap: float | None = None) -> float | None:
+    left = None if deadline is None else max(0.0, deadline - time.monotonic())
+    if cap is None:
+        return left
+    return cap if left is None else min(cap, left)
+
+
 class GeminiClassifier:
-    def __init__(self, project: str, location: str, model_name: str, categories: List[str]):
-        if vertexai_init is None or GenerativeModel is None:
-            raise RuntimeError(
-                "google-cloud-aiplatform (vertexai) is not available. Install dependencies and retry."
-            )
-        vertexai_init(project=project, location=location)
-        self._model = GenerativeModel(model_name)
+    # Retries per model call on 429/quota errors before giving up on it
+    max_retries: int = 4
+    # Threads for deadline/hedged sync calls; a timed-out call keeps its thread until it returns
+    call_pool_size: int = 64
+
+    def __init__(
+        self,
+        project: str,
+        location: str,
+        model_name: str,
+        categories: List[str],
+        aliases: Dict[str, str] | None = None,
+        backend: ModelBackend | None = None,
+        metrics: Metrics | None = None,
+        call_timeout: float | None = None,
+        hedge: bool = False,
+        hedge_min_delay: float = 1.0,
+    ):
+        # Any ModelBackend can stand in for Vertex AI (see app/fakes.py for the benchmark fake)
+        self._backend: ModelBackend = backend or VertexBackend(project, location, model_name)
+        # Call counts by tier, latencies and token usage; per run when the pipeline passes one
+        self.metrics = metrics or Metrics(parent=REGISTRY)
+        self._model_name = model_name
         self._categories = categories
         self._norm_map = normalize_categories(categories)
 
-        # Pre-build catalog for fuzzy matching
-        self._choices = list(self._norm_map.keys())
-
         # Build category ID mapping (C01, C02, ...) to reduce ambiguity and tokens
         self._codes: List[str] = [f"C{idx+1:02d}" for idx in range(len(categories))]
         self._id_to_name: Dict[str, str] = {code: name for code, name in zip(self._codes, categories)}
         self._name_to_id: Dict[str, str] = {name: code for code, name in self._id_to_name.items()}
 
+        # Resolution index for model labels: alias table + LRU-memoized fuzzy matching
+        self._resolver = CategoryResolver(categories, self._codes, aliases=aliases)
+
         cats_lines = "\n".join(f"- {code}: {name}" for code, name in self._id_to_name.items())
         # System instruction: require IDs only, JSON only, with disambiguation rules
         self._system_instruction = (
@@ -97,6 +203,21 @@ class GeminiClassifier:
             "- Terms implying food (kg, fresh, frozen, sliced, smoked, fillet) prefer food categories over equipment/services.\n\n"
             f"Allowed categories (ID: Name):\n{cats_lines}\n"
         )
+        # Learned batch-size cap for token-budgeted batching; created on first use
+        self._batch_learner: BatchSizeLearner | None = None
+
+        # Stragglers: give up on a call after `call_timeout` seconds; with `hedge`, send a second
+        # copy once a call has run longer than the tier's recent p95 (at least `hedge_min_delay`)
+        self.call_timeout = call_timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self._latency = _LatencyWindow()
+        self._call_pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        # Copies from `with_metrics` keep pointing here, so they share this classifier's pool
+        self._pool_owner: GeminiClassifier = self
+        # Identifies cached results that are still valid for this classifier setup
+        self.fingerprint = classifier_fingerprint(categories, model_name, self._system_instruction, aliases)
 
     def classify_batch(
         self,
@@ -105,13 +226,360 @@ class GeminiClassifier:
         batch_size: int = 8,
         concurrency: int = 4,
         deduplicate: bool = True,
-    ) -> List[Dict[str, object]]:
+        cache: "ResultCache | None" = None,
+        stats: Dict[str, int] | None = None,
+        max_input_tokens: int | None = None,
+        max_output_tokens: int | None = None,
+        max_batch_items: int | None = None,
+        preclassifiers: "List[PreClassifier] | None" = None,
+        known: Dict[str, Dict[str, object]] | None = None,
+        on_chunk_done: Callable[[Dict[str, Dict[str, object]]], None] | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+        cluster_threshold: float | None = None,
+        cluster_index: ClusterIndex | None = None,
+        rules: "CategoryRules | None" = None,
+    ) -> PredictionTable:
+        """
+        Classify descriptions and return one `{c1, s1, c2, s2}` prediction per input, in input
+        order, as a `PredictionTable` (each distinct prediction stored once, by column).
+
+        When `cache` is given, unique normalized descriptions are looked up first and only misses
+        are sent to the model; new results are written back. Hit/miss counts are added to `stats`.
+        Remaining items then pass through `preclassifiers` in order; confident local answers skip
+        the model (counted as `prefilter_hits` out of `prefilter_checked`).
+
+        `known` holds results from an earlier attempt (normalized description -> prediction) that
+        are reused as-is; `on_chunk_done` receives each chunk's results as soon as it completes,
+        e.g. to checkpoint them. `on_progress(done, total)` is called after every chunk with the
+        unique-item counters that are logged; an exception raised from it stops the run.
+
+        Batches hold `batch_size` items unless a token budget is set (`max_input_tokens` and/or
+        `max_output_tokens`); then each request is packed up to the budget, with the item count
+        capped by a size learned from parse failures (starting at `batch_size`, at most
+        `max_batch_items`).
+
+        At most `concurrency` model calls are in flight; single-item fallbacks of a chunk run in
+        parallel within that budget.
+
+        With `cluster_threshold` (and `deduplicate`), near-duplicate descriptions are grouped
+        first (`cluster.cluster_descriptions`) and only one representative per group goes
+        through the cache, pre-classifiers and model. Every result then carries the
+        `representative` description whose answer it uses. A `cluster_index`
+        (`cluster.ClusterIndex`) replaces the threshold and keeps clusters across calls, e.g.
+        the pages of a streamed month; a representative from an earlier call is looked up in
+        `cache` like any other description.
+
+        `rules` (`rules.CategoryRules`) correct the unique predictions after classification;
+        cached and checkpointed results stay as the model gave them, so rule changes apply to
+        them on the next run. Rule changes are counted in `stats["rule_hits"]` and in
+        `rule_hits_total` by rule.
+        """
         log = logging.getLogger("classifier")
 
         total = len(descriptions)
         if total == 0:
-            return []
+            return self._final([], {}, {})
+
+        norm_order, uniq_descs, mapping, clusters = self._prepare_unique(
+            descriptions, deduplicate, cache, stats, preclassifiers, known, cluster_threshold, cluster_index
+        )
+        next_chunk = self._chunker(uniq_descs, batch_size, max_input_tokens, max_output_tokens, max_batch_items)
+
+        done = 0
+        workers = max(1, concurrency)
+        # Model calls in flight across all chunks, including parallel single-item fallbacks
+        budget = threading.BoundedSemaphore(workers)
+
+        def do_chunk(chunk: List[str]) -> List[Dict[str, object]]:
+            started = time.perf_counter()
+            res = self._classify_chunk(chunk, budget)
+            self.metrics.observe("chunk_seconds", time.perf_counter() - started)
+            return res
 
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Chunks are built lazily so a learned batch size applies to the rest of the run
+            pending: Dict[Future, List[str]] = {}
+            try:
+                while True:
+                    while len(pending) < 2 * workers:
+                        chunk = next_chunk()
+                        if not chunk:
+                            break
+                        pending[pool.submit(do_chunk, chunk)] = chunk
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        chunk = pending.pop(fut)
+                        res = fut.result()
+                        self._store_chunk(chunk, res, mapping, cache, on_chunk_done)
+                        done += len(res)
+                        interval = max(1, progress_every)
+                        if done % interval == 0 or done >= len(uniq_descs):
+                            log.info(f"Classification progress | done={done}/{len(uniq_descs)} (unique)")
+                        if on_progress is not None:
+                            on_progress(done, len(uniq_descs))
+            except BaseException:
+                # Don't start queued chunks; in-flight calls finish before the pool exits and
+                # are still stored, so a checkpointed run doesn't pay for them again on resume
+                running = [fut for fut in pending if not fut.cancel()]
+                for fut in running:
+                    try:
+                        res = fut.result()
+                    except Exception:
+                        continue
+                    self._store_chunk(pending[fut], res, mapping, cache, on_chunk_done)
+                raise
+
+        # Map back to original order
+        return self._final(norm_order, mapping, clusters, rules, stats)
+
+    async def classify_batch_async(
+        self,
+        descriptions: List[str],
+        progress_every: int = 1,
+        batch_size: int = 8,
+        concurrency: int = 4,
+        deduplicate: bool = True,
+        cache: "ResultCache | None" = None,
+        stats: Dict[str, int] | None = None,
+        limiter: RateLimiter | None = None,
+        max_concurrency: int | None = None,
+        target_latency: float | None = None,
+        max_input_tokens: int | None = None,
+        max_output_tokens: int | None = None,
+        max_batch_items: int | None = None,
+        preclassifiers: "List[PreClassifier] | None" = None,
+        known: Dict[str, Dict[str, object]] | None = None,
+        on_chunk_done: Callable[[Dict[str, Dict[str, object]]], None] | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+        cluster_threshold: float | None = None,
+        cluster_index: ClusterIndex | None = None,
+        rules: "CategoryRules | None" = None,
+    ) -> PredictionTable:
+        """
+        Asyncio variant of `classify_batch` built on `generate_content_async`.
+
+        Calls go through `limiter` (requests/min and tokens/min) and an AIMD concurrency limit
+        that starts at `concurrency`, halves on 429/quota errors and grows back while latency
+        stays healthy, up to `max_concurrency`. Healthy means under `target_latency` seconds,
+        or when that is unset, within twice the baseline latency observed during the run.
+        """
+        log = logging.getLogger("classifier")
+
+        total = len(descriptions)
+        if total == 0:
+            return self._final([], {}, {})
+
+        norm_order, uniq_descs, mapping, clusters = self._prepare_unique(
+            descriptions, deduplicate, cache, stats, preclassifiers, known, cluster_threshold, cluster_index
+        )
+        next_chunk = self._chunker(uniq_descs, batch_size, max_input_tokens, max_output_tokens, max_batch_items)
+
+        ctl = AdaptiveConcurrency(
+            initial=max(1, concurrency),
+            maximum=max(max(1, concurrency), max_concurrency or 4 * max(1, concurrency)),
+            target_latency=target_latency,
+        )
+        limiter = limiter or RateLimiter()
+        done = 0
+
+        async def do_chunk(chunk: List[str]) -> List[Dict[str, object]]:
+            started = time.perf_counter()
+            res = await self._aclassify_chunk(chunk, ctl, limiter)
+            self.metrics.observe("chunk_seconds", time.perf_counter() - started)
+            return res
+
+        pending: Dict[asyncio.Task, List[str]] = {}
+        try:
+            while True:
+                # Keep a little more work queued than the current concurrency limit allows to run
+                while len(pending) < 2 * int(ctl.limit):
+                    chunk = next_chunk()
+                    if not chunk:
+                        break
+                    pending[asyncio.ensure_future(do_chunk(chunk))] = chunk
+                if not pending:
+                    break
+                finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    chunk = pending.pop(task)
+                    res = task.result()
+                    self._store_chunk(chunk, res, mapping, cache, on_chunk_done)
+                    done += len(res)
+                    interval = max(1, progress_every)
+                    if done % interval == 0 or done >= len(uniq_descs):
+                        log.info(
+                            f"Classification progress | done={done}/{len(uniq_descs)} (unique) | concurrency_limit={int(ctl.limit)}"
+                        )
+                    if on_progress is not None:
+                        on_progress(done, len(uniq_descs))
+        except BaseException:
+            # Cancel the rest and wait for them to unwind; chunks that completed before the
+            # cancellation landed are still stored, so a checkpointed resume doesn't repeat them
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task, chunk in pending.items():
+                if not task.cancelled() and task.exception() is None:
+                    self._store_chunk(chunk, task.result(), mapping, cache, on_chunk_done)
+            raise
+
+        return self._final(norm_order, mapping, clusters, rules, stats)
+
+    def classify_batch_job(
+        self,
+        descriptions: List[str],
+        runner: "BatchRunner",
+        poll_interval: float = 30.0,
+        progress_every: int = 1,
+        batch_size: int = 8,
+        concurrency: int = 4,
+        deduplicate: bool = True,
+        cache: "ResultCache | None" = None,
+        stats: Dict[str, int] | None = None,
+        max_input_tokens: int | None = None,
+        max_output_tokens: int | None = None,
+        max_batch_items: int | None = None,
+        preclassifiers: "List[PreClassifier] | None" = None,
+        known: Dict[str, Dict[str, object]] | None = None,
+        on_chunk_done: Callable[[Dict[str, Dict[str, object]]], None] | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+        cluster_threshold: float | None = None,
+        cluster_index: ClusterIndex | None = None,
+        rules: "CategoryRules | None" = None,
+    ) -> PredictionTable:
+        """
+        Variant of `classify_batch` that sends its chunks as one batch prediction job.
+
+        Chunks are built as for online calls and each becomes one request with the
+        `_classify_chunk` prompt; responses are parsed and validated the same way. Items the job
+        did not answer (failed requests, invalid or missing output) go through the online
+        fallback tiers with at most `concurrency` calls in flight. The job is polled every
+        `poll_interval` seconds and `on_progress` is called on each poll; an exception raised
+        from it cancels the job.
+        """
+        from .batch import JOB_RUNNING, JOB_SUCCEEDED, BatchRequest
+
+        log = logging.getLogger("classifier")
+
+        total = len(descriptions)
+        if total == 0:
+            return self._final([], {}, {})
+
+        norm_order, uniq_descs, mapping, clusters = self._prepare_unique(
+            descriptions, deduplicate, cache, stats, preclassifiers, known, cluster_threshold, cluster_index
+        )
+        next_chunk = self._chunker(uniq_descs, batch_size, max_input_tokens, max_output_tokens, max_batch_items)
+        chunks = list(iter(next_chunk, []))
+        if not chunks:
+            return self._final(norm_order, mapping, clusters, rules, stats)
+
+        requests = [
+            BatchRequest(f"{i:06d}", [self._chunk_prompt(self._chunk_items(chunk))]) for i, chunk in enumerate(chunks)
+        ]
+        started = time.perf_counter()
+        job_id = runner.submit(requests, system_instruction=self._system_instruction)
+        log.info(f"Batch prediction job submitted | job={job_id} | requests={len(requests)} | items={len(uniq_descs)}")
+        try:
+            while True:
+                state = runner.poll(job_id)
+                if state != JOB_RUNNING:
+                    break
+                if on_progress is not None:
+                    on_progress(0, len(uniq_descs))
+                time.sleep(poll_interval)
+        except BaseException:
+            runner.cancel(job_id)
+            raise
+        self.metrics.inc("batch_jobs_total", state=state)
+        self.metrics.observe("batch_job_seconds", time.perf_counter() - started)
+        if state == JOB_SUCCEEDED:
+            responses = runner.fetch(job_id)
+        else:
+            # Everything is retried online below, as if each request had failed
+            log.warning(f"Batch prediction job did not succeed; classifying online | job={job_id} | state={state}")
+            responses = {}
+        log.info(f"Batch prediction job finished | job={job_id} | state={state} | responses={len(responses)}/{len(requests)}")
+
+        results: List[List[Dict[str, object] | None]] = []
+        for req, chunk in zip(requests, chunks):
+            resp = responses.get(req.key)
+            if resp is None:
+                parsed: List[Dict[str, object] | None] = [None] * len(chunk)
+            else:
+                self._record_tokens(resp)
+                parsed = self._parse_chunk(resp.text, len(chunk))
+                self._record_batch(len(chunk), all(p is not None for p in parsed))
+            results.append(parsed)
+
+        done = 0
+        workers = max(1, concurrency)
+        budget = threading.BoundedSemaphore(workers)
+
+        def finish(i: int) -> List[Dict[str, object]]:
+            parsed = results[i]
+            missing = [j for j, p in enumerate(parsed) if p is None]
+            if missing:
+                retried = self._classify_chunk([chunks[i][j] for j in missing], budget)
+                for j, p in zip(missing, retried):
+                    parsed[j] = p
+            return parsed  # type: ignore[return-value]
+
+        self.metrics.inc("batch_job_fallback_items_total", sum(p is None for parsed in results for p in parsed))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, res in enumerate(pool.map(finish, range(len(chunks)))):
+                self._store_chunk(chunks[i], res, mapping, cache, on_chunk_done)
+                done += len(res)
+                interval = max(1, progress_every)
+                if done % interval == 0 or done >= len(uniq_descs):
+                    log.info(f"Classification progress | done={done}/{len(uniq_descs)} (unique)")
+                if on_progress is not None:
+                    on_progress(done, len(uniq_descs))
+
+        return self._final(norm_order, mapping, clusters, rules, stats)
+
+    @property
+    def categories(self) -> List[str]:
+        """Allowed category names, in `_codes` order."""
+        return self._categories
+
+    def with_metrics(self, metrics: Metrics) -> "GeminiClassifier":
+        """
+        Shallow copy sharing the backend, prompt, label resolver and call pool that records into
+        `metrics`. Copies need no `close`; closing this classifier releases what they share.
+        """
+        clone = copy.copy(self)
+        clone.metrics = metrics
+        return clone
+
+    def close(self) -> None:
+        """Release backend resources such as cached content."""
+        close = getattr(self._backend, "close", None)
+        if close is not None:
+            close()
+        with self._pool_lock:
+            pool, self._call_pool = self._call_pool, None
+        if pool is not None:
+            # Don't wait for calls that were abandoned after their deadline
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _prepare_unique(
+        self,
+        descriptions: List[str],
+        deduplicate: bool,
+        cache: "ResultCache | None",
+        stats: Dict[str, int] | None,
+        preclassifiers: "List[PreClassifier] | None" = None,
+        known: Dict[str, Dict[str, object]] | None = None,
+        cluster_threshold: float | None = None,
+        cluster_index: ClusterIndex | None = None,
+    ) -> Tuple[List[str], List[str], Dict[str, Dict[str, object]], Dict[str, str]]:
+        """
+        Return (normalized key per input, descriptions to classify, results known so far,
+        representative description per normalized key when clustering).
+        """
+        log = logging.getLogger("classifier")
         # Optional deduplication: classify unique descriptions only
         if deduplicate:
             norm_order: List[str] = []
@@ -127,112 +595,467 @@ class GeminiClassifier:
             uniq_descs = descriptions
             norm_order = [_norm(d) for d in descriptions]
 
-        chunks: List[List[str]] = [
-            uniq_descs[i : i + max(1, batch_size)] for i in range(0, len(uniq_descs), max(1, batch_size))
-        ]
+        # Near-duplicates: only each cluster's representative is looked up or classified
+        clusters: Dict[str, str] = {}
+        if deduplicate and (cluster_threshold is not None or cluster_index is not None) and uniq_descs:
+            counts = Counter(norm_order)
+            if cluster_index is None:
+                cluster_index = ClusterIndex(cluster_threshold)  # type: ignore[arg-type]
+            reps = cluster_index.assign(uniq_descs, [counts[_norm(d)] for d in uniq_descs])
+            clusters = {_norm(d): r for d, r in zip(uniq_descs, reps)}
+            uniq_descs = list(dict.fromkeys(reps))
+            log.info(f"Clustered near-duplicates | descriptions={len(clusters)} | clusters={len(uniq_descs)}")
+            if stats is not None:
+                # Descriptions answered by another one, which may be from an earlier call
+                reused = sum(1 for k, r in clusters.items() if _norm(r) != k)
+                stats["clustered"] = stats.get("clustered", 0) + reused
 
-        done = 0
-        preds_unique: List[Dict[str, object]] = []
+        # Results carried over from an interrupted run need no further work
+        resumed: Dict[str, Dict[str, object]] = {}
+        if known:
+            resumed = {k: known[k] for k in (_norm(d) for d in uniq_descs) if k in known}
+            if resumed:
+                uniq_descs = [d for d in uniq_descs if _norm(d) not in resumed]
+                log.info(f"Reusing checkpointed results | count={len(resumed)}")
+            if stats is not None:
+                stats["resumed"] = stats.get("resumed", 0) + len(resumed)
 
-        def do_chunk(chunk: List[str]) -> List[Dict[str, object]]:
-            return self._classify_chunk(chunk)
+        # Persistent cache: resolve known descriptions before chunking
+        cached: Dict[str, Dict[str, object]] = dict(resumed)
+        if cache is not None:
+            from_cache = cache.get_many(self.fingerprint, (_norm(d) for d in uniq_descs))
+            if from_cache:
+                uniq_descs = [d for d in uniq_descs if _norm(d) not in from_cache]
+                cached.update(from_cache)
+            log.info(f"Cache lookup | hits={len(from_cache)} | misses={len(uniq_descs)}")
+            if stats is not None:
+                stats["cache_hits"] = stats.get("cache_hits", 0) + len(from_cache)
+                stats["cache_misses"] = stats.get("cache_misses", 0) + len(uniq_descs)
+        # Results keyed by normalized description; chunks complete out of order
+        known: Dict[str, Dict[str, object]] = dict(cached)
 
-        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
-            future_map = {pool.submit(do_chunk, ch): idx for idx, ch in enumerate(chunks)}
-            for fut in as_completed(future_map):
-                res = fut.result()
-                preds_unique.extend(res)
-                done += len(res)
-                interval = max(1, progress_every)
-                if done % interval == 0 or done >= len(uniq_descs):
-                    log.info(f"Classification progress | done={done}/{len(uniq_descs)} (unique)")
+        # Local pre-classifiers answer confident items without a model call
+        if preclassifiers:
+            checked = len(uniq_descs)
+            remaining: List[str] = []
+            for d in uniq_descs:
+                pred = None
+                for pc in preclassifiers:
+                    pred = pc.predict(d)
+                    if pred is not None:
+                        break
+                if pred is None:
+                    remaining.append(d)
+                else:
+                    known[_norm(d)] = pred
+            hits = checked - len(remaining)
+            uniq_descs = remaining
+            log.info(f"Pre-classifier | short_circuited={hits}/{checked}")
+            if stats is not None:
+                stats["prefilter_checked"] = stats.get("prefilter_checked", 0) + checked
+                stats["prefilter_hits"] = stats.get("prefilter_hits", 0) + hits
+        return norm_order, uniq_descs, known, clusters
 
-        # Map back to original order
-        mapping: Dict[str, Dict[str, object]] = {}
-        for d, p in zip(uniq_descs, preds_unique):
-            mapping[_norm(d)] = p
-        final: List[Dict[str, object]] = [mapping[k] for k in norm_order]
-        return final
+    def _final(
+        self,
+        norm_order: List[str],
+        mapping: Dict[str, Dict[str, object]],
+        clusters: Dict[str, str],
+        rules: "CategoryRules | None" = None,
+        stats: Dict[str, int] | None = None,
+    ) -> PredictionTable:
+        if rules is not None:
+            used = dict.fromkeys(_norm(r) for r in clusters.values()) if clusters else dict.fromkeys(norm_order)
+            mapping = self._apply_rules(rules, {k: mapping[k] for k in used}, stats)
+        if not clusters:
+            return PredictionTable.from_keys(self._categories, norm_order, mapping)
+        # Every member takes its representative's answer, with the representative for auditing
+        by_rep = {r: {**mapping[_norm(r)], "representative": r} for r in set(clusters.values())}
+        return PredictionTable.from_keys(self._categories, [clusters[k] for k in norm_order], by_rep)
 
-    def _classify_chunk(self, descriptions: List[str]) -> List[Dict[str, object]]:
-        if not descriptions:
-            return []
+    def _apply_rules(
+        self, rules: "CategoryRules", predictions: Dict[str, Dict[str, object]], stats: Dict[str, int] | None = None
+    ) -> Dict[str, Dict[str, object]]:
+        """`predictions` (normalized description -> prediction) corrected by `rules`, with hits recorded."""
+        corrected, hits = rules.apply(predictions)
+        for name, n in hits.items():
+            self.metrics.inc("rule_hits_total", n, rule=name)
+        total = sum(hits.values())
+        if stats is not None:
+            stats["rule_hits"] = stats.get("rule_hits", 0) + total
+        if total:
+            logging.getLogger("classifier").info(
+                f"Category rules | hits={total} | unique={len(predictions)} | "
+                + " | ".join(f"{name}={n}" for name, n in sorted(hits.items()))
+            )
+        return corrected
 
-        items = "\n".join(f"{i+1}. {d}" for i, d in enumerate(descriptions))
-        prompt = (
+    def _chunker(
+        self,
+        uniq_descs: List[str],
+        batch_size: int,
+        max_input_tokens: int | None,
+        max_output_tokens: int | None,
+        max_batch_items: int | None,
+    ) -> Callable[[], List[str]]:
+        """Return a function producing the next chunk to classify ([] when exhausted)."""
+        if max_input_tokens is None and max_output_tokens is None:
+            chunks = fixed_chunks(uniq_descs, batch_size)
+            return lambda: chunks.popleft() if chunks else []
+        if self._batch_learner is None:
+            self._batch_learner = BatchSizeLearner(initial=batch_size, maximum=max_batch_items or 64)
+        packer = BatchPacker(
+            self._batch_learner,
+            max_input_tokens=max_input_tokens,
+            max_output_tokens=max_output_tokens,
+            overhead_tokens=estimate_tokens(self._system_instruction) + estimate_tokens(self._chunk_prompt("")),
+        )
+        queue = deque(uniq_descs)
+        return lambda: packer.next_chunk(queue)
+
+    def _record_batch(self, size: int, ok: bool) -> None:
+        if self._batch_learner is not None:
+            self._batch_learner.record(size, ok)
+
+    def _store_chunk(
+        self,
+        chunk: List[str],
+        res: List[Dict[str, object]],
+        mapping: Dict[str, Dict[str, object]],
+        cache: "ResultCache | None",
+        on_chunk_done: Callable[[Dict[str, Dict[str, object]]], None] | None = None,
+    ) -> None:
+        chunk_results = {_norm(d): p for d, p in zip(chunk, res)}
+        mapping.update(chunk_results)
+        if cache is not None:
+            cache.put_many(self.fingerprint, chunk_results)
+        if on_chunk_done is not None:
+            on_chunk_done(chunk_results)
+
+    # Prompt builders and response parsers shared by the thread and asyncio engines
+
+    @staticmethod
+    def _chunk_items(descriptions: List[str]) -> str:
+        return "\n".join(f"{i+1}. {d}" for i, d in enumerate(descriptions))
+
+    @staticmethod
+    def _chunk_prompt(items: str) -> str:
+        return (
             "You will receive a numbered list of item descriptions.\n"
             "For each item, choose the two most relevant category IDs (e.g., C01) from the allowed list.\n"
             "Return ONLY a JSON array with one object per item, no extra text.\n"
-            "Each object must be: {\"c1\": <ID>, \"s1\": <0..1>, \"c2\": <ID>, \"s2\": <0..1>}\n\n"
+            "Each object must be: {\"i\": <item number>, \"c1\": <ID>, \"s1\": <0..1>, \"c2\": <ID>, \"s2\": <0..1>}\n\n"
             f"Items:\n{items}\n\n"
             "Respond with a JSON array of objects as specified."
         )
-        try:
-            resp = self._model.generate_content(
-                [self._system_instruction, prompt],
-                generation_config=GenerationConfig(
-                    response_mime_type="application/json",
-                    temperature=0.0,
-                ),
-            )
-            text = (resp.text or "").strip()
-            json_str = _extract_json_array(text)
-            arr = json.loads(json_str)
-            if isinstance(arr, list) and len(arr) == len(descriptions):
-                out: List[Dict[str, object]] = []
-                for obj in arr:
-                    c1, s1, c2, s2 = self._validate_top2(obj)
-                    out.append({"c1": c1, "s1": s1, "c2": c2, "s2": s2})
-                return out
-        except Exception:
-            pass
-        # Retry once with a shorter strict prompt
-        try:
-            strict = (
-                "Return ONLY a JSON array of objects, one per item. Use category IDs only (e.g., C01). "
-                "Each object: {\"c1\": <ID>, \"s1\": <0..1>, \"c2\": <ID>, \"s2\": <0..1>}"
-            )
-            resp = self._model.generate_content(
-                [self._system_instruction, strict, items],
-                generation_config=GenerationConfig(
-                    response_mime_type="application/json",
-                    temperature=0.0,
-                ),
-            )
-            text = (resp.text or "").strip()
-            json_str = _extract_json_array(text)
-            arr = json.loads(json_str)
-            if isinstance(arr, list) and len(arr) == len(descriptions):
-                out = []
-                for obj in arr:
-                    c1, s1, c2, s2 = self._validate_top2(obj)
-                    out.append({"c1": c1, "s1": s1, "c2": c2, "s2": s2})
-                return out
-        except Exception:
-            pass
-        # Fallback to single calls for this chunk (no guessing; return nulls if model fails)
-        out: List[Dict[str, object]] = []
-        for d in descriptions:
-            c1, s1, c2, s2 = self._classify_single_top2(d)
-            out.append({"c1": c1, "s1": s1, "c2": c2, "s2": s2})
-        return out
-
-    def _classify_single_top2(self, description: str) -> Tuple[str | None, float | None, str | None, float | None]:
-        prompt = (
+
+    @staticmethod
+    def _strict_prompt() -> str:
+        return (
+            "Return ONLY a JSON array of objects, one per item. Use category IDs only (e.g., C01). "
+            "Each object: {\"i\": <item number>, \"c1\": <ID>, \"s1\": <0..1>, \"c2\": <ID>, \"s2\": <0..1>}"
+        )
+
+    @staticmethod
+    def _single_prompt(description: str) -> str:
+        return (
             f"Item description: {description}\n"
             "Choose the two most relevant category IDs from the allowed list (e.g., C01).\n"
             "Return ONLY JSON object: {\"c1\": <ID>, \"s1\": <0..1>, \"c2\": <ID>, \"s2\": <0..1>}"
         )
+
+    def _parse_chunk(self, text: str, n: int) -> List[Dict[str, object] | None]:
+        """
+        Parse a batch response tolerantly and return one entry per item (None when missing/invalid).
+
+        Objects are aligned by their echoed item number `i` when every object carries a valid
+        one, by position when the count matches, and otherwise only the indexed objects are kept.
+        """
+        # Parsing plus label resolution, reported as the "validate" stage
+        with self.metrics.stage("validate"):
+            objs = [o for o in _salvage_json_objects(text.strip()) if isinstance(o, dict)]
+            out: List[Dict[str, object] | None] = [None] * n
+            indices = [_parse_index(o.get("i"), n) for o in objs]
+            if objs and all(i is not None for i in indices) and len(set(indices)) == len(indices):
+                pairs = list(zip(indices, objs))
+            elif len(objs) == n:
+                pairs = list(enumerate(objs))
+            else:
+                pairs = [(i, o) for i, o in zip(indices, objs) if i is not None]
+            # Score all unresolved labels of the chunk in one pass before validating item by item
+            self._resolver.prime(
+                str(o.get(k, "")).strip() for _, o in pairs for k in ("c1", "c2") if str(o.get(k, "")).strip() not in self._id_to_name
+            )
+            for i, obj in pairs:
+                if not obj.get("c1"):
+                    continue
+                c1, s1, c2, s2 = self._validate_top2(obj)
+                if c1 is not None:
+                    out[i] = {"c1": c1, "s1": s1, "c2": c2, "s2": s2}
+            return out
+
+    def _record_call(self, tier: str, started: float, resp: ModelResponse | None = None, exc: Exception | None = None) -> None:
+        m = self.metrics
+        if exc is None:
+            outcome = "ok"
+        elif isinstance(exc, TimeoutError):
+            outcome = "timeout"
+        else:
+            outcome = "rate_limited" if is_rate_limit_error(exc) else "error"
+        m.inc("model_calls_total", tier=tier, outcome=outcome)
+        m.observe("model_call_seconds", time.perf_counter() - started, tier=tier)
+        if resp is not None:
+            self._record_tokens(resp)
+
+    def _record_tokens(self, resp: ModelResponse) -> None:
+        m = self.metrics
+        if resp.input_tokens:
+            m.inc("model_tokens_total", resp.input_tokens, kind="input")
+        if resp.output_tokens:
+            m.inc("model_tokens_total", resp.output_tokens, kind="output")
+        if resp.cached_tokens:
+            m.inc("model_tokens_total", resp.cached_tokens, kind="cached")
+
+    def _pool(self) -> ThreadPoolExecutor:
+        owner = self._pool_owner
+        with owner._pool_lock:
+            if owner._call_pool is None:
+                owner._call_pool = ThreadPoolExecutor(
+                    max_workers=owner.call_pool_size, thread_name_prefix="model-call"
+                )
+            return owner._call_pool
+
+    def _hedge_delay(self, tier: str) -> float | None:
+        if not self.hedge:
+            return None
+        p95 = self._latency.p95(tier)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def _call(self, contents: List[str], tier: str, budget: threading.Semaphore | None) -> ModelResponse:
+        """One logical model call under `budget`, with the call timeout and hedging applied."""
+        delay = self._hedge_delay(tier)
+        if self.call_timeout is None and delay is None:
+            with _held(budget):
+                return self._backend.generate(contents, system_instruction=self._system_instruction)
+
+        def call() -> ModelResponse:
+            return self._backend.generate(contents, system_instruction=self._system_instruction)
+
+        deadline = None if self.call_timeout is None else time.monotonic() + self.call_timeout
+        pool = self._pool()
+        hedge_slot = False
+        with _held(budget):
+            primary = pool.submit(call)
+            futures = [primary]
+            try:
+                if delay is not None:
+                    wait(futures, timeout=_remaining(deadline, delay))
+                    if not primary.done() and _remaining(deadline) != 0.0:
+                        # A hedge only uses spare budget; it never delays other chunks
+                        hedge_slot = budget is not None and budget.acquire(blocking=False)
+                        if budget is None or hedge_slot:
+                            futures.append(pool.submit(call))
+                            self.metrics.inc("model_hedges_total", tier=tier)
+                error: BaseException | None = None
+                pending = list(futures)
+                while pending:
+                    finished, _ = wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+                    if not finished:
+                        raise ModelCallTimeout(f"model call exceeded {self.call_timeout}s")
+                    for fut in finished:
+                        pending.remove(fut)
+                        if fut.exception() is None:
+                            if fut is not primary:
+                                self.metrics.inc("model_hedge_wins_total", tier=tier)
+                            return fut.result()
+                        error = fut.exception()
+                raise error  # type: ignore[misc]
+            finally:
+                if hedge_slot:
+                    budget.release()  # type: ignore[union-attr]
+
+    def _generate(self, contents: List[str], tier: str = "batch", budget: threading.Semaphore | None = None) -> str:
+        """Call the model, retrying with backoff on 429/quota errors."""
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                resp = self._call(contents, tier, budget)
+            except Exception as e:
+                self._record_call(tier, started, exc=e)
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self.metrics.inc("model_retries_total", tier=tier)
+                delay = backoff_delay(attempt)
+                logging.getLogger("classifier").warning(f"Rate limited; retrying in {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                self._record_call(tier, started, resp)
+                self._latency.add(tier, time.perf_counter() - started)
+                return resp.text
+        raise RuntimeError("unreachable")
+
+    async def _agenerate(
+        self, contents: List[str], ctl: AdaptiveConcurrency, limiter: RateLimiter, tier: str = "batch"
+    ) -> str:
+        """Async model call under the adaptive concurrency limit and global rate limiter."""
+        # Cached instruction tokens still count toward the per-minute token quota
+        tokens = estimate_tokens(self._system_instruction) + sum(estimate_tokens(c) for c in contents)
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(tokens)
+            async with ctl.slot():
+                started = time.perf_counter()
+                try:
+                    resp = await self._acall(contents, tier, ctl)
+                except Exception as e:
+                    self._record_call(tier, started, exc=e)
+                    if not is_rate_limit_error(e):
+                        raise
+                    await ctl.on_throttle()
+                    if attempt >= self.max_retries:
+                        raise
+                    self.metrics.inc("model_retries_total", tier=tier)
+                    err = e
+                else:
+                    self._record_call(tier, started, resp)
+                    self._latency.add(tier, time.perf_counter() - started)
+                    await ctl.on_success(time.perf_counter() - started)
+                    return resp.text
+            delay = backoff_delay(attempt)
+            logging.getLogger("classifier").warning(f"Rate limited ({err}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def _acall(self, contents: List[str], tier: str, ctl: AdaptiveConcurrency) -> ModelResponse:
+        """Async counterpart of `_call`; the caller already holds a concurrency slot."""
+        delay = self._hedge_delay(tier)
+
+        def call() -> "asyncio.Future[ModelResponse]":
+            return asyncio.ensure_future(self._backend.agenerate(contents, system_instruction=self._system_instruction))
+
+        if delay is None:
+            if self.call_timeout is None:
+                return await call()
+            try:
+                return await asyncio.wait_for(call(), self.call_timeout)
+            except asyncio.TimeoutError:
+                raise ModelCallTimeout(f"model call exceeded {self.call_timeout}s") from None
+
+        deadline = None if self.call_timeout is None else time.monotonic() + self.call_timeout
+        primary = call()
+        tasks = [primary]
         try:
-            resp = self._model.generate_content(
-                [self._system_instruction, prompt],
-                generation_config=GenerationConfig(
-                    response_mime_type="application/json",
-                    temperature=0.0,
-                ),
+            await asyncio.wait(tasks, timeout=_remaining(deadline, delay))
+            # A hedge only uses spare concurrency; it is not counted against the slot limit
+            if not primary.done() and _remaining(deadline) != 0.0 and ctl.in_flight < int(ctl.limit):
+                tasks.append(call())
+                self.metrics.inc("model_hedges_total", tier=tier)
+            error: BaseException | None = None
+            pending = set(tasks)
+            while pending:
+                finished, pending = await asyncio.wait(
+                    pending, timeout=_remaining(deadline), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not finished:
+                    raise ModelCallTimeout(f"model call exceeded {self.call_timeout}s")
+                for task in finished:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.metrics.inc("model_hedge_wins_total", tier=tier)
+                        return task.result()
+                    error = task.exception()
+            raise error  # type: ignore[misc]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _classify_chunk(
+        self, descriptions: List[str], budget: threading.Semaphore | None = None
+    ) -> List[Dict[str, object]]:
+        if not descriptions:
+            return []
+
+        results: List[Dict[str, object] | None] = [None] * len(descriptions)
+        pending = list(range(len(descriptions)))
+        # Full prompt first, then a shorter strict prompt for the items still missing
+        tiers = ("batch", "strict")
+        for attempt in range(2):
+            items = self._chunk_items([descriptions[j] for j in pending])
+            contents = (
+                [self._chunk_prompt(items)] if attempt == 0 else [self._strict_prompt(), items]
+            )
+            try:
+                parsed = self._parse_chunk(self._generate(contents, tier=tiers[attempt], budget=budget), len(pending))
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    # Still throttled after retries: more calls would only make it worse
+                    return [p or _empty_prediction() for p in results]
+                parsed = [None] * len(pending)
+            if attempt == 0:
+                self._record_batch(len(descriptions), all(p is not None for p in parsed))
+            for j, p in zip(pending, parsed):
+                results[j] = p
+            pending = [j for j in pending if results[j] is None]
+            if not pending:
+                return results  # type: ignore[return-value]
+        # Fallback to single calls for the remaining items (no guessing; return nulls if model fails),
+        # in parallel; `budget` still bounds the calls in flight
+        with ThreadPoolExecutor(max_workers=min(len(pending), 8)) as singles:
+            top2 = list(singles.map(lambda j: self._classify_single_top2(descriptions[j], budget), pending))
+        for j, (c1, s1, c2, s2) in zip(pending, top2):
+            results[j] = {"c1": c1, "s1": s1, "c2": c2, "s2": s2}
+        return results  # type: ignore[return-value]
+
+    async def _aclassify_chunk(
+        self, descriptions: List[str], ctl: AdaptiveConcurrency, limiter: RateLimiter
+    ) -> List[Dict[str, object]]:
+        if not descriptions:
+            return []
+
+        results: List[Dict[str, object] | None] = [None] * len(descriptions)
+        pending = list(range(len(descriptions)))
+        tiers = ("batch", "strict")
+        for attempt in range(2):
+            items = self._chunk_items([descriptions[j] for j in pending])
+            contents = (
+                [self._chunk_prompt(items)] if attempt == 0 else [self._strict_prompt(), items]
             )
-            text = (resp.text or "").strip()
-            obj = json.loads(_extract_json_object(text))
+            try:
+                parsed = self._parse_chunk(
+                    await self._agenerate(contents, ctl, limiter, tier=tiers[attempt]), len(pending)
+                )
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    return [p or _empty_prediction() for p in results]
+                parsed = [None] * len(pending)
+            if attempt == 0:
+                self._record_batch(len(descriptions), all(p is not None for p in parsed))
+            for j, p in zip(pending, parsed):
+                results[j] = p
+            pending = [j for j in pending if results[j] is None]
+            if not pending:
+                return results  # type: ignore[return-value]
+
+        async def single(d: str) -> Dict[str, object]:
+            try:
+                text = await self._agenerate(
+                    [self._single_prompt(d)], ctl, limiter, tier="single"
+                )
+                c1, s1, c2, s2 = self._validate_top2(json.loads(_extract_json_object(text.strip())))
+            except Exception:
+                return _empty_prediction()
+            return {"c1": c1, "s1": s1, "c2": c2, "s2": s2}
+
+        singles = await asyncio.gather(*(single(descriptions[j]) for j in pending))
+        for j, p in zip(pending, singles):
+            results[j] = p
+        return results  # type: ignore[return-value]
+
+    def _classify_single_top2(
+        self, description: str, budget: threading.Semaphore | None = None
+    ) -> Tuple[str | None, float | None, str | None, float | None]:
+        try:
+            text = self._generate([self._single_prompt(description)], tier="single", budget=budget)
+            obj = json.loads(_extract_json_object(text.strip()))
             return self._validate_top2(obj)
         except Exception:
             # No guessing: return nulls to indicate missing/invalid model output
@@ -243,11 +1066,15 @@ class GeminiClassifier:
             f"Item description: {description}\n"
             "Choose exactly one category from the allowed list. Return only the category text."
         )
+        started = time.perf_counter()
         try:
-            resp = self._model.generate_content([self._system_instruction, prompt])
-            text = (resp.text or "").strip()
-        except Exception:
+            resp = self._backend.generate([prompt], json_output=False, system_instruction=self._system_instruction)
+        except Exception as e:
+            self._record_call("label", started, exc=e)
             text = ""
+        else:
+            self._record_call("label", started, resp)
+            text = resp.text.strip()
         return self._post_validate_label(text)
 
     def _validate_top2(self, obj: object) -> Tuple[str | None, float | None, str | None, float | None]:
@@ -266,30 +1093,11 @@ class GeminiClassifier:
 
     def _second_best_different(self, first: str, hint: str | None = None) -> str:
         # Pick best other category different from first using fuzzy match against hint (or first)
-        choices = [k for k in self._choices if self._norm_map[k] != first]
-        if not choices:
-            return first
-        query = _norm(hint or first)
-        match = None
-        if choices:
-            match, _, _ = process.extractOne(query, choices, scorer=fuzz.WRatio)
-        return self._norm_map[match] if match else self._categories[0]
+        return self._resolver.second_best(first, hint=hint)
 
     def _post_validate_label(self, model_text: str) -> str:
-        # Normalize and try exact normalization match
-        if model_text:
-            key = _norm(model_text)
-            if key in self._norm_map:
-                return self._norm_map[key]
-        # Fallback to fuzzy match against allowed list
-        query = _norm(model_text) if model_text else ""
-        match, score, _ = process.extractOne(
-            query, self._choices, scorer=fuzz.WRatio
-        ) if self._choices else (None, 0, None)
-        if match is not None and score >= 60:
-            return self._norm_map[match]
-        # If still not good, pick the first category as consistent fallback
-        return self._categories[0]
+        # Exact ID/name/alias match, else memoized fuzzy match, else the first category
+        return self._resolver.resolve(model_text or "")
 
     def _resolve_id_or_name(self, value: str) -> str:
         v = value.strip()
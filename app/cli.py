@@ -5,14 +5,22 @@ import json
 import logging
 
 from .config import load_config
-from .pipeline import run_pipeline
+from .pipeline import run_backfill, run_pipeline
 
 
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
         description="Export categorized product data: BigQuery -> Gemini -> CSV -> GCS",
     )
-    parser.add_argument("--month", required=True, help="Month to query, format MM-YYYY")
+    parser.add_argument("--month", default=None, help="Month to query, format MM-YYYY")
+    parser.add_argument(
+        "--from",
+        dest="month_from",
+        default=None,
+        metavar="MM-YYYY",
+        help="First month of a backfill range (with --to); the range is queried and classified once",
+    )
+    parser.add_argument("--to", dest="month_to", default=None, metavar="MM-YYYY", help="Last month of a backfill range")
     parser.add_argument("--limit", type=int, default=None, help="Optional limit of rows")
     parser.add_argument("--dry-run", action="store_true", help="Do not upload to GCS")
     parser.add_argument(
@@ -44,8 +52,82 @@ def main(argv: list[str] | None = None) -> int:
         action="store_true",
         help="Disable deduplication of repeated descriptions",
     )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default=None,
+        help="Classification engine (default: from .env CLASSIFY_ENGINE or threads)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=None,
+        help="Classify the month in this many worker processes (hash-sharded unique descriptions)",
+    )
+    parser.add_argument(
+        "--no-prefilter",
+        action="store_true",
+        help="Send every description to the model, skipping the keyword pre-classifier",
+    )
+    parser.add_argument(
+        "--resume",
+        default=None,
+        metavar="RUN_ID",
+        help="Resume a checkpointed run by its run ID (requires CHECKPOINT_URI)",
+    )
+    parser.add_argument(
+        "--no-checkpoint",
+        action="store_true",
+        help="Do not checkpoint this run even if CHECKPOINT_URI is set",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read, classify and write the month page by page to bound memory use",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=None,
+        help="Rows per BigQuery page in --stream mode (default: from .env BQ_PAGE_SIZE or 5000)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only classify rows that are new or changed since the last run of the month (requires CHECKPOINT_URI)",
+    )
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=["csv", "parquet"],
+        default=None,
+        help="Output file format (default: from .env OUTPUT_FORMAT or csv)",
+    )
 
     args = parser.parse_args(argv)
+    backfill = args.month_from is not None or args.month_to is not None
+    if backfill:
+        if args.month is not None or args.month_from is None or args.month_to is None:
+            parser.error("use either --month or both --from and --to")
+        if args.limit is not None or args.stream or args.resume or args.incremental:
+            parser.error("--from/--to cannot be combined with --limit, --stream, --resume or --incremental")
+    elif args.month is None:
+        parser.error("--month (or --from/--to) is required")
+    if args.shards is not None and (
+        backfill
+        or args.limit is not None
+        or args.stream
+        or args.page_size is not None
+        or args.resume
+        or args.no_checkpoint
+        or args.incremental
+        or args.no_dedupe
+    ):
+        # Sharded runs always deduplicate and keep no checkpoint, so these options have no effect there
+        parser.error(
+            "--shards cannot be combined with --from/--to, --limit, --stream, --page-size, --resume, "
+            "--no-checkpoint, --incremental or --no-dedupe"
+        )
 
     # Configure logging
     logging.basicConfig(
@@ -58,6 +140,40 @@ def main(argv: list[str] | None = None) -> int:
     batch_size = args.batch_size if args.batch_size is not None else (cfg.classify_batch_size or 8)
     concurrency = args.concurrency if args.concurrency is not None else (cfg.classify_concurrency or 4)
     progress_every = args.progress_every if args.progress_every is not None else (cfg.classify_progress_every or 1)
+    if args.shards is not None:
+        # Imported here: the shard module pulls in multiprocessing machinery plain runs don't need
+        from .shard import run_sharded
+
+        result = run_sharded(
+            cfg,
+            month=args.month,
+            shards=max(1, args.shards),
+            dry_run=args.dry_run,
+            progress_every=max(1, progress_every),
+            batch_size=max(1, batch_size),
+            concurrency=max(1, concurrency),
+            engine=args.engine,
+            prefilter=(not args.no_prefilter),
+            output_format=args.output_format,
+        )
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    if backfill:
+        result = run_backfill(
+            cfg,
+            month_from=args.month_from,
+            month_to=args.month_to,
+            dry_run=args.dry_run,
+            progress_every=max(1, progress_every),
+            batch_size=max(1, batch_size),
+            concurrency=max(1, concurrency),
+            deduplicate=(not args.no_dedupe),
+            engine=args.engine,
+            prefilter=(not args.no_prefilter),
+            output_format=args.output_format,
+        )
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
     result = run_pipeline(
         cfg,
         month=args.month,
@@ -67,6 +183,14 @@ def main(argv: list[str] | None = None) -> int:
         batch_size=max(1, batch_size),
         concurrency=max(1, concurrency),
         deduplicate=(not args.no_dedupe),
+        stream=args.stream,
+        page_size=args.page_size,
+        engine=args.engine,
+        prefilter=(not args.no_prefilter),
+        checkpoint=(not args.no_checkpoint),
+        resume=args.resume,
+        output_format=args.output_format,
+        incremental=args.incremental,
     )
     print(json.dumps(result, ensure_ascii=False, indent=2))
     return 0
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from typing import Dict, List
+
+from rapidfuzz import fuzz, process
+
+# Default token_sort_ratio (0..100) above which two canonical descriptions are the same product
+DEFAULT_THRESHOLD = 90.0
+
+_UNITS = (
+    "kg|kgs|g|gm|gms|gr|grams?|mg|l|lt|ltr|litres?|liters?|ml|cl|oz|lbs?|pcs?|pc|pk|packs?|ea|"
+    "ct|ctn|cartons?|box(?:es)?|bags?|btls?|bottles?|cans?|doz(?:en)?|rolls?|sheets?|x"
+)
+# Quantities with an optional multiplier and unit: "5kg", "5 kg", "12 x 375ml", "2.5L", "x12"
+_QUANTITY_RE = re.compile(rf"\b(?:x\s*)?\d+(?:[.,]\d+)?\s*(?:x\s*\d+(?:[.,]\d+)?\s*)?(?:{_UNITS})?\b")
+_PUNCT_RE = re.compile(r"[^\w\s]|_")
+# Pack words left over once quantities are gone ("box of", "each", "carton")
+_PACK_WORDS = frozenset(
+    "x of per each ea pk pack packs box boxes carton cartons ctn case bag bags bottle btl can tray unit units".split()
+)
+
+
+def check_threshold(threshold: float) -> float:
+    """`threshold` if it is on token_sort_ratio's 0-100 scale; a 0-1 fraction would cluster almost everything."""
+    if not 1 < threshold <= 100:
+        raise ValueError(f"cluster threshold must be a 0-100 similarity above 1, got {threshold}")
+    return threshold
+
+
+def canonical(description: str) -> str:
+    """Description without case, punctuation, quantities, units and pack sizes."""
+    text = _QUANTITY_RE.sub(" ", _PUNCT_RE.sub(" ", (description or "").casefold()))
+    return " ".join(t for t in text.split() if t not in _PACK_WORDS)
+
+
+def cluster_descriptions(
+    descriptions: List[str], threshold: float = DEFAULT_THRESHOLD, weights: List[int] | None = None
+) -> List[int]:
+    """
+    Index of the representative of each description.
+
+    Descriptions with the same `canonical` form belong together outright. Canonical forms
+    are then compared with `token_sort_ratio` within blocks sharing their first word; a form
+    scoring at least `threshold` against an earlier cluster's leader joins that cluster. Forms
+    are visited from the highest total weight (e.g. row count) down, so the most common
+    variant leads and represents its cluster. Descriptions with an empty canonical form
+    (only numbers or units) stay on their own.
+    """
+    check_threshold(threshold)
+    weights = weights or [1] * len(descriptions)
+    forms: Dict[str, List[int]] = defaultdict(list)
+    for i, d in enumerate(descriptions):
+        forms[canonical(d)].append(i)
+
+    rep = list(range(len(descriptions)))
+    order = sorted(
+        (f for f in forms if f),
+        key=lambda f: (-sum(weights[i] for i in forms[f]), forms[f][0]),
+    )
+    # Leader form per block, and the description representing each leader
+    leaders: Dict[str, List[str]] = defaultdict(list)
+    leader_rep: Dict[str, int] = {}
+    for form in order:
+        members = forms[form]
+        block = leaders[form.split(" ", 1)[0]]
+        match = process.extractOne(form, block, scorer=fuzz.token_sort_ratio, score_cutoff=threshold) if block else None
+        if match is None:
+            block.append(form)
+            # The most frequent raw variant of the leading form represents the cluster
+            leader_rep[form] = max(members, key=lambda i: (weights[i], -i))
+            target = leader_rep[form]
+        else:
+            target = leader_rep[match[0]]
+        for i in members:
+            rep[i] = target
+    return rep
+
+
+class ClusterIndex:
+    """
+    Cluster leaders kept across calls, so descriptions clustered in later batches (pages of
+    a streamed month) join the clusters of earlier ones instead of starting their own.
+
+    Each batch is clustered on its own first (`cluster_descriptions`); a batch cluster whose
+    leading form scores at least `threshold` against an earlier leader in its block is then
+    represented by that leader's representative. The index holds one form and one
+    description per cluster.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = check_threshold(threshold)
+        self._leaders: Dict[str, List[str]] = defaultdict(list)
+        self._rep: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._rep)
+
+    def assign(self, descriptions: List[str], weights: List[int] | None = None) -> List[str]:
+        """Representative description of each description; earlier batches' leaders win."""
+        reps = cluster_descriptions(descriptions, self.threshold, weights)
+        target: Dict[int, str] = {}
+        for r in dict.fromkeys(reps):
+            rep = descriptions[r]
+            # A representative's canonical form is its cluster's leading form
+            form = canonical(rep)
+            if not form:
+                target[r] = rep
+                continue
+            if form in self._rep:
+                target[r] = self._rep[form]
+                continue
+            block = self._leaders[form.split(" ", 1)[0]]
+            match = process.extractOne(form, block, scorer=fuzz.token_sort_ratio, score_cutoff=self.threshold)
+            if match is None:
+                block.append(form)
+                self._rep[form] = rep
+                target[r] = rep
+            else:
+                target[r] = self._rep[match[0]]
+        return [target[r] for r in reps]
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 
 
 def _load_dotenv_if_available() -> None:
@@ -24,6 +24,42 @@ class Config:
     classify_batch_size: Optional[int]
     classify_concurrency: Optional[int]
     classify_progress_every: Optional[int]
+    classify_cache_path: Optional[str] = None
+    classify_cache_max_entries: Optional[int] = None
+    bq_page_size: Optional[int] = None
+    checkpoint_uri: Optional[str] = None
+    bq_use_storage_api: bool = False
+    classify_engine: str = "threads"
+    category_keywords_path: Optional[str] = None
+    category_aliases_path: Optional[str] = None
+    category_rules_path: Optional[str] = None
+    prefilter_threshold: Optional[float] = None
+    classify_max_input_tokens: Optional[int] = None
+    classify_max_output_tokens: Optional[int] = None
+    classify_max_batch_items: Optional[int] = None
+    classify_max_concurrency: Optional[int] = None
+    classify_target_latency: Optional[float] = None
+    gemini_requests_per_minute: Optional[int] = None
+    gemini_tokens_per_minute: Optional[int] = None
+    job_workers: Optional[int] = None
+    output_format: str = "csv"
+    output_stream_upload: bool = False
+    parquet_row_group_size: Optional[int] = None
+    gemini_context_cache: bool = False
+    gemini_context_cache_ttl: Optional[int] = None
+    bq_columns: Optional[Tuple[str, ...]] = None
+    bq_month_table: Optional[str] = None
+    bq_distinct_descriptions: bool = False
+    online_max_batch: Optional[int] = None
+    online_max_wait_ms: Optional[int] = None
+    gemini_call_timeout: Optional[float] = None
+    gemini_hedge: bool = False
+    gemini_hedge_min_delay: Optional[float] = None
+    batch_prediction_min_rows: Optional[int] = None
+    batch_prediction_poll_seconds: Optional[float] = None
+    bq_results_table: Optional[str] = None
+    bq_results_key: Optional[Tuple[str, ...]] = None
+    classify_cluster_threshold: Optional[float] = None
 
 
 def load_config() -> Config:
@@ -45,7 +81,45 @@ def load_config() -> Config:
         classify_batch_size=_get_int("CLASSIFY_BATCH_SIZE"),
         classify_concurrency=_get_int("CLASSIFY_CONCURRENCY"),
         classify_progress_every=_get_int("CLASSIFY_PROGRESS_EVERY"),
+        classify_cache_path=os.getenv("CLASSIFY_CACHE_PATH") or None,
+        classify_cache_max_entries=_get_int("CLASSIFY_CACHE_MAX_ENTRIES"),
+        bq_page_size=_get_int("BQ_PAGE_SIZE"),
+        checkpoint_uri=os.getenv("CHECKPOINT_URI") or None,
+        bq_use_storage_api=_get_bool("BQ_USE_STORAGE_API"),
+        classify_engine=os.getenv("CLASSIFY_ENGINE") or "threads",
+        category_keywords_path=os.getenv("CATEGORY_KEYWORDS_PATH") or None,
+        category_aliases_path=os.getenv("CATEGORY_ALIASES_PATH") or None,
+        category_rules_path=os.getenv("CATEGORY_RULES_PATH") or None,
+        prefilter_threshold=_get_float("PREFILTER_THRESHOLD"),
+        classify_max_input_tokens=_get_int("CLASSIFY_MAX_INPUT_TOKENS"),
+        classify_max_output_tokens=_get_int("CLASSIFY_MAX_OUTPUT_TOKENS"),
+        classify_max_batch_items=_get_int("CLASSIFY_MAX_BATCH_ITEMS"),
+        classify_max_concurrency=_get_int("CLASSIFY_MAX_CONCURRENCY"),
+        classify_target_latency=_get_float("CLASSIFY_TARGET_LATENCY"),
+        gemini_requests_per_minute=_get_int("GEMINI_RPM"),
+        gemini_tokens_per_minute=_get_int("GEMINI_TPM"),
+        job_workers=_get_int("JOB_WORKERS"),
+        output_format=(os.getenv("OUTPUT_FORMAT") or "csv").lower(),
+        output_stream_upload=_get_bool("OUTPUT_STREAM_UPLOAD"),
+        parquet_row_group_size=_get_int("PARQUET_ROW_GROUP_SIZE"),
+        gemini_context_cache=_get_bool("GEMINI_CONTEXT_CACHE"),
+        gemini_context_cache_ttl=_get_int("GEMINI_CONTEXT_CACHE_TTL"),
+        bq_columns=_get_list("BQ_COLUMNS"),
+        bq_month_table=os.getenv("BQ_MONTH_TABLE") or None,
+        bq_distinct_descriptions=_get_bool("BQ_DISTINCT_DESCRIPTIONS"),
+        online_max_batch=_get_int("ONLINE_MAX_BATCH"),
+        online_max_wait_ms=_get_int("ONLINE_MAX_WAIT_MS"),
+        gemini_call_timeout=_get_float("GEMINI_CALL_TIMEOUT"),
+        gemini_hedge=_get_bool("GEMINI_HEDGE"),
+        gemini_hedge_min_delay=_get_float("GEMINI_HEDGE_MIN_DELAY"),
+        batch_prediction_min_rows=_get_int("BATCH_PREDICTION_MIN_ROWS"),
+        batch_prediction_poll_seconds=_get_float("BATCH_PREDICTION_POLL_SECONDS"),
+        bq_results_table=os.getenv("BQ_RESULTS_TABLE") or None,
+        bq_results_key=_get_list("BQ_RESULTS_KEY"),
+        classify_cluster_threshold=_get_float("CLASSIFY_CLUSTER_THRESHOLD"),
     )
+    if cfg.classify_cluster_threshold is not None and not 1 < cfg.classify_cluster_threshold <= 100:
+        raise RuntimeError("Environment variable CLASSIFY_CLUSTER_THRESHOLD must be a 0-100 similarity above 1 if set")
     return cfg
 
 
@@ -64,3 +138,32 @@ def _get_int(key: str) -> Optional[int]:
         return int(val)
     except ValueError:
         raise RuntimeError(f"Environment variable {key} must be an integer if set")
+
+
+def _get_float(key: str) -> Optional[float]:
+    val = os.getenv(key)
+    if val is None or val == "":
+        return None
+    try:
+        return float(val)
+    except ValueError:
+        raise RuntimeError(f"Environment variable {key} must be a number if set")
+
+
+def _get_list(key: str) -> Optional[Tuple[str, ...]]:
+    val = os.getenv(key)
+    if val is None or val.strip() == "":
+        return None
+    return tuple(v.strip() for v in val.split(",") if v.strip())
+
+
+def _get_bool(key: str, default: bool = False) -> bool:
+    val = os.getenv(key)
+    if val is None or val == "":
+        return default
+    v = val.strip().lower()
+    if v in ("1", "true", "yes", "on"):
+        return True
+    if v in ("0", "false", "no", "off"):
+        return False
+    raise RuntimeError(f"Environment variable {key} must be a boolean (true/false) if set")
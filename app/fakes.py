@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+from collections import Counter
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from .backends import ModelBackend, ModelResponse
+from .batch import JOB_FAILED, JOB_RUNNING, JOB_SUCCEEDED, BatchRequest, parse_output, request_line
+from .ratelimit import estimate_tokens
+
+# Local stand-ins for Vertex AI (online and batch prediction) and BigQuery so the whole
+# pipeline can be run and measured offline (see app/bench.py). Everything is deterministic
+# for a given seed.
+
+_SELECTED_RE = re.compile(r"\b[st]\.`(\w+)`")
+_ITEM_RE = re.compile(r"^(\d+)\. (.*)$", re.M)
+_CODE_RE = re.compile(r"^- (C\d+):", re.M)
+
+
+class FakeRateLimitError(Exception):
+    def __init__(self) -> None:
+        super().__init__("429 RESOURCE_EXHAUSTED: Quota exceeded (simulated)")
+
+
+class FakeGeminiBackend:
+    """
+    Deterministic `ModelBackend` that answers the classifier's prompts without a network.
+
+    Latency is `base_latency` plus `per_item_latency` per item, with ±`jitter` relative noise.
+    Each call independently fails with a 429 (`rate_limit_rate`), returns truncated JSON
+    (`malformed_rate`) or drops some items from the array (`partial_rate`). Labels are a
+    stable hash of the description, so repeated runs give identical output. With
+    `context_cache` the system instruction is reported as cached input tokens. A
+    `straggler_rate` share of calls takes `straggler_factor` times as long, like the slow tail
+    of a real endpoint.
+
+    `calls` counts calls by prompt tier ("batch", "strict", "single", "label");
+    `latencies` holds the duration of every call in seconds.
+    """
+
+    def __init__(
+        self,
+        base_latency: float = 0.2,
+        per_item_latency: float = 0.01,
+        jitter: float = 0.3,
+        rate_limit_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        partial_rate: float = 0.0,
+        context_cache: bool = False,
+        straggler_rate: float = 0.0,
+        straggler_factor: float = 10.0,
+        seed: int = 0,
+    ):
+        self.base_latency = base_latency
+        self.per_item_latency = per_item_latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.partial_rate = partial_rate
+        self.context_cache = context_cache
+        self.straggler_rate = straggler_rate
+        self.straggler_factor = straggler_factor
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {"batch": 0, "strict": 0, "single": 0, "label": 0}
+        self.rate_limited = 0
+        self.items_requested = 0
+        self.latencies: List[float] = []
+
+    def generate(
+        self, contents: List[str], json_output: bool = True, system_instruction: str | None = None
+    ) -> ModelResponse:
+        delay, outcome = self._plan(contents, json_output)
+        time.sleep(delay)
+        return self._finish(contents, json_output, system_instruction, delay, outcome)
+
+    async def agenerate(
+        self, contents: List[str], json_output: bool = True, system_instruction: str | None = None
+    ) -> ModelResponse:
+        delay, outcome = self._plan(contents, json_output)
+        await asyncio.sleep(delay)
+        return self._finish(contents, json_output, system_instruction, delay, outcome)
+
+    @staticmethod
+    def _tier(contents: List[str], json_output: bool) -> str:
+        if not json_output:
+            return "label"
+        if any("Item description:" in c for c in contents):
+            return "single"
+        return "batch" if any("numbered list" in c for c in contents) else "strict"
+
+    def _plan(self, contents: List[str], json_output: bool) -> tuple[float, str]:
+        tier = self._tier(contents, json_output)
+        n = max(1, len(_ITEM_RE.findall(contents[-1])))
+        with self._lock:
+            self.calls[tier] += 1
+            self.items_requested += n
+            r = self._rng.random()
+            noise = 1.0 + self._rng.uniform(-self.jitter, self.jitter)
+            if self._rng.random() < self.straggler_rate:
+                noise *= self.straggler_factor
+        delay = max(0.0, (self.base_latency + self.per_item_latency * n) * noise)
+        if r < self.rate_limit_rate:
+            # Quota errors come back fast
+            return delay * 0.1, "throttle"
+        r -= self.rate_limit_rate
+        if r < self.malformed_rate:
+            return delay, "malformed"
+        r -= self.malformed_rate
+        if r < self.partial_rate:
+            return delay, "partial"
+        return delay, "ok"
+
+    def _finish(
+        self, contents: List[str], json_output: bool, system_instruction: str | None, delay: float, outcome: str
+    ) -> ModelResponse:
+        with self._lock:
+            self.latencies.append(delay)
+            if outcome == "throttle":
+                self.rate_limited += 1
+        if outcome == "throttle":
+            raise FakeRateLimitError()
+        codes = _CODE_RE.findall(system_instruction or contents[0]) or ["C01"]
+        prompt = contents[-1]
+        if not json_output:
+            desc = prompt.split("\n", 1)[0].replace("Item description:", "").strip()
+            text = codes[_pick(desc, len(codes))]
+        elif "Item description:" in prompt:
+            desc = prompt.split("\n", 1)[0].replace("Item description:", "").strip()
+            text = json.dumps(_answer(desc, codes))
+        else:
+            objs = [{"i": int(i), **_answer(d, codes)} for i, d in _ITEM_RE.findall(prompt)]
+            if outcome == "partial" and len(objs) > 1:
+                objs = objs[: len(objs) // 2]
+            text = json.dumps(objs)
+        if outcome == "malformed":
+            text = text[: max(1, len(text) * 2 // 3)]
+        prefix_tokens = estimate_tokens(system_instruction or "")
+        return ModelResponse(
+            text,
+            prefix_tokens + estimate_tokens("".join(contents)),
+            estimate_tokens(text),
+            prefix_tokens if self.context_cache else None,
+        )
+
+
+class LocalBatchRunner:
+    """
+    File-based stand-in for Vertex AI batch prediction (`batch.BatchRunner`).
+
+    `submit` writes `<directory>/<job>/requests.jsonl` exactly as it would be staged in GCS.
+    A background thread answers each line with `backend` and writes `predictions.jsonl` in
+    the batch output format; failed requests carry an error `status` instead of a response.
+    A job takes at least `latency` seconds. `jobs` counts submitted jobs.
+    """
+
+    def __init__(self, directory: str, backend: ModelBackend, latency: float = 0.0):
+        self.root = Path(directory)
+        self.backend = backend
+        self.latency = latency
+        self.jobs = 0
+        self._lock = threading.Lock()
+        self._cancelled: set[str] = set()
+
+    def submit(self, requests: List[BatchRequest], system_instruction: str | None = None) -> str:
+        with self._lock:
+            self.jobs += 1
+            job_id = f"job-{self.jobs:04d}"
+        path = self.root / job_id
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / "requests.jsonl", "w", encoding="utf-8") as f:
+            for r in requests:
+                f.write(json.dumps(request_line(r, system_instruction), ensure_ascii=False) + "\n")
+        threading.Thread(target=self._run, args=(job_id,), daemon=True).start()
+        return job_id
+
+    def _run(self, job_id: str) -> None:
+        path = self.root / job_id
+        started = time.monotonic()
+        out: List[str] = []
+        try:
+            with open(path / "requests.jsonl", encoding="utf-8") as f:
+                for line in f:
+                    if job_id in self._cancelled:
+                        raise RuntimeError("cancelled")
+                    obj = json.loads(line)
+                    body = obj["request"]
+                    system = body.get("systemInstruction", {}).get("parts", [{}])[0].get("text")
+                    contents = [p["text"] for p in body["contents"][0]["parts"]]
+                    try:
+                        resp = self.backend.generate(contents, system_instruction=system)
+                    except Exception as e:
+                        out.append(json.dumps({**obj, "status": str(e)}))
+                        continue
+                    usage = {
+                        "promptTokenCount": resp.input_tokens,
+                        "candidatesTokenCount": resp.output_tokens,
+                        "cachedContentTokenCount": resp.cached_tokens,
+                    }
+                    response = {"candidates": [{"content": {"parts": [{"text": resp.text}]}}], "usageMetadata": usage}
+                    out.append(json.dumps({**obj, "status": "", "response": response}))
+            time.sleep(max(0.0, self.latency - (time.monotonic() - started)))
+            # Written then renamed so `poll` never sees a partial file
+            (path / "predictions.tmp").write_text("\n".join(out) + "\n", encoding="utf-8")
+            (path / "predictions.tmp").replace(path / "predictions.jsonl")
+        except Exception as e:
+            (path / "error").write_text(str(e), encoding="utf-8")
+
+    def poll(self, job_id: str) -> str:
+        path = self.root / job_id
+        if (path / "error").exists():
+            return JOB_FAILED
+        return JOB_SUCCEEDED if (path / "predictions.jsonl").exists() else JOB_RUNNING
+
+    def fetch(self, job_id: str) -> Dict[str, ModelResponse]:
+        return parse_output((self.root / job_id / "predictions.jsonl").read_text(encoding="utf-8").splitlines())
+
+    def cancel(self, job_id: str) -> None:
+        self._cancelled.add(job_id)
+
+
+def _pick(desc: str, n: int, salt: str = "") -> int:
+    # Same answer for descriptions the classifier treats as duplicates
+    key = " ".join(desc.lower().split())
+    digest = hashlib.blake2b((salt + key).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % n
+
+
+def _answer(desc: str, codes: List[str]) -> Dict[str, object]:
+    first = _pick(desc, len(codes))
+    second = (first + 1 + _pick(desc, len(codes) - 1 or 1, salt="2")) % len(codes)
+    s1 = 0.55 + _pick(desc, 40, salt="s") / 100
+    return {"c1": codes[first], "s1": round(s1, 2), "c2": codes[second], "s2": round(1 - s1, 2)}
+
+
+_ADJECTIVES = ["fresh", "frozen", "organic", "premium", "bulk", "sliced", "large", "small", "assorted", "smoked"]
+_PRODUCTS = [
+    "chicken breast", "beef mince", "salmon fillet", "prawns", "pork belly", "lettuce", "tomatoes",
+    "red onions", "potatoes", "apples", "cheddar cheese", "full cream milk", "butter", "eggs",
+    "white bread", "basmati rice", "olive oil", "plain flour", "sugar", "coffee beans", "green tea",
+    "orange juice", "sparkling water", "lager beer", "red wine", "vodka", "nitrile gloves",
+    "paper towels", "dishwashing liquid", "floor cleaner", "garbage bags", "printer paper",
+    "ballpoint pens", "takeaway containers", "aluminium foil", "cling wrap", "chef knife",
+    "cutting board", "gas refill", "pest control service",
+]
+_PACKS = ["1kg", "500g", "5kg", "2L", "12 x 375ml", "box of 100", "carton", "each", "10 pack", "750ml"]
+_VENDORS = ["Metro Foods", "FreshCo", "Harbour Seafood", "CleanPro Supplies", "Office Hub", "Vine Cellars"]
+
+
+def synthetic_invoices(
+    n: int, month: str = "09-2025", unique_ratio: float = 0.3, seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    `n` invoice rows for `month` whose descriptions repeat like real purchasing data.
+
+    About `unique_ratio * n` distinct descriptions are drawn with a Zipf-like skew (a few
+    staples dominate), and some repeats differ only in case or spacing so deduplication by
+    normalized text is exercised.
+    """
+    rng = random.Random(seed)
+    pool_size = max(1, int(n * unique_ratio))
+    pool = [
+        f"{rng.choice(_ADJECTIVES)} {rng.choice(_PRODUCTS)} {rng.choice(_PACKS)}" for _ in range(pool_size)
+    ]
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(pool_size)]
+    rows: List[Dict[str, Any]] = []
+    for idx, desc in enumerate(rng.choices(pool, weights=weights, k=n)):
+        if rng.random() < 0.1:
+            desc = desc.upper() if rng.random() < 0.5 else desc.replace(" ", "  ", 1)
+        rows.append(
+            {
+                "invoice_id": f"INV-{idx // 8:07d}",
+                "check_invoice_date": month,
+                "vendor": rng.choice(_VENDORS),
+                "item_description": desc,
+                "quantity": rng.randint(1, 24),
+                "amount": round(rng.uniform(1, 400), 2),
+            }
+        )
+    return rows
+
+
+class _FakeResult:
+    def __init__(self, rows: List[Dict[str, Any]], page_size: int | None):
+        self._rows = rows
+        self.total_rows = len(rows)
+        self._page_size = page_size or 10_000
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._rows)
+
+    @property
+    def pages(self) -> Iterator[List[Dict[str, Any]]]:
+        for i in range(0, len(self._rows), self._page_size):
+            yield self._rows[i : i + self._page_size]
+
+
+class _FakeQueryJob:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self._rows = rows
+
+    def result(self, page_size: int | None = None, start_index: int = 0, **_: Any) -> _FakeResult:
+        return _FakeResult(self._rows[start_index:], page_size)
+
+
+class _FakeLoadJob:
+    def result(self, **_: Any) -> "_FakeLoadJob":
+        return self
+
+
+def _row_fingerprint(row: Dict[str, Any]) -> int:
+    digest = hashlib.blake2b(json.dumps(row, sort_keys=True, default=str).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _month_of(row: Dict[str, Any]) -> str:
+    return str(row.get("check_invoice_date", "")).replace("/", "-")
+
+
+def _month_key(month: str) -> tuple[int, int]:
+    mm, yyyy = month.split("-")
+    return int(yyyy), int(mm)
+
+
+class FakeBigQueryClient:
+    """
+    Serves a fixed list of rows for the month query in `bq.py`.
+
+    Honours the `month_str`/`month_start`, `limit` and `fps` query parameters, column
+    pruning, the distinct-description and month-range queries, the fingerprint queries used
+    by incremental runs and REST paging (`page_size`, `start_index`); there is no
+    Storage Read API path. `latency` is added per query.
+
+    Parquet load jobs into a partition (`bq.BigQueryOutput`) replace `partitions[<table$YYYYMM>]`
+    with the loaded rows; `tables` holds the schema of each created table.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], latency: float = 0.0):
+        self.rows = rows
+        self.latency = latency
+        self.queries = 0
+        self.tables: Dict[str, Any] = {}
+        self.partitions: Dict[str, List[Dict[str, Any]]] = {}
+
+    def create_table(self, table: Any, exists_ok: bool = False) -> Any:
+        self.tables.setdefault(f"{table.project}.{table.dataset_id}.{table.table_id}", table.schema)
+        return table
+
+    def delete_table(self, table: str, not_found_ok: bool = False) -> None:
+        self.partitions.pop(table, None)
+
+    def load_table_from_file(self, file_obj: Any, destination: str, job_config: Any = None) -> _FakeLoadJob:
+        import pyarrow.parquet as pq  # type: ignore
+
+        self.partitions[destination] = pq.read_table(file_obj).to_pylist()
+        return _FakeLoadJob()
+
+    def query(self, sql: str, job_config: Any = None) -> _FakeQueryJob:
+        self.queries += 1
+        time.sleep(self.latency)
+        params = {
+            p.name: getattr(p, "value", getattr(p, "values", None))
+            for p in getattr(job_config, "query_parameters", None) or []
+        }
+        month = params.get("month_str")
+        if params.get("month_start") is not None:
+            # Partitioned helper table (BQ_MONTH_TABLE)
+            month = f"{params['month_start'].month:02d}-{params['month_start'].year}"
+        rows = [r for r in self.rows if month is None or _month_of(r) == month]
+        if "from_month" in params or "start_month" in params:
+            # bq.query_invoices_by_month_range (source table or BQ_MONTH_TABLE)
+            if "start_month" in params:
+                lo, hi = ((params[k].year, params[k].month) for k in ("start_month", "end_month"))
+            else:
+                lo, hi = _month_key(params["from_month"]), _month_key(params["to_month"])
+            columns = _SELECTED_RE.findall(sql)
+            ranged = [
+                dict({c: r.get(c) for c in columns} if columns else r, _month=_month_of(r))
+                for r in rows
+                if lo <= _month_key(_month_of(r)) <= hi
+            ]
+            return _FakeQueryJob(sorted(ranged, key=lambda r: _month_key(r["_month"])))
+        if params.get("limit") is not None:
+            rows = rows[: int(params["limit"])]
+        if "COUNT(*) AS n" in sql:
+            # bq.query_month_descriptions
+            counts = Counter(str(r.get("item_description") or "").strip() for r in rows)
+            return _FakeQueryJob([{"item_description": d, "n": n} for d, n in counts.most_common()])
+        columns = _SELECTED_RE.findall(sql)
+        if columns:
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+        if "_row_fp" in sql:
+            # Fingerprint queries from bq.query_month_fingerprints / query_invoices_by_fingerprints
+            keyed = sorted(((_row_fingerprint(r), r) for r in rows), key=lambda x: x[0])
+            if sql.split("FROM fingerprinted")[0].rstrip().endswith("SELECT m._row_fp"):
+                return _FakeQueryJob([{"_row_fp": fp} for fp, _ in keyed])
+            wanted = set(params["fps"]) if "fps" in params else None
+            rows = [dict(r, _row_fp=fp) for fp, r in keyed if wanted is None or fp in wanted]
+        return _FakeQueryJob(rows)
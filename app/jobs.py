@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+from .pipeline import PipelineCancelled
+
+ACTIVE_STATES = ("queued", "running")
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    params: Dict[str, Any]
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Dict[str, Any] | None = None
+    error: str | None = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_event.is_set(),
+        }
+
+
+class JobManager:
+    """
+    Runs pipeline jobs on a bounded worker pool and tracks them in memory.
+
+    `runner(params, job)` does the work; it should pass `job.cancel_event` and a progress
+    callback that updates `job.progress` down to `run_pipeline`. Submitting a job whose
+    coalescing key matches a queued or running job returns that job instead of starting a
+    second run. Finished jobs are kept for inspection, oldest dropped past `max_retained`.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Dict[str, Any], Job], Dict[str, Any]],
+        max_workers: int = 2,
+        max_retained: int = 200,
+    ):
+        self._runner = runner
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.max_retained = max_retained
+
+    def submit(self, key: str, params: Dict[str, Any]) -> Tuple[Job, bool]:
+        """Return (job, created); created is False when coalesced onto an active job."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.key == key and job.status in ACTIVE_STATES and not job.cancel_event.is_set():
+                    return job, False
+            job = Job(id=uuid4().hex, key=key, params=params)
+            self._jobs[job.id] = job
+            self._prune_locked()
+        self._pool.submit(self._execute, job)
+        return job, True
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status in ACTIVE_STATES:
+                job.cancel_event.set()
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    job.finished_at = time.time()
+            return job
+
+    def shutdown(self) -> None:
+        for job in self.list():
+            job.cancel_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _execute(self, job: Job) -> None:
+        log = logging.getLogger("jobs")
+        with self._lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = "running"
+            job.started_at = time.time()
+        log.info(f"Job started | job_id={job.id} | key={job.key}")
+        try:
+            result = self._runner(job.params, job)
+        except PipelineCancelled:
+            status, result, error = "cancelled", None, None
+        except ValueError as e:
+            status, result, error = "failed", None, str(e)
+        except Exception:
+            log.exception(f"Job failed | job_id={job.id}")
+            status, result, error = "failed", None, "Internal error"
+        else:
+            status, error = "succeeded", None
+        with self._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+        log.info(f"Job finished | job_id={job.id} | status={status}")
+
+    def _prune_locked(self) -> None:
+        finished = [j for j in self._jobs.values() if j.status not in ACTIVE_STATES]
+        excess = len(self._jobs) - self.max_retained
+        for job in sorted(finished, key=lambda j: j.created_at)[: max(0, excess)]:
+            del self._jobs[job.id]
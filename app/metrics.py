@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+# Seconds; suits both single model calls and whole chunks with retries
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (math.inf,), self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    In-process counters and histograms with Prometheus text rendering.
+
+    A run gets its own `Metrics(parent=REGISTRY)`: every update also lands in the process-wide
+    registry served at `/metrics`, while `snapshot()` describes just that run.
+    """
+
+    def __init__(self, parent: "Metrics | None" = None):
+        self._parent = parent
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        self._histograms: Dict[_Key, _Histogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> _Key:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self._parent is not None:
+            self._parent.inc(name, value, **labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(LATENCY_BUCKETS)
+            hist.observe(value)
+        if self._parent is not None:
+            self._parent.observe(name, value, **labels)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """Add the wall time of the block to `pipeline_stage_seconds_total{stage=...}`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc("pipeline_stage_seconds_total", time.perf_counter() - started, stage=stage)
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """Counters and histogram summaries keyed by `name{label=value,...}`."""
+        with self._lock:
+            counters = {_label_str(k): round(v, 4) for k, v in sorted(self._counters.items())}
+            histograms = {
+                _label_str(k): {
+                    "count": h.count,
+                    "sum": round(h.sum, 4),
+                    "p50": _round(h.quantile(0.5)),
+                    "p95": _round(h.quantile(0.95)),
+                    "max": round(h.max, 4),
+                }
+                for k, h in sorted(self._histograms.items())
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_prom_labels(labels)} {_num(value)}")
+            for (name, labels), hist in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip(hist.buckets + (math.inf,), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == math.inf else _num(bound)
+                    lines.append(f"{name}_bucket{_prom_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_prom_labels(labels)} {_num(hist.sum)}")
+                lines.append(f"{name}_count{_prom_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 4)
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _label_str(key: _Key) -> str:
+    name, labels = key
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+def _prom_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide registry rendered by the server's /metrics endpoint
+REGISTRY = Metrics()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Tuple
+
+from .cache import ResultCache
+from .classifier import GeminiClassifier, _norm
+from .prefilter import PreClassifier
+from .ratelimit import AdaptiveConcurrency, RateLimiter
+from .rules import CategoryRules
+
+_Item = Tuple[str, str, "asyncio.Future[Dict[str, object]]"]
+
+
+class MicroBatcher:
+    """
+    Coalesces descriptions from concurrent requests into model batches for online use.
+
+    A batch is sent once it holds `max_batch` items or `max_wait` seconds after its first
+    item arrived, whichever comes first, so a lone request waits at most `max_wait` before
+    its call starts while bursts fill whole batches. Descriptions answered by the result
+    cache or a pre-classifier never wait for a batch (cache reads and writes run in a worker
+    thread, off the event loop); one that is already queued or in flight is not
+    queued again, and its callers share the pending result. Batches go through
+    `GeminiClassifier._aclassify_chunk`, so they get the same validation and fallback tiers as
+    month runs, and run under an adaptive concurrency limit and `limiter`. Category `rules`
+    correct every response the way they correct month runs; the cache keeps model answers.
+
+    `classifier` is called for every batch, so a rebuilt classifier (new categories) takes
+    effect without restarting the batcher. Must be created inside the event loop it serves.
+    """
+
+    def __init__(
+        self,
+        classifier: Callable[[], GeminiClassifier],
+        max_batch: int = 16,
+        max_wait: float = 0.02,
+        concurrency: int = 4,
+        max_concurrency: int | None = None,
+        target_latency: float | None = None,
+        cache: ResultCache | None = None,
+        preclassifiers: Callable[[], List[PreClassifier]] | None = None,
+        limiter: RateLimiter | None = None,
+        rules: Callable[[], CategoryRules | None] | None = None,
+    ):
+        self._classifier = classifier
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self._cache = cache
+        self._preclassifiers = preclassifiers
+        self._rules = rules
+        self._limiter = limiter or RateLimiter()
+        self._ctl = AdaptiveConcurrency(
+            initial=max(1, concurrency),
+            maximum=max(max(1, concurrency), max_concurrency or 4 * max(1, concurrency)),
+            target_latency=target_latency,
+        )
+        self._queue: asyncio.Queue[_Item] = asyncio.Queue()
+        self._inflight: Dict[str, asyncio.Future[Dict[str, object]]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._loop_task = asyncio.ensure_future(self._collect())
+
+    async def classify(self, descriptions: List[str]) -> List[Dict[str, object]]:
+        """Predictions (`c1`, `s1`, `c2`, `s2`) for `descriptions`, in order."""
+        classifier = self._classifier()
+        keys = [_norm(d) for d in descriptions]
+        known: Dict[str, Dict[str, object]] = {}
+        metrics = classifier.metrics
+        if self._cache is not None:
+            # SQLite I/O runs off the event loop so other requests are not held up behind it
+            known = await asyncio.to_thread(self._cache.get_many, classifier.fingerprint, set(keys))
+            if known:
+                metrics.inc("online_items_total", len(known), source="cache")
+        loop = asyncio.get_running_loop()
+        waiting: Dict[str, asyncio.Future[Dict[str, object]]] = {}
+        for d, k in zip(descriptions, keys):
+            if k in known or k in waiting:
+                continue
+            pred = self._precheck(d)
+            if pred is not None:
+                known[k] = pred
+                metrics.inc("online_items_total", source="prefilter")
+            elif k in self._inflight:
+                waiting[k] = self._inflight[k]
+                metrics.inc("online_items_total", source="coalesced")
+            else:
+                fut = self._inflight[k] = loop.create_future()
+                waiting[k] = fut
+                self._queue.put_nowait((d, k, fut))
+                metrics.inc("online_items_total", source="model")
+        if waiting:
+            # shield: one caller going away must not cancel a result other callers share
+            done = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            known.update(zip(waiting.keys(), done))
+        rules = self._rules() if self._rules is not None else None
+        if rules is not None:
+            known = classifier._apply_rules(rules, {k: known[k] for k in dict.fromkeys(keys)})
+        return [known[k] for k in keys]
+
+    def _precheck(self, description: str) -> Dict[str, object] | None:
+        for pc in self._preclassifiers() if self._preclassifiers is not None else []:
+            pred = pc.predict(description)
+            if pred is not None:
+                return pred
+        return None
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[_Item]) -> None:
+        classifier = self._classifier()
+        started = time.perf_counter()
+        try:
+            preds = await classifier._aclassify_chunk([d for d, _, _ in batch], self._ctl, self._limiter)
+        except Exception as e:
+            logging.getLogger("online").exception("Online batch failed")
+            for _, k, fut in batch:
+                self._inflight.pop(k, None)
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        classifier.metrics.observe("online_batch_seconds", time.perf_counter() - started)
+        classifier.metrics.inc("online_batches_total")
+        results = {k: p for (_, k, _), p in zip(batch, preds)}
+        for _, k, fut in batch:
+            self._inflight.pop(k, None)
+            if not fut.done():
+                fut.set_result(results[k])
+        if self._cache is not None:
+            # Callers already have their answers; the write runs off the event loop. Empty
+            # predictions (model exhausted or invalid) are retried next time instead of cached
+            fresh = {k: p for k, p in results.items() if p.get("c1") is not None}
+            try:
+                await asyncio.to_thread(self._cache.put_many, classifier.fingerprint, fresh)
+            except Exception:
+                logging.getLogger("online").exception("Online cache write failed")
+
+    async def close(self) -> None:
+        self._loop_task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
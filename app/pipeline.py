@@ -1,48 +1,131 @@
 from __future__ import annotations
 
-import csv
+import asyncio
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import json
 import re
+import threading
 from datetime import datetime
 import logging
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Callable, Iterator, List, Dict, Any
+from uuid import uuid4
 
 from google.cloud import bigquery
 
 from .config import Config
-from .bq import query_invoices_by_month
+from .backends import ModelBackend, VertexBackend
+from .batch import BatchPrediction, BatchRunner, VertexBatchRunner
+from .bq import (
+    BigQueryOutput,
+    iter_invoice_pages,
+    query_invoices_by_fingerprints,
+    query_invoices_by_month,
+    query_invoices_by_month_range,
+    query_month_descriptions,
+    query_month_fingerprints,
+)
+from .cache import ResultCache
+from .checkpoint import IncrementalState, RunCheckpoint, open_store
 from .classifier import GeminiClassifier
-from .storage import upload_to_gcs
+from .cluster import ClusterIndex
+from .metrics import REGISTRY, Metrics
+from .predictions import PredictionTable
+from .prefilter import DEFAULT_THRESHOLD, KeywordPreClassifier
+from .ratelimit import RateLimiter
+from .resources import Resources
+from .rules import CategoryRules
+from .storage import gcs_upload_stream, upload_to_gcs
+from .writers import OUTPUT_FORMATS, OutputWriter, TeeOutput, enrich_row, open_writer
 
 
+# Rows handed to the output writer (and logged) at a time when writing an in-memory run
+WRITE_BATCH_ROWS = 5000
+# Above this many missing fingerprints, fetch the whole month instead of passing them as a parameter
+MAX_FINGERPRINT_PARAMS = 20_000
+# Months of a backfill written and uploaded at the same time
+BACKFILL_EXPORT_WORKERS = 4
+CONTENT_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
 MONTH_RE = re.compile(r"^(0[1-9]|1[0-2])-(19|20)\d\d$")
 
-# Heuristic post-correction for obvious food/meat/seafood disambiguation
-MEAT_KEYWORDS = {
-    "pork", "bacon", "beef", "chicken", "lamb", "ham", "sausage", "duck", "turkey", "meat",
-}
-SEAFOOD_KEYWORDS = {
-    "fish", "shrimp", "prawn", "squid", "octopus", "crab", "lobster", "salmon", "tuna", "mackerel",
-}
-FOOD_PRODUCE = {"Fruit and Vegetables"}
-MEAT_CATEGORY = "Meat and Poultry"
-SEAFOOD_CATEGORY = "Seafood"
 
+class PipelineCancelled(Exception):
+    """Raised inside a run when its cancel event is set."""
+
+
+def load_categories(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        categories: List[str] = json.load(f)
+        if not isinstance(categories, list) or not all(isinstance(x, str) for x in categories):
+            raise ValueError("allowed_categories.json must be a JSON array of strings")
+        if not categories:
+            raise ValueError("allowed_categories.json must not be empty")
+    return categories
+
+
+def load_aliases(path: str | None) -> Dict[str, str] | None:
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        aliases = json.load(f)
+    if not isinstance(aliases, dict) or not all(isinstance(k, str) and isinstance(v, str) for k, v in aliases.items()):
+        raise ValueError("category aliases file must be a JSON object of alias -> category")
+    return aliases
+
+
+def _enrich_row(r: Dict[str, Any], pred: Dict[str, object], counters: Dict[str, int]) -> Dict[str, Any]:
+    rr = enrich_row(r, pred)
+    _count_missing(rr, counters)
+    return rr
 
-def _is_like(text: str, keys: set[str]) -> bool:
-    t = (text or "").lower()
-    return any(k in t for k in keys)
 
+def _count_missing(rr: Dict[str, Any], counters: Dict[str, int]) -> None:
+    s1, s2 = rr.get("relevance_score"), rr.get("second_relevance_score")
+    if s1 is None or s2 is None:
+        counters["missing_scores"] += 1
+    if rr.get("predicted_category") is None or rr.get("second_category") is None or s1 is None or s2 is None:
+        counters["missing_any_field"] += 1
 
-def adjust_food_prediction(desc: str, c1: str, s1: float, c2: str, s2: float) -> tuple[str, float, str, float]:
-    # Meat rule: if meat-like but predicted produce, switch to meat
-    if _is_like(desc, MEAT_KEYWORDS) and c1 in FOOD_PRODUCE:
-        return MEAT_CATEGORY, max(s1, 0.9), c1, min(s2, 0.1)
-    # Seafood rule: if seafood-like but predicted produce, switch to seafood
-    if _is_like(desc, SEAFOOD_KEYWORDS) and c1 in FOOD_PRODUCE:
-        return SEAFOOD_CATEGORY, max(s1, 0.9), c1, min(s2, 0.1)
-    return c1, s1, c2, s2
+
+def _count_missing_table(predictions: PredictionTable, counters: Dict[str, int]) -> None:
+    # Same counts as `_count_missing` over every row, without building the rows
+    missing_scores, missing_any = predictions.missing()
+    counters["missing_scores"] += missing_scores
+    counters["missing_any_field"] += missing_any
+
+
+def _local_output_path(month: str, output_format: str = "csv") -> tuple[str, Path]:
+    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    # Runs for the same month can start in the same second (API jobs, shards, backfills)
+    file_name = f"product-category_{month}_{ts}_{uuid4().hex[:6]}.{output_format}"
+    out_dir = Path("output")
+    return file_name, out_dir / file_name
+
+
+def _output_sink(
+    cfg: Config,
+    blob_path: str,
+    local_path: Path,
+    direct_upload: bool,
+    output_format: str,
+    storage_client: Any = None,
+):
+    if direct_upload:
+        return gcs_upload_stream(
+            cfg.gcs_bucket, blob_path, content_type=CONTENT_TYPES[output_format], client=storage_client
+        )
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    return open(local_path, "wb")
+
+
+def _month_range(month_from: str, month_to: str) -> List[str]:
+    (m1, y1), (m2, y2) = (map(int, m.split("-")) for m in (month_from, month_to))
+    first, last = y1 * 12 + m1 - 1, y2 * 12 + m2 - 1
+    if first > last:
+        raise ValueError("month_from must not be after month_to")
+    return [f"{i % 12 + 1:02d}-{i // 12}" for i in range(first, last + 1)]
 
 
 def run_pipeline(
@@ -54,137 +137,892 @@ def run_pipeline(
     batch_size: int = 8,
     concurrency: int = 4,
     deduplicate: bool = True,
+    stream: bool = False,
+    page_size: int | None = None,
+    engine: str | None = None,
+    prefilter: bool = True,
+    checkpoint: bool = True,
+    resume: str | None = None,
+    output_format: str | None = None,
+    incremental: bool = False,
+    bq_client: bigquery.Client | None = None,
+    model_backend: ModelBackend | None = None,
+    on_progress: Callable[[Dict[str, Any]], None] | None = None,
+    cancel_event: threading.Event | None = None,
+    resources: Resources | None = None,
+    batch_runner: BatchRunner | None = None,
 ) -> Dict[str, Any]:
+    """
+    Run BigQuery -> Gemini -> CSV/Parquet -> GCS for one month.
+
+    With `stream=True` the month is read, classified and written page by page, so peak memory
+    scales with `page_size` rather than with the number of rows in the month.
+
+    `engine` selects the classification engine: "threads" (fixed thread pool) or "async"
+    (asyncio with a global rate limiter and adaptive concurrency). Defaults to CLASSIFY_ENGINE.
+
+    With `prefilter` and CATEGORY_KEYWORDS_PATH set, confident keyword matches are answered
+    locally and only ambiguous descriptions go to the model.
+
+    When CHECKPOINT_URI is set (and `checkpoint` is true) completed chunks, and in streaming
+    mode completed pages, are persisted under a run ID returned in the summary. Passing that
+    ID as `resume` continues the run: finished chunks are not sent to the model again and, in
+    streaming mode, BigQuery reading starts after the rows already written. Resuming an
+    in-memory run re-queries the month but only classifies what is missing.
+
+    `output_format` is "csv" or "parquet" (defaults to OUTPUT_FORMAT). Parquet is written in
+    row groups as results arrive. With OUTPUT_STREAM_UPLOAD the file is uploaded to GCS while
+    it is written instead of being staged on local disk first (ignored for dry runs).
+
+    With `incremental` the previous output for the month (kept under CHECKPOINT_URI) is
+    reused: only rows whose fingerprint is new, e.g. late-arriving invoices or edited
+    descriptions, are downloaded and classified, rows that disappeared are dropped, and the
+    merged month is written as a fresh export.
+
+    With BATCH_PREDICTION_MIN_ROWS set, a classification covering at least that many rows
+    is sent as one Vertex AI batch prediction job instead of online calls (not for streamed
+    runs, which classify page by page).
+
+    `bq_client` and `model_backend` replace the BigQuery client and the Vertex AI model (the
+    benchmark harness passes local fakes); `batch_runner` likewise replaces batch prediction. `resources` supplies long-lived clients and the
+    classifier from a process-wide `Resources` (the API server) instead of building them
+    for this run.
+
+    The summary's `metrics` entry holds this run's stage timings
+    (`pipeline_stage_seconds_total`), model calls by tier and outcome, token usage and
+    call/chunk latency histograms; the same series accumulate in `metrics.REGISTRY`.
+
+    `on_progress` receives progress snapshots (stage plus the counters that are logged) as
+    the run advances. Setting `cancel_event` stops the run at the next progress point with
+    `PipelineCancelled`; completed chunks stay checkpointed.
+    """
     log = logging.getLogger("pipeline")
-    log.info(f"Starting pipeline | month={month} | limit={limit} | dry_run={dry_run}")
+    log.info(f"Starting pipeline | month={month} | limit={limit} | dry_run={dry_run} | stream={stream}")
     if not MONTH_RE.match(month):
         raise ValueError("month must be MM-YYYY")
+    engine = engine or cfg.classify_engine
+    if engine not in ("threads", "async"):
+        raise ValueError("engine must be 'threads' or 'async'")
+    output_format = output_format or cfg.output_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
 
-    # Load allowed categories
-    with open(cfg.categories_path, "r", encoding="utf-8") as f:
-        categories: List[str] = json.load(f)
-        if not isinstance(categories, list) or not all(isinstance(x, str) for x in categories):
-            raise ValueError("allowed_categories.json must be a JSON array of strings")
-        if not categories:
-            raise ValueError("allowed_categories.json must not be empty")
-    log.info(f"Loaded allowed categories | count={len(categories)}")
+    def report(stage: str, **fields: Any) -> None:
+        if cancel_event is not None and cancel_event.is_set():
+            raise PipelineCancelled(f"run for {month} cancelled during {stage}")
+        if on_progress is not None:
+            on_progress({"stage": stage, **fields})
+
+    report("setup")
+
+    state: IncrementalState | None = None
+    if incremental:
+        if not cfg.checkpoint_uri:
+            raise ValueError("incremental requires CHECKPOINT_URI to be set")
+        if stream or limit is not None or resume:
+            raise ValueError("incremental cannot be combined with stream, limit or resume")
+        state = IncrementalState(open_store(cfg.checkpoint_uri), month)
+
+    ckpt: RunCheckpoint | None = None
+    if state is None and (resume or (checkpoint and cfg.checkpoint_uri)):
+        if not cfg.checkpoint_uri:
+            raise ValueError("resume requires CHECKPOINT_URI to be set")
+        store = open_store(cfg.checkpoint_uri)
+        if resume:
+            ckpt = RunCheckpoint.load(store, resume)
+            if ckpt.manifest["month"] != month:
+                raise ValueError(f"run {resume} is for month {ckpt.manifest['month']}, not {month}")
+            # Rows must be read exactly as in the original run for the saved offsets to line up
+            params = ckpt.manifest["params"]
+            limit, stream, page_size, deduplicate = (
+                params["limit"], params["stream"], params["page_size"], params["deduplicate"]
+            )
+            log.info(
+                f"Resuming run | run_id={resume} | rows_done={ckpt.manifest['rows_done']} | pages_done={ckpt.manifest['pages_done']}"
+            )
+        else:
+            page_size = page_size or cfg.bq_page_size or 5000
+            ckpt = RunCheckpoint.create(
+                store,
+                month,
+                {"limit": limit, "stream": stream, "page_size": page_size, "deduplicate": deduplicate},
+            )
+            log.info(f"Checkpointing run | run_id={ckpt.run_id} | uri={cfg.checkpoint_uri}")
 
     # BigQuery client
-    bq_client = bigquery.Client(project=cfg.gcp_project_id)
-    log.info(f"Querying BigQuery | table={cfg.table_id} | month={month} | limit={limit}")
-    rows = query_invoices_by_month(bq_client, cfg.table_id, month, limit)
-    log.info(f"BigQuery returned rows | rows={len(rows)}")
+    if bq_client is None:
+        bq_client = resources.bq_client(cfg) if resources is not None else bigquery.Client(project=cfg.gcp_project_id)
+    storage_client = resources.storage_client() if resources is not None and not dry_run else None
 
-    # Prepare descriptions for classification
-    descriptions: List[str] = []
-    for r in rows:
-        val = str(r.get("item_description") or "").strip()
-        descriptions.append(val)
+    metrics = Metrics(parent=REGISTRY)
+    classifier, preclassifiers, rules, owns_classifier = _setup_model(cfg, model_backend, metrics, prefilter, resources)
 
-    # Classify
-    log.info(f"Initializing Gemini classifier | model={cfg.gemini_model} | location={cfg.gcp_location}")
-    classifier = GeminiClassifier(
-        project=cfg.gcp_project_id,
-        location=cfg.gcp_location,
-        model_name=cfg.gemini_model,
-        categories=categories,
-    )
+    cache = None
+    if cfg.classify_cache_path:
+        cache = ResultCache(cfg.classify_cache_path, max_entries=cfg.classify_cache_max_entries or 500_000)
+        log.info(f"Using result cache | path={cfg.classify_cache_path} | max_entries={cache.max_entries}")
+    elif stream and deduplicate:
+        # Bounded in-memory cache so repeated descriptions across pages are classified once
+        cache = ResultCache(":memory:", max_entries=cfg.classify_cache_max_entries or 200_000)
 
-    log.info(
-        f"Classifying descriptions | count={len(descriptions)} | batch_size={batch_size} | concurrency={concurrency} | dedupe={deduplicate}"
-    )
-    predictions = classifier.classify_batch(
-        descriptions,
+    stats: Dict[str, int] = {
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "prefilter_checked": 0,
+        "prefilter_hits": 0,
+        "resumed": 0,
+        "clustered": 0,
+        "rule_hits": 0,
+        "incremental_new": 0,
+        "incremental_reused": 0,
+        "incremental_removed": 0,
+    }
+    counters: Dict[str, int] = {"missing_scores": 0, "missing_any_field": 0}
+    file_name, local_path = _local_output_path(month, output_format)
+    blob_path = f"{cfg.gcs_output_prefix.rstrip('/')}/{month}/{file_name}"
+    direct_upload = cfg.output_stream_upload and not dry_run
+    classify_kwargs: Dict[str, Any] = dict(
         progress_every=progress_every,
         batch_size=batch_size,
         concurrency=concurrency,
         deduplicate=deduplicate,
+        cache=cache,
+        stats=stats,
+        max_input_tokens=cfg.classify_max_input_tokens,
+        max_output_tokens=cfg.classify_max_output_tokens,
+        max_batch_items=cfg.classify_max_batch_items,
+        preclassifiers=preclassifiers,
+        cluster_threshold=cfg.classify_cluster_threshold,
+        rules=rules,
     )
-    log.info("Classification finished")
-
-    # Merge predictions back to records (no heuristic override; model-only values)
-    enriched: List[Dict[str, Any]] = []
-    missing_score_count = 0
-    missing_any_count = 0
-    for r, pred in zip(rows, predictions):
-        rr = dict(r)
-        # add product_description from item_description
-        product_desc = str(r.get("item_description") or "").strip()
-        rr["product_description"] = product_desc
-        # take model output directly; if model failed, values may be None
-        c1 = pred.get("c1")
-        s1 = pred.get("s1")
-        c2 = pred.get("c2")
-        s2 = pred.get("s2")
-        if s1 is None or s2 is None:
-            missing_score_count += 1
-        if c1 is None or c2 is None or s1 is None or s2 is None:
-            missing_any_count += 1
-        rr["predicted_category"] = c1
-        rr["relevance_score"] = s1
-        rr["second_category"] = c2
-        rr["second_relevance_score"] = s2
-        enriched.append(rr)
+    classify_kwargs["on_progress"] = lambda done, total: report("classify", classified_unique=done, unique_total=total)
+    batch = _batch_prediction(cfg, batch_runner, model_backend, storage_client)
+    if batch is not None and not stream:
+        classify_kwargs["batch_job"] = batch
+    if ckpt is not None:
+        classify_kwargs["known"] = ckpt.load_results() if resume else None
+        classify_kwargs["on_chunk_done"] = ckpt.save_chunk
+    if engine == "async":
+        # One limiter per run so its budget spans every page of a streamed month
+        classify_kwargs["limiter"] = RateLimiter(cfg.gemini_requests_per_minute, cfg.gemini_tokens_per_minute)
+        classify_kwargs["max_concurrency"] = cfg.classify_max_concurrency
+        classify_kwargs["target_latency"] = cfg.classify_target_latency
+    if direct_upload:
+        log.info(f"Writing {output_format} directly to GCS | bucket={cfg.gcs_bucket} | blob={blob_path}")
+    else:
+        log.info(f"Writing {output_format} | path={str(local_path)}")
+    results = _results_output(cfg, bq_client, month, dry_run)
+    new_state: tuple[List[tuple[int, Dict[str, Any]]], Dict[str, Any]] | None = None
+    try:
+        with _output_sink(cfg, blob_path, local_path, direct_upload, output_format, storage_client) as sink:
+            writer = _open_writers(cfg, output_format, sink, results)
+            if state is not None:
+                total_rows, processed, new_state = _run_incremental(
+                    cfg, bq_client, classifier, month, writer, classify_kwargs, counters, report, state
+                )
+            elif stream:
+                total_rows = _run_streaming(
+                    cfg,
+                    bq_client,
+                    classifier,
+                    month,
+                    limit,
+                    page_size or cfg.bq_page_size or 5000,
+                    writer,
+                    classify_kwargs,
+                    counters,
+                    report,
+                    ckpt,
+                )
+                processed = total_rows
+            else:
+                total_rows, processed = _run_in_memory(
+                    cfg, bq_client, classifier, month, limit, writer, classify_kwargs, counters, report
+                )
+            with metrics.stage("write"):
+                writer.close()
+    finally:
+        if cache is not None:
+            cache.close()
+        if owns_classifier:
+            classifier.close()
 
     log.info(
-        f"Missing counters | missing_scores={missing_score_count} | missing_any_field={missing_any_count}"
+        f"Missing counters | missing_scores={counters['missing_scores']} | missing_any_field={counters['missing_any_field']}"
     )
 
-    # Write CSV locally
-    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    file_name = f"product-category_{month}_{ts}.csv"
-    out_dir = Path("output")
-    out_dir.mkdir(parents=True, exist_ok=True)
-    local_path = out_dir / file_name
-
-    if enriched:
-        # Ensure product_description is placed before the prediction columns
-        pred_cols = [
-            "predicted_category",
-            "relevance_score",
-            "second_category",
-            "second_relevance_score",
-        ]
-        base_fields = [k for k in enriched[0].keys() if k not in pred_cols]
-        if "product_description" in base_fields:
-            base_fields = [k for k in base_fields if k != "product_description"] + [
-                "product_description"
-            ]
-        fieldnames = base_fields + pred_cols
-    else:
-        fieldnames = [
-            "product_description",
-            "predicted_category",
-            "relevance_score",
-            "second_category",
-            "second_relevance_score",
-        ]
-
-    log.info(f"Writing CSV | path={str(local_path)}")
-    with open(local_path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        total = len(enriched)
-        if total == 0:
-            pass
-        for idx, row in enumerate(enriched, start=1):
-            writer.writerow(row)
-            if idx % max(1, progress_every) == 0 or idx == total:
-                log.info(f"CSV progress | written={idx}/{total}")
-    log.info(f"CSV written | rows={len(enriched)}")
-
     # Upload to GCS unless dry_run
     gcs_uri = None
-    if not dry_run:
-        blob_path = f"{cfg.gcs_output_prefix.rstrip('/')}/{month}/{file_name}"
+    if direct_upload:
+        gcs_uri = f"gs://{cfg.gcs_bucket}/{blob_path}"
+        log.info(f"Uploaded to GCS | gcs_uri={gcs_uri}")
+    elif not dry_run:
+        report("upload", rows_written=processed)
         log.info(f"Uploading to GCS | bucket={cfg.gcs_bucket} | blob={blob_path}")
-        gcs_uri = upload_to_gcs(cfg.gcs_bucket, blob_path, str(local_path))
+        with metrics.stage("upload"):
+            gcs_uri = upload_to_gcs(cfg.gcs_bucket, blob_path, str(local_path), client=storage_client)
         log.info(f"Uploaded to GCS | gcs_uri={gcs_uri}")
 
+    # Only now is the month's output in place; saving earlier would let a failed write or
+    # upload leave state that the next incremental run treats as already exported
+    if state is not None and new_state is not None:
+        state.save(*new_state)
+
+    summary = {
+        "month": month,
+        "run_id": ckpt.run_id if ckpt is not None else None,
+        "engine": engine,
+        "total_rows": total_rows,
+        "processed": processed,
+        "missing_scores": counters["missing_scores"],
+        "missing_any_field": counters["missing_any_field"],
+        "output_format": output_format,
+        "local_path": None if direct_upload else str(local_path),
+        "local_csv": str(local_path) if output_format == "csv" and not direct_upload else None,
+        "gcs_uri": gcs_uri,
+        "results_table": results.partition if results is not None else None,
+        "cache_hits": stats["cache_hits"],
+        "cache_misses": stats["cache_misses"],
+        "prefilter_hits": stats["prefilter_hits"],
+        "prefilter_fraction": (
+            round(stats["prefilter_hits"] / stats["prefilter_checked"], 4) if stats["prefilter_checked"] else 0.0
+        ),
+        "resumed": stats["resumed"],
+        "clustered": stats["clustered"],
+        "rule_hits": stats["rule_hits"],
+    }
+    if state is not None:
+        summary.update(
+            incremental_new=stats["incremental_new"],
+            incremental_reused=stats["incremental_reused"],
+            incremental_removed=stats["incremental_removed"],
+        )
+    metrics.inc("pipeline_runs_total")
+    metrics.inc("pipeline_rows_total", total_rows)
+    for source in ("cache_hits", "prefilter_hits", "resumed", "clustered"):
+        metrics.inc("items_skipped_model_total", stats[source], source=source)
+    summary["metrics"] = metrics.snapshot()
+    if ckpt is not None:
+        ckpt.mark_complete(summary)
+    return summary
+
+
+def run_backfill(
+    cfg: Config,
+    month_from: str,
+    month_to: str,
+    dry_run: bool = False,
+    progress_every: int = 1,
+    batch_size: int = 8,
+    concurrency: int = 4,
+    deduplicate: bool = True,
+    engine: str | None = None,
+    prefilter: bool = True,
+    output_format: str | None = None,
+    bq_client: bigquery.Client | None = None,
+    model_backend: ModelBackend | None = None,
+    on_progress: Callable[[Dict[str, Any]], None] | None = None,
+    cancel_event: threading.Event | None = None,
+    resources: Resources | None = None,
+    batch_runner: BatchRunner | None = None,
+) -> Dict[str, Any]:
+    """
+    Run the pipeline for every month from `month_from` to `month_to` (MM-YYYY, inclusive).
+
+    The range is read with a single BigQuery scan and classified as one batch, so a
+    description that recurs across months is sent to the model once, and one classifier
+    (and, for the async engine, one rate limiter) spans the whole range. Results are then
+    split by month and each month gets the same export as `run_pipeline` (one file per
+    month under its own GCS prefix), written and uploaded in parallel. Months without rows
+    still get an empty export.
+
+    Arguments mirror `run_pipeline`; checkpoints, streaming and incremental reuse are not
+    available for ranges. The summary has totals for the range and a `months` list with
+    each month's rows and output locations.
+    """
+    log = logging.getLogger("pipeline")
+    log.info(f"Starting backfill | from={month_from} | to={month_to} | dry_run={dry_run}")
+    if not MONTH_RE.match(month_from) or not MONTH_RE.match(month_to):
+        raise ValueError("month_from and month_to must be MM-YYYY")
+    months = _month_range(month_from, month_to)
+    engine = engine or cfg.classify_engine
+    if engine not in ("threads", "async"):
+        raise ValueError("engine must be 'threads' or 'async'")
+    output_format = output_format or cfg.output_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+
+    def report(stage: str, **fields: Any) -> None:
+        if cancel_event is not None and cancel_event.is_set():
+            raise PipelineCancelled(f"backfill {month_from}..{month_to} cancelled during {stage}")
+        if on_progress is not None:
+            on_progress({"stage": stage, **fields})
+
+    report("setup", months=len(months))
+    if bq_client is None:
+        bq_client = resources.bq_client(cfg) if resources is not None else bigquery.Client(project=cfg.gcp_project_id)
+    storage_client = resources.storage_client() if resources is not None and not dry_run else None
+    metrics = Metrics(parent=REGISTRY)
+    classifier, preclassifiers, rules, owns_classifier = _setup_model(cfg, model_backend, metrics, prefilter, resources)
+    cache = None
+    if cfg.classify_cache_path:
+        cache = ResultCache(cfg.classify_cache_path, max_entries=cfg.classify_cache_max_entries or 500_000)
+    stats: Dict[str, int] = {
+        "cache_hits": 0, "cache_misses": 0, "prefilter_checked": 0, "prefilter_hits": 0, "resumed": 0, "clustered": 0,
+        "rule_hits": 0,
+    }
+    counters: Dict[str, int] = {"missing_scores": 0, "missing_any_field": 0}
+    classify_kwargs: Dict[str, Any] = dict(
+        progress_every=progress_every,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        deduplicate=deduplicate,
+        cache=cache,
+        stats=stats,
+        max_input_tokens=cfg.classify_max_input_tokens,
+        max_output_tokens=cfg.classify_max_output_tokens,
+        max_batch_items=cfg.classify_max_batch_items,
+        preclassifiers=preclassifiers,
+        cluster_threshold=cfg.classify_cluster_threshold,
+        rules=rules,
+        on_progress=lambda done, total: report("classify", classified_unique=done, unique_total=total),
+    )
+    batch = _batch_prediction(cfg, batch_runner, model_backend, storage_client)
+    if batch is not None:
+        classify_kwargs["batch_job"] = batch
+    if engine == "async":
+        classify_kwargs["limiter"] = RateLimiter(cfg.gemini_requests_per_minute, cfg.gemini_tokens_per_minute)
+        classify_kwargs["max_concurrency"] = cfg.classify_max_concurrency
+        classify_kwargs["target_latency"] = cfg.classify_target_latency
+    try:
+        log.info(
+            f"Querying BigQuery | table={cfg.bq_month_table or cfg.table_id} | from={month_from} | to={month_to} "
+            f"| columns={','.join(cfg.bq_columns) if cfg.bq_columns else '*'}"
+        )
+        report("query")
+        with metrics.stage("query"):
+            rows = query_invoices_by_month_range(
+                bq_client, cfg.table_id, month_from, month_to, columns=_columns(cfg), month_table=cfg.bq_month_table
+            )
+        log.info(f"BigQuery returned rows | rows={len(rows)} | months={len(months)}")
+        report("classify", total_rows=len(rows))
+        descriptions = [str(r.get("item_description") or "").strip() for r in rows]
+        with metrics.stage("classify"):
+            predictions = _classify(classifier, descriptions, classify_kwargs)
+        log.info(f"Classification finished | cache_hits={stats['cache_hits']} | cache_misses={stats['cache_misses']}")
+    finally:
+        if cache is not None:
+            cache.close()
+        if owns_classifier:
+            classifier.close()
+
+    # Rows stay as queried; each month's predictions are a view of the run's table
+    positions: Dict[str, List[int]] = defaultdict(list)
+    by_month: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for i, r in enumerate(rows):
+        month = r.pop("_month")
+        positions[month].append(i)
+        by_month[month].append(r)
+    _count_missing_table(predictions, counters)
+
+    report("write", months=len(months))
+    with ThreadPoolExecutor(max_workers=min(len(months), BACKFILL_EXPORT_WORKERS)) as pool:
+        futures = [
+            pool.submit(
+                _export_month,
+                cfg,
+                m,
+                by_month.get(m, []),
+                output_format,
+                dry_run,
+                metrics,
+                report,
+                storage_client,
+                bq_client,
+                predictions.rows(positions.get(m, [])),
+            )
+            for m in months
+        ]
+        exports = [f.result() for f in futures]
+
+    total_rows = sum(e["rows"] for e in exports)
+    summary: Dict[str, Any] = {
+        "month_from": month_from,
+        "month_to": month_to,
+        "engine": engine,
+        "total_rows": total_rows,
+        "processed": total_rows,
+        "missing_scores": counters["missing_scores"],
+        "missing_any_field": counters["missing_any_field"],
+        "output_format": output_format,
+        "months": exports,
+        "cache_hits": stats["cache_hits"],
+        "cache_misses": stats["cache_misses"],
+        "prefilter_hits": stats["prefilter_hits"],
+        "prefilter_fraction": (
+            round(stats["prefilter_hits"] / stats["prefilter_checked"], 4) if stats["prefilter_checked"] else 0.0
+        ),
+        "clustered": stats["clustered"],
+        "rule_hits": stats["rule_hits"],
+    }
+    metrics.inc("pipeline_runs_total")
+    metrics.inc("pipeline_rows_total", total_rows)
+    for source in ("cache_hits", "prefilter_hits", "clustered"):
+        metrics.inc("items_skipped_model_total", stats[source], source=source)
+    summary["metrics"] = metrics.snapshot()
+    log.info(f"Backfill finished | months={len(months)} | rows={total_rows}")
+    return summary
+
+
+def _export_month(
+    cfg: Config,
+    month: str,
+    rows: List[Dict[str, Any]],
+    output_format: str,
+    dry_run: bool,
+    metrics: Metrics,
+    report: Callable[..., None],
+    storage_client: Any = None,
+    bq_client: bigquery.Client | None = None,
+    predictions: PredictionTable | None = None,
+) -> Dict[str, Any]:
+    """Write, upload and load one month; `rows` are enriched unless their `predictions` are given."""
+    log = logging.getLogger("pipeline")
+    file_name, local_path = _local_output_path(month, output_format)
+    blob_path = f"{cfg.gcs_output_prefix.rstrip('/')}/{month}/{file_name}"
+    direct_upload = cfg.output_stream_upload and not dry_run
+    results = _results_output(cfg, bq_client, month, dry_run)
+    with _output_sink(cfg, blob_path, local_path, direct_upload, output_format, storage_client) as sink:
+        writer = _open_writers(cfg, output_format, sink, results)
+        _write_all(writer, rows, metrics, report, predictions)
+        with metrics.stage("write"):
+            writer.close()
+    gcs_uri = None
+    if direct_upload:
+        gcs_uri = f"gs://{cfg.gcs_bucket}/{blob_path}"
+    elif not dry_run:
+        with metrics.stage("upload"):
+            gcs_uri = upload_to_gcs(cfg.gcs_bucket, blob_path, str(local_path), client=storage_client)
+    log.info(f"Month exported | month={month} | rows={len(rows)} | gcs_uri={gcs_uri}")
     return {
         "month": month,
-        "total_rows": len(rows),
-        "processed": len(enriched),
-        "local_csv": str(local_path),
+        "rows": len(rows),
+        "local_path": None if direct_upload else str(local_path),
         "gcs_uri": gcs_uri,
+        "results_table": results.partition if results is not None else None,
     }
+
+
+def _results_output(
+    cfg: Config, bq_client: bigquery.Client | None, month: str, dry_run: bool
+) -> BigQueryOutput | None:
+    """Writer loading the month's predictions into BQ_RESULTS_TABLE; dry runs write nothing there."""
+    if not cfg.bq_results_table or dry_run:
+        return None
+    key = list(cfg.bq_results_key or [])
+    if cfg.bq_columns:
+        # Pruned queries only return the selected columns (and item_description)
+        missing = [c for c in key if c not in cfg.bq_columns and c != "item_description"]
+        if missing:
+            raise ValueError(f"BQ_RESULTS_KEY column(s) not in BQ_COLUMNS: {', '.join(missing)}")
+    client = bq_client or bigquery.Client(project=cfg.gcp_project_id)
+    return BigQueryOutput(client, cfg.bq_results_table, month, key, row_group_size=cfg.parquet_row_group_size or 50_000)
+
+
+def _open_writers(cfg: Config, output_format: str, sink: Any, results: BigQueryOutput | None) -> OutputWriter:
+    writer = open_writer(output_format, sink, row_group_size=cfg.parquet_row_group_size or 50_000)
+    return writer if results is None else TeeOutput([writer, results])
+
+
+def _setup_model(
+    cfg: Config,
+    model_backend: ModelBackend | None,
+    metrics: Metrics,
+    prefilter: bool,
+    resources: Resources | None,
+) -> tuple[GeminiClassifier, List[KeywordPreClassifier], CategoryRules | None, bool]:
+    """
+    Classifier, pre-classifiers and category rules for a run, and whether the run owns (and
+    closes) the classifier.
+    """
+    if resources is not None and model_backend is None:
+        return (
+            resources.classifier(cfg).with_metrics(metrics),
+            resources.preclassifiers(cfg, prefilter),
+            resources.rules(cfg),
+            False,
+        )
+    categories = load_categories(cfg.categories_path)
+    logging.getLogger("pipeline").info(f"Loaded allowed categories | count={len(categories)}")
+    classifier = _build_classifier(cfg, categories, model_backend, metrics)
+    return classifier, _build_preclassifiers(cfg, categories, prefilter), _build_rules(cfg, categories), True
+
+
+def _build_classifier(
+    cfg: Config, categories: List[str], model_backend: ModelBackend | None, metrics: Metrics
+) -> GeminiClassifier:
+    log = logging.getLogger("pipeline")
+    log.info(f"Initializing Gemini classifier | model={cfg.gemini_model} | location={cfg.gcp_location}")
+    if model_backend is None and cfg.gemini_context_cache:
+        model_backend = VertexBackend(
+            cfg.gcp_project_id,
+            cfg.gcp_location,
+            cfg.gemini_model,
+            context_cache=True,
+            cache_ttl=cfg.gemini_context_cache_ttl or 3600,
+        )
+    return GeminiClassifier(
+        project=cfg.gcp_project_id,
+        location=cfg.gcp_location,
+        model_name=cfg.gemini_model,
+        categories=categories,
+        aliases=load_aliases(cfg.category_aliases_path),
+        backend=model_backend,
+        metrics=metrics,
+        **_call_options(cfg),
+    )
+
+
+def _call_options(cfg: Config) -> Dict[str, Any]:
+    """Per-call deadline and hedging settings for `GeminiClassifier`."""
+    options: Dict[str, Any] = {"call_timeout": cfg.gemini_call_timeout, "hedge": cfg.gemini_hedge}
+    if cfg.gemini_hedge_min_delay is not None:
+        options["hedge_min_delay"] = cfg.gemini_hedge_min_delay
+    return options
+
+
+def _build_preclassifiers(cfg: Config, categories: List[str], prefilter: bool) -> List[KeywordPreClassifier]:
+    preclassifiers = []
+    if prefilter and cfg.category_keywords_path:
+        preclassifiers.append(
+            KeywordPreClassifier.from_file(
+                cfg.category_keywords_path,
+                categories,
+                threshold=cfg.prefilter_threshold if cfg.prefilter_threshold is not None else DEFAULT_THRESHOLD,
+            )
+        )
+        logging.getLogger("pipeline").info(f"Loaded keyword pre-classifier | path={cfg.category_keywords_path}")
+    return preclassifiers
+
+
+def _build_rules(cfg: Config, categories: List[str]) -> CategoryRules | None:
+    if not cfg.category_rules_path:
+        return None
+    rules = CategoryRules.from_file(cfg.category_rules_path, categories)
+    logging.getLogger("pipeline").info(
+        f"Loaded category rules | path={cfg.category_rules_path} | rules={len(rules.names)}"
+    )
+    return rules
+
+
+def _batch_prediction(
+    cfg: Config, batch_runner: BatchRunner | None, model_backend: ModelBackend | None, storage_client: Any
+) -> BatchPrediction | None:
+    if batch_runner is None:
+        # A replaced online model (the benchmark's fake) must not be bypassed by real batch jobs
+        if cfg.batch_prediction_min_rows is None or model_backend is not None:
+            return None
+        batch_runner = VertexBatchRunner(
+            cfg.gcp_project_id,
+            cfg.gcp_location,
+            cfg.gemini_model,
+            cfg.gcs_bucket,
+            f"{cfg.gcs_output_prefix.rstrip('/')}/batch-prediction",
+            client=storage_client,
+        )
+    return BatchPrediction(
+        batch_runner, cfg.batch_prediction_min_rows or 0, cfg.batch_prediction_poll_seconds or 30.0
+    )
+
+
+def _classify(
+    classifier: GeminiClassifier,
+    descriptions: List[str],
+    classify_kwargs: Dict[str, Any],
+    rows: int | None = None,
+) -> PredictionTable:
+    """Classify with the run's engine; `rows` (default: one per description) decides on batch prediction."""
+    kwargs = dict(classify_kwargs)
+    batch: BatchPrediction | None = kwargs.pop("batch_job", None)
+    if batch is not None and (len(descriptions) if rows is None else rows) >= batch.min_rows:
+        kwargs.pop("limiter", None)
+        kwargs.pop("max_concurrency", None)
+        kwargs.pop("target_latency", None)
+        logging.getLogger("pipeline").info(f"Classifying with batch prediction | descriptions={len(descriptions)}")
+        return classifier.classify_batch_job(descriptions, batch.runner, poll_interval=batch.poll_interval, **kwargs)
+    if "limiter" in kwargs:
+        return asyncio.run(classifier.classify_batch_async(descriptions, **kwargs))
+    return classifier.classify_batch(descriptions, **kwargs)
+
+
+def _columns(cfg: Config) -> List[str] | None:
+    return list(cfg.bq_columns) if cfg.bq_columns else None
+
+
+def _use_distinct(cfg: Config, limit: int | None, classify_kwargs: Dict[str, Any]) -> bool:
+    # A row limit cannot be applied to the aggregated descriptions, and --no-dedupe asks for one call per row
+    return cfg.bq_distinct_descriptions and limit is None and classify_kwargs["deduplicate"]
+
+
+def _distinct_predictions(
+    cfg: Config,
+    bq_client: bigquery.Client,
+    classifier: GeminiClassifier,
+    month: str,
+    classify_kwargs: Dict[str, Any],
+    report: Callable[..., None],
+) -> Dict[str, Dict[str, object]]:
+    """Classify the month's distinct descriptions, aggregated in BigQuery, before any rows are read."""
+    log = logging.getLogger("pipeline")
+    metrics = classifier.metrics
+    with metrics.stage("query"):
+        distinct = query_month_descriptions(bq_client, cfg.table_id, month, month_table=cfg.bq_month_table)
+    descriptions = [str(d["item_description"]) for d in distinct]
+    rows = sum(int(d["n"]) for d in distinct)
+    log.info(f"BigQuery returned distinct descriptions | descriptions={len(descriptions)} | rows={rows}")
+    report("classify", distinct_descriptions=len(descriptions))
+    with metrics.stage("classify"):
+        predictions = _classify(classifier, descriptions, classify_kwargs, rows=rows)
+    return dict(zip(descriptions, predictions))
+
+
+def _predict(
+    classifier: GeminiClassifier,
+    descriptions: List[str],
+    classify_kwargs: Dict[str, Any],
+    known: Dict[str, Dict[str, object]] | None,
+) -> PredictionTable:
+    if known is None:
+        return _classify(classifier, descriptions, classify_kwargs)
+    # Descriptions BigQuery trimmed differently from Python (rare) are classified here
+    missing = list(dict.fromkeys(d for d in descriptions if d not in known))
+    if missing:
+        known.update(zip(missing, _classify(classifier, missing, classify_kwargs)))
+    return PredictionTable.from_keys(classifier.categories, descriptions, known)
+
+
+def _run_in_memory(
+    cfg: Config,
+    bq_client: bigquery.Client,
+    classifier: GeminiClassifier,
+    month: str,
+    limit: int | None,
+    writer: OutputWriter,
+    classify_kwargs: Dict[str, Any],
+    counters: Dict[str, int],
+    report: Callable[..., None],
+) -> tuple[int, int]:
+    log = logging.getLogger("pipeline")
+    log.info(
+        f"Querying BigQuery | table={cfg.bq_month_table or cfg.table_id} | month={month} | limit={limit} "
+        f"| columns={','.join(cfg.bq_columns) if cfg.bq_columns else '*'}"
+    )
+    report("query")
+    metrics = classifier.metrics
+    known = None
+    if _use_distinct(cfg, limit, classify_kwargs):
+        known = _distinct_predictions(cfg, bq_client, classifier, month, classify_kwargs, report)
+    with metrics.stage("query"):
+        rows = query_invoices_by_month(
+            bq_client, cfg.table_id, month, limit, columns=_columns(cfg), month_table=cfg.bq_month_table
+        )
+    log.info(f"BigQuery returned rows | rows={len(rows)}")
+    report("classify", total_rows=len(rows))
+
+    # Prepare descriptions for classification
+    descriptions: List[str] = []
+    for r in rows:
+        val = str(r.get("item_description") or "").strip()
+        descriptions.append(val)
+
+    log.info(
+        f"Classifying descriptions | count={len(descriptions)} | batch_size={classify_kwargs['batch_size']} | "
+        f"concurrency={classify_kwargs['concurrency']} | dedupe={classify_kwargs['deduplicate']}"
+    )
+    with metrics.stage("classify"):
+        predictions = _predict(classifier, descriptions, classify_kwargs, known)
+    stats = classify_kwargs["stats"]
+    log.info(f"Classification finished | cache_hits={stats['cache_hits']} | cache_misses={stats['cache_misses']}")
+
+    # Predictions are merged into the records by the writer, one write batch at a time
+    # (no heuristic override; model-only values)
+    _count_missing_table(predictions, counters)
+    _write_all(writer, rows, metrics, report, predictions)
+    return len(rows), len(rows)
+
+
+def _write_all(
+    writer: OutputWriter,
+    rows: List[Dict[str, Any]],
+    metrics: Metrics,
+    report: Callable[..., None],
+    predictions: PredictionTable | None = None,
+) -> None:
+    """Write enriched `rows`, or source `rows` with their `predictions`, in batches."""
+    log = logging.getLogger("pipeline")
+    total = len(rows)
+    for start in range(0, total, WRITE_BATCH_ROWS):
+        part = rows[start : start + WRITE_BATCH_ROWS]
+        with metrics.stage("write"):
+            if predictions is None:
+                writer.write_rows(part)
+            else:
+                writer.write_predictions(part, predictions[start : start + WRITE_BATCH_ROWS])
+        log.info(f"Write progress | written={start + len(part)}/{total}")
+        report("write", rows_written=start + len(part), total_rows=total)
+    log.info(f"Output written | rows={total}")
+
+
+def _run_incremental(
+    cfg: Config,
+    bq_client: bigquery.Client,
+    classifier: GeminiClassifier,
+    month: str,
+    writer: OutputWriter,
+    classify_kwargs: Dict[str, Any],
+    counters: Dict[str, int],
+    report: Callable[..., None],
+    state: IncrementalState,
+) -> tuple[int, int, tuple[List[tuple[int, Dict[str, Any]]], Dict[str, Any]]]:
+    """Write the month from the previous state plus newly classified rows; returns the new state unsaved."""
+    log = logging.getLogger("pipeline")
+    metrics = classifier.metrics
+    stats = classify_kwargs["stats"]
+    report("query")
+    with metrics.stage("query"):
+        fps = query_month_fingerprints(
+            bq_client, cfg.table_id, month, columns=_columns(cfg), month_table=cfg.bq_month_table
+        )
+    previous = state.load()
+
+    # Identical rows share a fingerprint, so compare multisets rather than sets
+    current = Counter(fps)
+    missing = Counter({fp: n - len(previous.get(fp, ())) for fp, n in current.items() if n > len(previous.get(fp, ()))})
+    removed = sum(max(0, len(rows) - current.get(fp, 0)) for fp, rows in previous.items())
+    log.info(
+        f"Incremental diff | rows={len(fps)} | new_or_changed={sum(missing.values())} | removed={removed} "
+        f"| previous={sum(len(v) for v in previous.values())}"
+    )
+
+    fetched: Dict[int, List[Dict[str, Any]]] = {}
+    if missing:
+        wanted = list(missing) if len(missing) <= MAX_FINGERPRINT_PARAMS else None
+        with metrics.stage("query"):
+            new_rows = query_invoices_by_fingerprints(
+                bq_client, cfg.table_id, month, wanted, columns=_columns(cfg), month_table=cfg.bq_month_table
+            )
+        for r in new_rows:
+            fp = int(r.pop("_row_fp"))
+            if len(fetched.get(fp, ())) < missing.get(fp, 0):
+                fetched.setdefault(fp, []).append(r)
+    to_classify = [(fp, r) for fp, rows in fetched.items() for r in rows]
+
+    report("classify", total_rows=len(to_classify))
+    descriptions = [str(r.get("item_description") or "").strip() for _, r in to_classify]
+    with metrics.stage("classify"):
+        predictions = _classify(classifier, descriptions, classify_kwargs) if descriptions else []
+    # Round-trip through JSON so new rows carry the same value types as the stored ones
+    classified: Dict[int, List[Dict[str, Any]]] = {}
+    for (fp, r), pred in zip(to_classify, predictions):
+        rr = json.loads(json.dumps(_enrich_row(r, pred, counters), ensure_ascii=False, default=str))
+        classified.setdefault(fp, []).append(rr)
+
+    merged: List[tuple[int, Dict[str, Any]]] = []
+    taken: Counter = Counter()
+    for fp in fps:
+        reuse = previous.get(fp, [])
+        i = taken[fp]
+        taken[fp] += 1
+        if i < len(reuse):
+            rr = reuse[i]
+            _count_missing(rr, counters)
+        elif i - len(reuse) < len(classified.get(fp, ())):
+            rr = classified[fp][i - len(reuse)]
+        else:
+            # Deleted between the fingerprint query and the fetch
+            continue
+        merged.append((fp, rr))
+
+    stats["incremental_new"] += len(to_classify)
+    stats["incremental_reused"] += len(merged) - len(to_classify)
+    stats["incremental_removed"] += removed
+    _write_all(writer, [rr for _, rr in merged], metrics, report)
+    return len(merged), len(merged), (merged, {"new": len(to_classify), "removed": removed})
+
+
+def _timed_pages(pages: Iterator[List[Dict[str, Any]]], metrics: Metrics) -> Iterator[List[Dict[str, Any]]]:
+    # Fetching a page (BigQuery paging/download) counts as the "query" stage
+    while True:
+        with metrics.stage("query"):
+            page = next(pages, None)
+        if page is None:
+            return
+        yield page
+
+
+def _run_streaming(
+    cfg: Config,
+    bq_client: bigquery.Client,
+    classifier: GeminiClassifier,
+    month: str,
+    limit: int | None,
+    page_size: int,
+    writer: OutputWriter,
+    classify_kwargs: Dict[str, Any],
+    counters: Dict[str, int],
+    report: Callable[..., None],
+    ckpt: RunCheckpoint | None = None,
+) -> int:
+    log = logging.getLogger("pipeline")
+    metrics = classifier.metrics
+    start_index = int(ckpt.manifest["rows_done"]) if ckpt is not None else 0
+    log.info(
+        f"Streaming BigQuery | table={cfg.bq_month_table or cfg.table_id} | month={month} | limit={limit} | page_size={page_size} "
+        f"| storage_api={cfg.bq_use_storage_api} | start_index={start_index}"
+    )
+    known = None
+    if _use_distinct(cfg, limit, classify_kwargs):
+        known = _distinct_predictions(cfg, bq_client, classifier, month, classify_kwargs, report)
+    elif classify_kwargs.get("cluster_threshold") is not None:
+        # Near-duplicates on different pages must share a representative, so clusters outlive a page
+        classify_kwargs = dict(classify_kwargs, cluster_index=ClusterIndex(classify_kwargs["cluster_threshold"]))
+    pages = iter_invoice_pages(
+        bq_client,
+        cfg.table_id,
+        month,
+        limit,
+        page_size=page_size,
+        use_storage_api=cfg.bq_use_storage_api,
+        start_index=start_index,
+        # Checkpointed runs need a deterministic row order so a resume can skip by offset
+        stable_order=ckpt is not None,
+        columns=_columns(cfg),
+        month_table=cfg.bq_month_table,
+    )
+    written = 0
+    # Replay pages finished by the interrupted run
+    if ckpt is not None and start_index:
+        for saved in ckpt.iter_saved_pages():
+            for rr in saved:
+                _count_missing(rr, counters)
+            writer.write_rows(saved)
+            written += len(saved)
+        log.info(f"Replayed checkpointed pages | rows={written}")
+
+    for page_no, page in enumerate(_timed_pages(pages, metrics), start=1):
+        descriptions = [str(r.get("item_description") or "").strip() for r in page]
+        with metrics.stage("classify"):
+            predictions = _predict(classifier, descriptions, classify_kwargs, known)
+        enriched = [_enrich_row(r, pred, counters) for r, pred in zip(page, predictions)]
+        with metrics.stage("write"):
+            writer.write_rows(enriched)
+        if ckpt is not None:
+            ckpt.save_page(enriched, len(page))
+        written += len(page)
+        log.info(f"Page done | page={page_no} | rows={len(page)} | written={written}")
+        report("write", rows_written=written, pages=page_no)
+    stats = classify_kwargs["stats"]
+    log.info(
+        f"Output written | rows={written} | cache_hits={stats['cache_hits']} | cache_misses={stats['cache_misses']}"
+    )
+    return written
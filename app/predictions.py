@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator, List, Sequence, overload
+
+import numpy as np
+
+# Scores are stored as float32; materialized values are rounded back to this many decimals
+SCORE_DECIMALS = 6
+
+
+class PredictionTable(Sequence[Dict[str, object]]):
+    """
+    Predictions for a list of rows, stored by column.
+
+    Each distinct prediction is stored once: `c1`/`c2` are int16 indexes into `categories`
+    (the position of the category's `_codes` entry, -1 for none) and `s1`/`s2` are float32
+    scores (NaN for none). `index` (int32) maps every row to its distinct prediction, so a
+    month of millions of rows costs a few bytes per row instead of a dict per row.
+
+    Indexing and iteration still yield `{c1, s1, c2, s2}` dicts (plus `representative` when
+    near-duplicate clustering was used), built on access; writers that understand the table
+    (`ParquetOutput.write_predictions`) read the columns directly instead.
+    """
+
+    def __init__(
+        self,
+        categories: List[str],
+        c1: np.ndarray,
+        s1: np.ndarray,
+        c2: np.ndarray,
+        s2: np.ndarray,
+        index: np.ndarray,
+        representative: List[str | None] | None = None,
+    ):
+        self.categories = categories
+        self.c1, self.s1, self.c2, self.s2 = c1, s1, c2, s2
+        self.index = index
+        self.representative = representative
+
+    @classmethod
+    def from_predictions(
+        cls,
+        categories: List[str],
+        unique: List[Dict[str, object]],
+        index: Sequence[int] | np.ndarray,
+        representative: List[str | None] | None = None,
+    ) -> "PredictionTable":
+        """Table whose row i takes `unique[index[i]]`."""
+        categories = list(categories)
+        code = {name: i for i, name in enumerate(categories)}
+
+        def cat(name: object) -> int:
+            if name is None:
+                return -1
+            if name not in code:
+                # Labels outside the category list (should not happen) are kept as extra codes
+                code[name] = len(categories)
+                categories.append(str(name))
+            return code[name]
+
+        def score(value: object) -> float:
+            return np.nan if value is None else float(value)
+
+        return cls(
+            categories,
+            np.array([cat(p.get("c1")) for p in unique], dtype=np.int16),
+            np.array([score(p.get("s1")) for p in unique], dtype=np.float32),
+            np.array([cat(p.get("c2")) for p in unique], dtype=np.int16),
+            np.array([score(p.get("s2")) for p in unique], dtype=np.float32),
+            np.asarray(index, dtype=np.int32),
+            representative,
+        )
+
+    @classmethod
+    def from_keys(
+        cls, categories: List[str], keys: List[str], lookup: Dict[str, Dict[str, object]]
+    ) -> "PredictionTable":
+        """Table for rows identified by `keys`, with each distinct key's prediction in `lookup`."""
+        slots: Dict[str, int] = {}
+        index = np.fromiter((slots.setdefault(k, len(slots)) for k in keys), dtype=np.int32, count=len(keys))
+        unique = [lookup[k] for k in slots]
+        reps = [p.get("representative") for p in unique] if any("representative" in p for p in unique) else None
+        return cls.from_predictions(categories, unique, index, representative=reps)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @overload
+    def __getitem__(self, i: int) -> Dict[str, object]: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "PredictionTable": ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(self.index[i])
+        return self._unique(int(self.index[i]))
+
+    def __iter__(self) -> Iterator[Dict[str, object]]:
+        # Rows with the same prediction share one dict, as the classifier's lists used to
+        built: Dict[int, Dict[str, object]] = {}
+        for u in self.index.tolist():
+            pred = built.get(u)
+            if pred is None:
+                pred = built[u] = self._unique(u)
+            yield pred
+
+    def take(self, index: np.ndarray) -> "PredictionTable":
+        """Rows at distinct-prediction `index`, sharing this table's columns."""
+        return PredictionTable(self.categories, self.c1, self.s1, self.c2, self.s2, index, self.representative)
+
+    def rows(self, positions: Sequence[int] | np.ndarray) -> "PredictionTable":
+        """Rows at `positions` of this table."""
+        return self.take(self.index[np.asarray(positions, dtype=np.intp)])
+
+    def _unique(self, u: int) -> Dict[str, object]:
+        cats = self.categories
+        c1, c2 = int(self.c1[u]), int(self.c2[u])
+        s1, s2 = float(self.s1[u]), float(self.s2[u])
+        pred: Dict[str, object] = {
+            "c1": cats[c1] if c1 >= 0 else None,
+            "s1": None if s1 != s1 else round(s1, SCORE_DECIMALS),
+            "c2": cats[c2] if c2 >= 0 else None,
+            "s2": None if s2 != s2 else round(s2, SCORE_DECIMALS),
+        }
+        if self.representative is not None:
+            pred["representative"] = self.representative[u]
+        return pred
+
+    # Per-row columns for columnar writers
+
+    def category_codes(self, column: str) -> np.ndarray:
+        """Per-row category indexes (-1 for none) of `c1` or `c2`."""
+        return (self.c1 if column == "c1" else self.c2)[self.index]
+
+    def scores(self, column: str) -> np.ndarray:
+        """Per-row float64 scores (NaN for none) of `s1` or `s2`, rounded like `__getitem__`."""
+        return np.round((self.s1 if column == "s1" else self.s2)[self.index].astype(np.float64), SCORE_DECIMALS)
+
+    def missing(self) -> tuple[int, int]:
+        """(rows missing a score, rows missing any of the four fields)."""
+        scores = np.isnan(self.s1) | np.isnan(self.s2)
+        fields = scores | (self.c1 < 0) | (self.c2 < 0)
+        return int(np.count_nonzero(scores[self.index])), int(np.count_nonzero(fields[self.index]))
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Dict, List, Protocol
+
+# One keyword scores 0.9 and each further distinct keyword of the category adds 0.04, so by
+# default an item needs two keywords; a single word ("beer", "milk") is too easily misleading
+DEFAULT_THRESHOLD = 0.94
+
+
+class PreClassifier(Protocol):
+    """A local stage that answers confident items before they reach the model."""
+
+    def predict(self, description: str) -> Dict[str, object] | None:
+        """Return a `{c1, s1, c2, s2}` prediction, or None when not confident enough."""
+        ...
+
+
+def _keyword_pattern(keywords: List[str]) -> re.Pattern[str]:
+    # Whole words, optional plural suffix, longest alternatives first
+    alts = "|".join(re.escape(k.casefold()) for k in sorted(keywords, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alts})(?:s|es)?\b")
+
+
+class KeywordPreClassifier:
+    """
+    Keyword table pre-classifier.
+
+    The table maps categories to whole-word keywords (and an optional fixed second category).
+    An item is answered locally only when keywords of exactly one category match and no
+    "ambiguous" term (sauce, stock, flavour, ...) is present. Confidence starts at 0.9 for one
+    matched keyword (0.85 if it is three letters or shorter), grows with further distinct
+    keywords of the same category, and must reach `threshold` (by default two keywords).
+    """
+
+    def __init__(
+        self,
+        table: Dict[str, object],
+        categories: List[str],
+        threshold: float = DEFAULT_THRESHOLD,
+    ):
+        self.threshold = float(threshold)
+        self._categories = categories
+        allowed = set(categories)
+        self._ambiguous = _keyword_pattern(list(table.get("ambiguous") or [])) if table.get("ambiguous") else None
+        self._rules: List[tuple[str, re.Pattern[str], str | None]] = []
+        for cat, spec in dict(table.get("categories") or {}).items():
+            if cat not in allowed:
+                raise ValueError(f"Keyword table category not in allowed categories: {cat}")
+            if isinstance(spec, list):
+                keywords, second = spec, None
+            else:
+                keywords, second = list(spec.get("keywords") or []), spec.get("second")
+            if second is not None and second not in allowed:
+                raise ValueError(f"Keyword table second category not in allowed categories: {second}")
+            if keywords:
+                self._rules.append((cat, _keyword_pattern(keywords), second))
+
+    @classmethod
+    def from_file(cls, path: str, categories: List[str], threshold: float = DEFAULT_THRESHOLD) -> "KeywordPreClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        if not isinstance(table, dict):
+            raise ValueError("Keyword table must be a JSON object")
+        return cls(table, categories, threshold=threshold)
+
+    def predict(self, description: str) -> Dict[str, object] | None:
+        text = (description or "").casefold()
+        if not text or (self._ambiguous is not None and self._ambiguous.search(text)):
+            return None
+        matched: List[tuple[str, set[str], str | None]] = []
+        for cat, pattern, second in self._rules:
+            hits = {m.group(0) for m in pattern.finditer(text)}
+            if hits:
+                matched.append((cat, hits, second))
+                if len(matched) > 1:
+                    return None
+        if not matched:
+            return None
+        cat, hits, second = matched[0]
+        confidence = 0.85 if len(hits) == 1 and len(next(iter(hits))) <= 3 else 0.9
+        confidence = round(min(0.99, confidence + 0.04 * (len(hits) - 1)), 2)
+        if confidence < self.threshold:
+            return None
+        return {"c1": cat, "s1": confidence, "c2": second, "s2": round(1.0 - confidence, 2) if second else None}
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+try:
+    from google.api_core import exceptions as gexc  # type: ignore
+except Exception:  # pragma: no cover - google-api-core ships with the google-cloud libs
+    gexc = None  # type: ignore
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token for Latin text)."""
+    return max(1, (len(text) + 3) // 4)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    if gexc is not None and isinstance(exc, (gexc.ResourceExhausted, gexc.TooManyRequests)):
+        return True
+    msg = str(exc)
+    return "429" in msg or "RESOURCE_EXHAUSTED" in msg or "Quota exceeded" in msg
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for retry `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` units per minute.
+
+    Callers reserve their units immediately (the balance may go negative) and then sleep until
+    the reservation is covered. No await happens between check and update, so the bucket needs
+    no lock and can be shared across event loops, e.g. one `asyncio.run` per streamed page.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = float(per_minute) / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # Requests larger than the bucket would never fit; let them through at full capacity
+        amount = min(float(amount), self.capacity)
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= amount
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+class RateLimiter:
+    """Global limiter on requests/min and (estimated) input tokens/min. Unset limits are ignored."""
+
+    def __init__(self, requests_per_minute: int | None = None, tokens_per_minute: int | None = None):
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    async def acquire(self, tokens: int = 0) -> None:
+        if self._requests is not None:
+            await self._requests.acquire(1)
+        if self._tokens is not None and tokens > 0:
+            await self._tokens.acquire(tokens)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit for model calls.
+
+    Each call that finishes within the healthy latency raises the limit by `1/limit` (about
+    +1 per round trip at full utilization); a rate-limit error halves it. Healthy means at
+    most `target_latency` seconds when that is set, otherwise at most `baseline_factor`
+    times the baseline: a slow moving average of successful call latencies, so the limit
+    stops growing once extra concurrency only makes calls slower.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        target_latency: float | None = None,
+        decrease_factor: float = 0.5,
+        baseline_factor: float = 2.0,
+    ):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = float(target_latency) if target_latency else None
+        self.decrease_factor = float(decrease_factor)
+        self.baseline_factor = float(baseline_factor)
+        self.baseline: float | None = None
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        self._last_decrease = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def healthy_latency(self) -> float | None:
+        """Slowest latency that still counts as healthy; None until there is a baseline."""
+        if self.target_latency is not None:
+            return self.target_latency
+        return None if self.baseline is None else self.baseline * self.baseline_factor
+
+    async def on_success(self, latency: float) -> None:
+        healthy = self.healthy_latency()
+        # Slow average, so a burst of slow calls shifts it only a little
+        self.baseline = latency if self.baseline is None else 0.9 * self.baseline + 0.1 * latency
+        if healthy is not None and latency > healthy:
+            return
+        async with self._cond:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    async def on_throttle(self) -> None:
+        async with self._cond:
+            now = time.monotonic()
+            # One decrease per burst of 429s from calls that were in flight together
+            if now - self._last_decrease < 1.0:
+                return
+            self._last_decrease = now
+            self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        logging.getLogger("ratelimit").info(f"Rate limited; concurrency limit -> {int(self.limit)}")
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+from rapidfuzz import process, fuzz
+
+# Scores below this (WRatio, 0..100) are not trusted as a match for free-text labels
+MIN_FUZZY_SCORE = 60
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", s.strip()).casefold()
+
+
+class _LRU:
+    """Small thread-safe LRU mapping."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[object, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: object) -> str | None:
+        with self._lock:
+            val = self._data.get(key)
+            if val is not None:
+                self._data.move_to_end(key)
+            return val
+
+    def put(self, key: object, val: str) -> None:
+        with self._lock:
+            self._data[key] = val
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._data
+
+
+def _generated_aliases(code: str, name: str) -> List[str]:
+    """ID spellings and common rewrites of a category name."""
+    num = int(code[1:])
+    out = [code, f"C{num}", f"{code}: {name}", f"{code} - {name}", name]
+    if " and " in name.casefold():
+        out.append(re.sub(r"\s+and\s+", " & ", name, flags=re.I))
+        out.append(re.sub(r"\s+and\s+", " ", name, flags=re.I))
+    return out
+
+
+class CategoryResolver:
+    """
+    Maps model output (category IDs, names, near-miss free text) onto allowed categories.
+
+    Exact forms resolve through an alias table built once (IDs such as C01/c1, "C01: Name",
+    names, "&"/"and" variants, plus caller-supplied synonyms). Anything else is fuzzy matched
+    with WRatio; results are memoized in an LRU so repeated raw strings cost one lookup, and
+    `prime` scores a whole chunk's unresolved strings in one `process.cdist` call.
+    """
+
+    def __init__(
+        self,
+        categories: List[str],
+        codes: List[str],
+        aliases: Dict[str, str] | None = None,
+        cache_size: int = 8192,
+    ):
+        self._categories = categories
+        self._norm_map: Dict[str, str] = {_norm(c): c for c in categories}
+        self._choices = list(self._norm_map.keys())
+        self._choice_names = [self._norm_map[k] for k in self._choices]
+        self._aliases: Dict[str, str] = {}
+        for code, name in zip(codes, categories):
+            for a in _generated_aliases(code, name):
+                self._aliases.setdefault(_norm(a), name)
+        allowed = set(categories)
+        for alias, name in (aliases or {}).items():
+            if name not in allowed:
+                raise ValueError(f"Alias target is not an allowed category: {name}")
+            self._aliases[_norm(alias)] = name
+        self._fuzzy = _LRU(cache_size)
+        self._second = _LRU(cache_size)
+
+    def resolve(self, value: str) -> str:
+        """Resolve an ID/name/free-text label; falls back to the first category."""
+        key = _norm(value)
+        hit = self._aliases.get(key)
+        if hit is not None:
+            return hit
+        cached = self._fuzzy.get(key)
+        if cached is not None:
+            return cached
+        match = process.extractOne(key, self._choices, scorer=fuzz.WRatio) if self._choices else None
+        resolved = self._accept(match[0] if match else None, match[1] if match else 0)
+        self._fuzzy.put(key, resolved)
+        return resolved
+
+    def prime(self, values: Iterable[str]) -> None:
+        """Fuzzy-score every not-yet-known string in `values` in one vectorized pass."""
+        pending = list(
+            dict.fromkeys(k for k in (_norm(v) for v in values) if k not in self._aliases and k not in self._fuzzy)
+        )
+        if len(pending) < 2 or not self._choices:
+            return
+        scores = process.cdist(pending, self._choices, scorer=fuzz.WRatio, workers=1)
+        best = scores.argmax(axis=1)
+        for key, idx, row in zip(pending, best, scores):
+            self._fuzzy.put(key, self._accept(self._choices[int(idx)], float(row[idx])))
+
+    def second_best(self, first: str, hint: str | None = None) -> str:
+        """Best category other than `first`, fuzzy matched against `hint` (or `first`)."""
+        if len(self._choices) < 2:
+            return first
+        query = _norm(hint or first)
+        memo_key = (first, query)
+        cached = self._second.get(memo_key)
+        if cached is not None:
+            return cached
+        result = self._categories[0]
+        for match, _, idx in process.extract(query, self._choices, scorer=fuzz.WRatio, limit=2):
+            if self._choice_names[idx] != first:
+                result = self._choice_names[idx]
+                break
+        self._second.put(memo_key, result)
+        return result
+
+    def _accept(self, match: str | None, score: float) -> str:
+        if match is not None and score >= MIN_FUZZY_SCORE:
+            return self._norm_map[match]
+        # If still not good, pick the first category as consistent fallback
+        return self._categories[0]
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+from google.cloud import bigquery, storage
+
+from .backends import VertexBackend
+from .classifier import GeminiClassifier
+from .config import Config
+from .prefilter import DEFAULT_THRESHOLD, KeywordPreClassifier
+from .rules import CategoryRules
+
+_FileKey = Tuple[str, int, int] | None
+
+
+def _file_key(path: str | None) -> _FileKey:
+    # Changes to a file show up as a new mtime or size
+    if not path:
+        return None
+    st = os.stat(path)
+    return path, st.st_mtime_ns, st.st_size
+
+
+class Resources:
+    """
+    Clients and classifier state shared by every run of a long-lived process (the API server).
+
+    BigQuery and Cloud Storage clients keep their authorized HTTP sessions and connection
+    pools between runs. The Vertex AI backend is initialised once per model configuration.
+    The classifier (prompt, category index, label resolver) is rebuilt only when the model
+    configuration or the categories/aliases file changes. Runs receive it through
+    `GeminiClassifier.with_metrics`, so their metrics stay separate.
+    Keyword pre-classifiers and category rules are cached the same way. Everything is created
+    lazily on first use.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._bq: Dict[str, bigquery.Client] = {}
+        self._storage: storage.Client | None = None
+        self._backends: Dict[Tuple[Any, ...], VertexBackend] = {}
+        self._classifiers: Dict[Tuple[Any, ...], GeminiClassifier] = {}
+        self._preclassifiers: Dict[Tuple[Any, ...], KeywordPreClassifier] = {}
+        self._rules: Dict[Tuple[Any, ...], CategoryRules] = {}
+
+    def bq_client(self, cfg: Config) -> bigquery.Client:
+        with self._lock:
+            client = self._bq.get(cfg.gcp_project_id)
+            if client is None:
+                client = self._bq[cfg.gcp_project_id] = bigquery.Client(project=cfg.gcp_project_id)
+            return client
+
+    def storage_client(self) -> storage.Client:
+        with self._lock:
+            if self._storage is None:
+                self._storage = storage.Client()
+            return self._storage
+
+    def classifier(self, cfg: Config) -> GeminiClassifier:
+        # Imported here because pipeline imports this module
+        from .pipeline import _call_options, load_aliases, load_categories
+
+        backend_key = (
+            cfg.gcp_project_id,
+            cfg.gcp_location,
+            cfg.gemini_model,
+            cfg.gemini_context_cache,
+            cfg.gemini_context_cache_ttl,
+        )
+        options = _call_options(cfg)
+        key = backend_key + (
+            _file_key(cfg.categories_path),
+            _file_key(cfg.category_aliases_path),
+            tuple(sorted(options.items())),
+        )
+        with self._lock:
+            classifier = self._classifiers.get(key)
+            if classifier is not None:
+                return classifier
+            backend = self._backends.get(backend_key)
+            if backend is None:
+                backend = self._backends[backend_key] = VertexBackend(
+                    cfg.gcp_project_id,
+                    cfg.gcp_location,
+                    cfg.gemini_model,
+                    context_cache=cfg.gemini_context_cache,
+                    cache_ttl=cfg.gemini_context_cache_ttl or 3600,
+                )
+            classifier = GeminiClassifier(
+                project=cfg.gcp_project_id,
+                location=cfg.gcp_location,
+                model_name=cfg.gemini_model,
+                categories=load_categories(cfg.categories_path),
+                aliases=load_aliases(cfg.category_aliases_path),
+                backend=backend,
+                **options,
+            )
+            # Runs still using an older classifier keep it; its context cache expires on its own
+            stale = [k for k in self._classifiers if k[: len(backend_key)] == backend_key]
+            for k in stale:
+                del self._classifiers[k]
+            self._classifiers[key] = classifier
+            logging.getLogger("resources").info(
+                f"Built classifier | model={cfg.gemini_model} | categories={cfg.categories_path} | replaced={len(stale)}"
+            )
+            return classifier
+
+    def preclassifiers(self, cfg: Config, prefilter: bool) -> List[KeywordPreClassifier]:
+        if not (prefilter and cfg.category_keywords_path):
+            return []
+        from .pipeline import load_categories
+
+        threshold = cfg.prefilter_threshold if cfg.prefilter_threshold is not None else DEFAULT_THRESHOLD
+        key = (_file_key(cfg.category_keywords_path), _file_key(cfg.categories_path), threshold)
+        with self._lock:
+            pre = self._preclassifiers.get(key)
+            if pre is None:
+                self._preclassifiers.clear()
+                pre = self._preclassifiers[key] = KeywordPreClassifier.from_file(
+                    cfg.category_keywords_path, load_categories(cfg.categories_path), threshold=threshold
+                )
+            return [pre]
+
+    def rules(self, cfg: Config) -> CategoryRules | None:
+        if not cfg.category_rules_path:
+            return None
+        from .pipeline import load_categories
+
+        key = (_file_key(cfg.category_rules_path), _file_key(cfg.categories_path))
+        with self._lock:
+            rules = self._rules.get(key)
+            if rules is None:
+                self._rules.clear()
+                rules = self._rules[key] = CategoryRules.from_file(
+                    cfg.category_rules_path, load_categories(cfg.categories_path)
+                )
+            return rules
+
+    def close(self) -> None:
+        """Delete context caches and close HTTP sessions."""
+        with self._lock:
+            backends, self._backends, self._classifiers = list(self._backends.values()), {}, {}
+            clients = list(self._bq.values()) + ([self._storage] if self._storage is not None else [])
+            self._bq, self._storage = {}, None
+        for obj in backends + clients:
+            close = getattr(obj, "close", None)
+            if close is not None:
+                close()
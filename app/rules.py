@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import re
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Tuple
+
+# Score a forced category gets at least, and the most the displaced first choice keeps
+DEFAULT_FORCE_SCORE = 0.9
+DISPLACED_SCORE = 0.1
+
+
+@dataclass(frozen=True)
+class _Rule:
+    name: str
+    triggers: FrozenSet[int]
+    blockers: FrozenSet[int]
+    when: FrozenSet[str] | None
+    forbid: FrozenSet[str]
+    force: str | None
+    score: float
+
+    def apply(self, pred: Dict[str, object]) -> Dict[str, object] | None:
+        """Corrected copy of `pred`, or None when the rule leaves it as it is."""
+        c1, s1, c2, s2 = pred.get("c1"), pred.get("s1"), pred.get("c2"), pred.get("s2")
+        if self.when is not None and c1 not in self.when:
+            return None
+        if c1 in self.forbid and c2 is not None and c2 not in self.forbid:
+            c1, s1, c2, s2 = c2, s2, c1, _displaced(s1)
+        if self.force is not None and c1 != self.force:
+            c1, s1, c2, s2 = self.force, max(float(s1 or 0.0), self.score), c1, _displaced(s1)  # type: ignore[arg-type]
+        if (c1, s1, c2, s2) == (pred.get("c1"), pred.get("s1"), pred.get("c2"), pred.get("s2")):
+            return None
+        return {**pred, "c1": c1, "s1": s1, "c2": c2, "s2": s2}
+
+
+def _displaced(score: object) -> float | None:
+    return None if score is None else min(float(score), DISPLACED_SCORE)  # type: ignore[arg-type]
+
+
+class CategoryRules:
+    """
+    Declarative post-classification rules (`category_rules.json`).
+
+    Each rule has a `name`, whole-word `keywords` (optional plural suffix) and/or regex
+    `patterns`, and optional `unless` keywords that stop it from firing. `forbid` lists
+    categories that must not come first: a forbidden first choice swaps places with the
+    second when that one is allowed. `force` puts a category first with a score of at least
+    `score` (default 0.9). Either way the previous first choice becomes the second, with its
+    score capped at 0.1; predictions are never emptied. `when` limits a rule to items whose first choice is one of the
+    listed categories. Rules run in file order, each on the result of the ones before, and
+    items the model could not classify are left alone.
+
+    The keywords of all rules are compiled into one regex (whole words with an optional
+    plural suffix, longest first, so where "fish sauce" and "fish" start at the same place
+    only "fish sauce" matches) and the patterns into another, where the first listed pattern
+    wins an overlap. `apply` runs both over the joined text of all descriptions at once.
+    """
+
+    def __init__(self, table: Dict[str, object], categories: List[str]):
+        allowed = set(categories)
+        # Every distinct keyword or pattern gets one id, shared by the rules that use it
+        terms: Dict[Tuple[str, str], int] = {}
+
+        def term_ids(values: object, kind: str, what: str, name: str) -> FrozenSet[int]:
+            if not isinstance(values, list) or not all(isinstance(v, str) and v.strip() for v in values):
+                raise ValueError(f"Category rule {name!r}: {what} must be a list of non-empty strings")
+            keys = [(kind, v.strip().casefold() if kind == "keyword" else v) for v in values]
+            return frozenset(terms.setdefault(k, len(terms)) for k in keys)
+
+        self._rules: List[_Rule] = []
+        for i, spec in enumerate(table.get("rules") or []):
+            if not isinstance(spec, dict):
+                raise ValueError("Each category rule must be a JSON object")
+            name = str(spec.get("name") or f"rule{i + 1}")
+            force, forbid, when = spec.get("force"), list(spec.get("forbid") or []), spec.get("when")
+            for cat in ([force] if force is not None else []) + forbid + list(when or []):
+                if cat not in allowed:
+                    raise ValueError(f"Category rule {name!r}: category not in allowed categories: {cat}")
+            if force is None and not forbid:
+                raise ValueError(f"Category rule {name!r} must have `force` and/or `forbid`")
+            if force in forbid:
+                raise ValueError(f"Category rule {name!r} forces a category it forbids: {force}")
+            triggers = term_ids(spec.get("keywords") or [], "keyword", "keywords", name) | term_ids(
+                spec.get("patterns") or [], "pattern", "patterns", name
+            )
+            if not triggers:
+                raise ValueError(f"Category rule {name!r} must have `keywords` and/or `patterns`")
+            self._rules.append(
+                _Rule(
+                    name=name,
+                    triggers=triggers,
+                    blockers=term_ids(spec.get("unless") or [], "keyword", "unless", name),
+                    when=frozenset(when) if when is not None else None,
+                    forbid=frozenset(forbid),
+                    force=force,
+                    score=float(spec.get("score", DEFAULT_FORCE_SCORE)),
+                )
+            )
+
+        # Keywords are looked up by the matched text; one group per keyword is much slower in `re`
+        self._keyword_ids = {k[1]: tid for k, tid in terms.items() if k[0] == "keyword"}
+        patterns = [k for k in terms if k[0] == "pattern"]
+        self._keywords: re.Pattern[str] | None = None
+        self._patterns: re.Pattern[str] | None = None
+        try:
+            if self._keyword_ids:
+                alts = "|".join(re.escape(k) for k in sorted(self._keyword_ids, key=len, reverse=True))
+                self._keywords = re.compile(rf"\b({alts})(?:s|es)?\b")
+            if patterns:
+                self._patterns = re.compile(
+                    "|".join(f"(?P<t{terms[k]}>{k[1]})" for k in patterns), re.IGNORECASE | re.MULTILINE
+                )
+        except re.error as e:
+            raise ValueError(f"Invalid category rule pattern: {e}") from e
+
+    @classmethod
+    def from_file(cls, path: str, categories: List[str]) -> "CategoryRules":
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        if not isinstance(table, dict):
+            raise ValueError("Category rules file must be a JSON object")
+        return cls(table, categories)
+
+    @property
+    def names(self) -> List[str]:
+        return [r.name for r in self._rules]
+
+    def apply(
+        self, predictions: Dict[str, Dict[str, object]]
+    ) -> Tuple[Dict[str, Dict[str, object]], Counter[str]]:
+        """
+        Apply the rules to `predictions` (description -> prediction).
+
+        Returns the predictions, with unchanged entries as the same objects, and how many
+        predictions each rule changed, by rule name.
+        """
+        keys = list(predictions)
+        # One line per description; offsets map matches back to descriptions
+        lines = [k.casefold().replace("\n", " ") for k in keys]
+        starts: List[int] = []
+        pos = 0
+        for line in lines:
+            starts.append(pos)
+            pos += len(line) + 1
+        text = "\n".join(lines)
+        found: Dict[int, set[int]] = defaultdict(set)
+        if self._keywords is not None:
+            for m in self._keywords.finditer(text):
+                found[bisect_right(starts, m.start()) - 1].add(self._keyword_ids[m.group(1)])
+        if self._patterns is not None:
+            for m in self._patterns.finditer(text):
+                found[bisect_right(starts, m.start()) - 1].add(int(m.lastgroup[1:]))  # type: ignore[index]
+
+        out = dict(predictions)
+        hits: Counter[str] = Counter()
+        for i, terms in found.items():
+            pred = predictions[keys[i]]
+            if pred.get("c1") is None:
+                continue
+            for rule in self._rules:
+                if terms.isdisjoint(rule.triggers) or not terms.isdisjoint(rule.blockers):
+                    continue
+                changed = rule.apply(pred)
+                if changed is not None:
+                    pred = changed
+                    hits[rule.name] += 1
+            out[keys[i]] = pred
+        return out, hits
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict
+import threading
+from typing import Any, Dict, List
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
-from .config import load_config
-from .pipeline import run_pipeline
+from .cache import ResultCache
+from .config import Config, load_config
+from .jobs import Job, JobManager
+from .metrics import REGISTRY
+from .online import MicroBatcher
+from .pipeline import MONTH_RE, run_backfill, run_pipeline
+from .ratelimit import RateLimiter
+from .resources import Resources
 
 
 log = logging.getLogger("server")
@@ -25,48 +33,157 @@ class RunRequest(BaseModel):
     batch_size: int | None = None
     concurrency: int | None = None
     deduplicate: bool = True
+    stream: bool = False
+    page_size: int | None = None
+    engine: str | None = None
+    prefilter: bool = True
+    checkpoint: bool = True
+    resume: str | None = None
+    output_format: str | None = None
+    incremental: bool = False
+    # Last month of a backfill starting at `month` (inclusive); None runs just `month`
+    to_month: str | None = None
 
 
+class ClassifyRequest(BaseModel):
+    descriptions: List[str]
+
+
+# Upper bound on descriptions per /classify request; larger jobs belong in /jobs
+MAX_CLASSIFY_ITEMS = 500
+
 app = FastAPI(title="Product Category Vibe API")
 
+# Clients and the classifier live as long as the process and are shared by all runs
+_resources = Resources()
+_config_cache: Config | None = None
+_config_lock = threading.Lock()
+
+
+def _config() -> Config:
+    # The environment is fixed for the life of a Cloud Run revision; read it once
+    global _config_cache
+    with _config_lock:
+        if _config_cache is None:
+            _config_cache = load_config()
+        return _config_cache
+
+
+@app.on_event("startup")
+def _warm_resources() -> None:
+    # Pay client auth and classifier setup before the first request instead of during it
+    try:
+        cfg = _config()
+        _resources.bq_client(cfg)
+        _resources.classifier(cfg)
+    except Exception as e:
+        log.warning(f"Could not prepare shared resources at startup; will retry on first run | error={e}")
+
 
 @app.get("/healthz")
 def healthz() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    # Prometheus text exposition format, cumulative since the instance started
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _pipeline_kwargs(req: RunRequest, cfg: Config) -> Dict[str, Any]:
+    batch_size = req.batch_size if req.batch_size is not None else (cfg.classify_batch_size or 8)
+    concurrency = req.concurrency if req.concurrency is not None else (cfg.classify_concurrency or 4)
+    progress_every = req.progress_every if req.progress_every is not None else (cfg.classify_progress_every or 1)
+    if req.to_month is not None:
+        if req.limit is not None or req.stream or req.resume or req.incremental:
+            raise ValueError("to_month cannot be combined with limit, stream, resume or incremental")
+        return dict(
+            month_from=req.month,
+            month_to=req.to_month,
+            dry_run=req.dry_run,
+            progress_every=max(1, progress_every),
+            batch_size=max(1, batch_size),
+            concurrency=max(1, concurrency),
+            deduplicate=req.deduplicate,
+            engine=req.engine,
+            prefilter=req.prefilter,
+            output_format=req.output_format,
+        )
+    return dict(
+        month=req.month,
+        limit=req.limit,
+        dry_run=req.dry_run,
+        progress_every=max(1, progress_every),
+        batch_size=max(1, batch_size),
+        concurrency=max(1, concurrency),
+        deduplicate=req.deduplicate,
+        stream=req.stream,
+        page_size=req.page_size,
+        engine=req.engine,
+        prefilter=req.prefilter,
+        checkpoint=req.checkpoint,
+        resume=req.resume,
+        output_format=req.output_format,
+        incremental=req.incremental,
+    )
+
+
+def _job_key(req: RunRequest) -> str:
+    # Requests producing the same output file share one job; tuning knobs don't matter
+    if req.to_month is not None:
+        return f"{req.month}..{req.to_month}|dry_run={req.dry_run}|format={req.output_format}"
+    return f"{req.month}|limit={req.limit}|dry_run={req.dry_run}|resume={req.resume}|format={req.output_format}|incremental={req.incremental}"
+
+
+def _execute(cfg: Config, kwargs: Dict[str, Any], **hooks: Any) -> Dict[str, Any]:
+    if "month_to" in kwargs:
+        return run_backfill(cfg, resources=_resources, **kwargs, **hooks)
+    return run_pipeline(cfg, resources=_resources, **kwargs, **hooks)
+
+
+_jobs: JobManager | None = None
+_jobs_lock = threading.Lock()
+
+
+def _run_job(params: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    cfg = _config()
+
+    def on_progress(snapshot: Dict[str, Any]) -> None:
+        job.progress = snapshot
+
+    return _execute(cfg, params, on_progress=on_progress, cancel_event=job.cancel_event)
+
+
+def _job_manager(cfg: Config) -> JobManager:
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = JobManager(_run_job, max_workers=cfg.job_workers or 2)
+        return _jobs
+
+
 @app.post("/run")
 def run(req: RunRequest) -> Dict[str, Any]:
     try:
-        cfg = load_config()
+        cfg = _config()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     try:
-        batch_size = req.batch_size if req.batch_size is not None else (cfg.classify_batch_size or 8)
-        concurrency = req.concurrency if req.concurrency is not None else (cfg.classify_concurrency or 4)
-        progress_every = req.progress_every if req.progress_every is not None else (cfg.classify_progress_every or 1)
-
+        kwargs = _pipeline_kwargs(req, cfg)
         log.info(
-            "API run | month=%s | limit=%s | dry_run=%s | batch_size=%s | concurrency=%s | progress_every=%s | dedupe=%s",
+            "API run | month=%s | limit=%s | dry_run=%s | batch_size=%s | concurrency=%s | progress_every=%s | dedupe=%s | stream=%s",
             req.month,
             req.limit,
             req.dry_run,
-            batch_size,
-            concurrency,
-            progress_every,
+            kwargs["batch_size"],
+            kwargs["concurrency"],
+            kwargs["progress_every"],
             req.deduplicate,
+            req.stream,
         )
-        result = run_pipeline(
-            cfg,
-            month=req.month,
-            limit=req.limit,
-            dry_run=req.dry_run,
-            progress_every=max(1, progress_every),
-            batch_size=max(1, batch_size),
-            concurrency=max(1, concurrency),
-            deduplicate=req.deduplicate,
-        )
+        result = _execute(cfg, kwargs)
         return result
     except ValueError as e:
         # Validation errors (e.g., month format)
@@ -75,3 +192,110 @@ def run(req: RunRequest) -> Dict[str, Any]:
         log.exception("Pipeline error")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+@app.post("/jobs", status_code=202)
+def create_job(req: RunRequest) -> Dict[str, Any]:
+    try:
+        cfg = _config()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not MONTH_RE.match(req.month) or (req.to_month is not None and not MONTH_RE.match(req.to_month)):
+        raise HTTPException(status_code=400, detail="month must be MM-YYYY")
+    try:
+        kwargs = _pipeline_kwargs(req, cfg)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job, created = _job_manager(cfg).submit(_job_key(req), kwargs)
+    log.info(f"API job | job_id={job.id} | month={req.month} | coalesced={not created}")
+    return {"job_id": job.id, "status": job.status, "coalesced": not created}
+
+
+@app.get("/jobs")
+def list_jobs() -> Dict[str, Any]:
+    if _jobs is None:
+        return {"jobs": []}
+    return {"jobs": [j.to_dict() for j in _jobs.list()]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str) -> Dict[str, Any]:
+    job = _jobs.get(job_id) if _jobs is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str) -> Dict[str, Any]:
+    job = _jobs.cancel(job_id) if _jobs is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+_batcher: MicroBatcher | None = None
+
+
+def _online_batcher(cfg: Config) -> MicroBatcher:
+    # Created on first use, inside the server's event loop; only touched from that loop
+    global _batcher
+    if _batcher is None:
+        if cfg.classify_cache_path:
+            cache = ResultCache(cfg.classify_cache_path, max_entries=cfg.classify_cache_max_entries or 500_000)
+        else:
+            cache = ResultCache(":memory:", max_entries=cfg.classify_cache_max_entries or 200_000)
+        _batcher = MicroBatcher(
+            lambda: _resources.classifier(cfg),
+            max_batch=cfg.online_max_batch or cfg.classify_batch_size or 16,
+            max_wait=(cfg.online_max_wait_ms if cfg.online_max_wait_ms is not None else 20) / 1000,
+            concurrency=cfg.classify_concurrency or 4,
+            max_concurrency=cfg.classify_max_concurrency,
+            target_latency=cfg.classify_target_latency,
+            cache=cache,
+            preclassifiers=lambda: _resources.preclassifiers(cfg, True),
+            limiter=RateLimiter(cfg.gemini_requests_per_minute, cfg.gemini_tokens_per_minute),
+            rules=lambda: _resources.rules(cfg),
+        )
+    return _batcher
+
+
+@app.post("/classify")
+async def classify(req: ClassifyRequest) -> Dict[str, Any]:
+    try:
+        cfg = _config()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if len(req.descriptions) > MAX_CLASSIFY_ITEMS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_CLASSIFY_ITEMS} descriptions per request")
+    descriptions = [d.strip() for d in req.descriptions]
+    try:
+        preds = await _online_batcher(cfg).classify(descriptions)
+    except Exception:
+        log.exception("Online classification error")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    return {
+        "predictions": [
+            {
+                "description": d,
+                "predicted_category": p.get("c1"),
+                "relevance_score": p.get("s1"),
+                "second_category": p.get("c2"),
+                "second_relevance_score": p.get("s2"),
+            }
+            for d, p in zip(descriptions, preds)
+        ]
+    }
+
+
+@app.on_event("shutdown")
+async def _shutdown_batcher() -> None:
+    if _batcher is not None:
+        await _batcher.close()
+
+
+@app.on_event("shutdown")
+def _shutdown_jobs() -> None:
+    if _jobs is not None:
+        _jobs.shutdown()
+    _resources.close()
@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from google.cloud import bigquery
+
+from .backends import ModelBackend
+from .bq import query_invoices_by_month, query_month_descriptions
+from .cache import ResultCache
+from .checkpoint import open_store
+from .classifier import _norm
+from .config import Config, load_config
+from .metrics import REGISTRY, Metrics
+from .pipeline import (
+    MONTH_RE,
+    _build_classifier,
+    _build_preclassifiers,
+    _build_rules,
+    _classify,
+    _columns,
+    _enrich_row,
+    _export_month,
+    load_categories,
+)
+from .ratelimit import RateLimiter
+from .writers import OUTPUT_FORMATS
+
+# Sharded execution of one month. Unique descriptions are split by a hash of their
+# normalized text, each shard is classified in its own process (or Cloud Run Job task),
+# and the coordinator merges the shard results back onto the month's rows.
+
+
+def shard_index(description: str, shards: int) -> int:
+    """Shard of a description; stable across processes and runs (unlike `hash()`)."""
+    digest = hashlib.blake2b(_norm(description).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def split_shards(descriptions: List[str], shards: int) -> List[List[str]]:
+    """Unique descriptions (by normalized text, first spelling wins) grouped into `shards` lists."""
+    out: List[List[str]] = [[] for _ in range(shards)]
+    seen: set[str] = set()
+    for d in descriptions:
+        k = _norm(d)
+        if k not in seen:
+            seen.add(k)
+            out[shard_index(d, shards)].append(d)
+    return out
+
+
+def shard_limiter(cfg: Config, shards: int) -> RateLimiter:
+    """One shard's even share of GEMINI_RPM/GEMINI_TPM, at least 1 (0 would mean unlimited)."""
+    shards = max(1, shards)
+    rpm, tpm = cfg.gemini_requests_per_minute, cfg.gemini_tokens_per_minute
+    return RateLimiter(max(1, rpm // shards) if rpm else rpm, max(1, tpm // shards) if tpm else tpm)
+
+
+def classify_shard(
+    cfg: Config,
+    descriptions: List[str],
+    params: Dict[str, Any],
+    backend_factory: Callable[[], ModelBackend] | None = None,
+) -> Dict[str, Any]:
+    """
+    Classify one shard in the current process and return its results keyed by normalized
+    description, with the shard's stats and metrics snapshot.
+
+    `params` holds batch_size, concurrency, progress_every, engine, prefilter and shards.
+    With the async engine GEMINI_RPM/GEMINI_TPM are split evenly between the shards
+    (`shard_limiter`), so together they stay within the project quota. The result cache
+    (CLASSIFY_CACHE_PATH) is shared by the shards; near-duplicate clustering
+    (CLASSIFY_CLUSTER_THRESHOLD) groups descriptions within a shard only. `backend_factory`
+    must be picklable when shards run in worker processes; None uses Vertex AI.
+    """
+    log = logging.getLogger("shard")
+    categories = load_categories(cfg.categories_path)
+    metrics = Metrics(parent=REGISTRY)
+    classifier = _build_classifier(cfg, categories, backend_factory() if backend_factory else None, metrics)
+    cache = None
+    if cfg.classify_cache_path:
+        cache = ResultCache(cfg.classify_cache_path, max_entries=cfg.classify_cache_max_entries or 500_000)
+    stats: Dict[str, int] = {
+        "cache_hits": 0, "cache_misses": 0, "prefilter_checked": 0, "prefilter_hits": 0, "clustered": 0,
+        "rule_hits": 0,
+    }
+    classify_kwargs: Dict[str, Any] = dict(
+        progress_every=params["progress_every"],
+        batch_size=params["batch_size"],
+        concurrency=params["concurrency"],
+        deduplicate=True,
+        cache=cache,
+        stats=stats,
+        max_input_tokens=cfg.classify_max_input_tokens,
+        max_output_tokens=cfg.classify_max_output_tokens,
+        max_batch_items=cfg.classify_max_batch_items,
+        preclassifiers=_build_preclassifiers(cfg, categories, params["prefilter"]),
+        cluster_threshold=cfg.classify_cluster_threshold,
+        rules=_build_rules(cfg, categories),
+    )
+    if params["engine"] == "async":
+        classify_kwargs["limiter"] = shard_limiter(cfg, int(params["shards"]))
+        classify_kwargs["max_concurrency"] = cfg.classify_max_concurrency
+        classify_kwargs["target_latency"] = cfg.classify_target_latency
+    started = time.perf_counter()
+    try:
+        with metrics.stage("classify"):
+            predictions = _classify(classifier, descriptions, classify_kwargs)
+    finally:
+        classifier.close()
+        if cache is not None:
+            cache.close()
+    elapsed = time.perf_counter() - started
+    log.info(f"Shard classified | descriptions={len(descriptions)} | seconds={elapsed:.1f} | pid={os.getpid()}")
+    return {
+        "results": {_norm(d): p for d, p in zip(descriptions, predictions)},
+        "descriptions": len(descriptions),
+        "seconds": round(elapsed, 3),
+        "stats": stats,
+        "metrics": metrics.snapshot(),
+    }
+
+
+def _params(engine: str | None, cfg: Config, **knobs: Any) -> Dict[str, Any]:
+    engine = engine or cfg.classify_engine
+    if engine not in ("threads", "async"):
+        raise ValueError("engine must be 'threads' or 'async'")
+    return dict(knobs, engine=engine)
+
+
+def run_sharded(
+    cfg: Config,
+    month: str,
+    shards: int,
+    dry_run: bool = False,
+    progress_every: int = 1,
+    batch_size: int = 8,
+    concurrency: int = 4,
+    engine: str | None = None,
+    prefilter: bool = True,
+    output_format: str | None = None,
+    bq_client: bigquery.Client | None = None,
+    backend_factory: Callable[[], ModelBackend] | None = None,
+) -> Dict[str, Any]:
+    """
+    Run one month with classification split over `shards` local worker processes.
+
+    Each process builds its own classifier, so prompt building, JSON parsing and category
+    validation run in parallel across cores. The coordinator reads the month once, merges
+    the shard results onto the rows in query order and writes the usual export.
+    """
+    log = logging.getLogger("shard")
+    if not MONTH_RE.match(month):
+        raise ValueError("month must be MM-YYYY")
+    if shards < 1:
+        raise ValueError("shards must be at least 1")
+    output_format = output_format or cfg.output_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+    params = _params(
+        engine,
+        cfg,
+        progress_every=progress_every,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        prefilter=prefilter,
+        shards=shards,
+    )
+    if bq_client is None:
+        bq_client = bigquery.Client(project=cfg.gcp_project_id)
+
+    metrics = Metrics(parent=REGISTRY)
+    with metrics.stage("query"):
+        rows = query_invoices_by_month(
+            bq_client, cfg.table_id, month, columns=_columns(cfg), month_table=cfg.bq_month_table
+        )
+    descriptions = [str(r.get("item_description") or "").strip() for r in rows]
+    parts = split_shards(descriptions, shards)
+    log.info(f"Sharded month | month={month} | rows={len(rows)} | shards={[len(p) for p in parts]}")
+
+    # spawn: workers must not inherit gRPC/HTTP client state from the coordinator
+    ctx = multiprocessing.get_context("spawn")
+    results: Dict[str, Dict[str, object]] = {}
+    shard_info: List[Dict[str, Any]] = []
+    with metrics.stage("classify"), ProcessPoolExecutor(max_workers=shards, mp_context=ctx) as pool:
+        futures = [pool.submit(classify_shard, cfg, part, params, backend_factory) for part in parts if part]
+        for i, fut in enumerate(futures):
+            out = fut.result()
+            results.update(out.pop("results"))
+            shard_info.append({"shard": i, **out})
+
+    counters: Dict[str, int] = {"missing_scores": 0, "missing_any_field": 0}
+    enriched = [_enrich_row(r, results[_norm(d)], counters) for r, d in zip(rows, descriptions)]
+    _log_missing(counters)
+    export = _export_month(
+        cfg, month, enriched, output_format, dry_run, metrics, lambda *a, **k: None, bq_client=bq_client
+    )
+    metrics.inc("pipeline_runs_total")
+    metrics.inc("pipeline_rows_total", len(rows))
+    return {
+        "month": month,
+        "shards": shards,
+        "total_rows": len(rows),
+        "processed": len(enriched),
+        "output_format": output_format,
+        "local_path": export["local_path"],
+        "gcs_uri": export["gcs_uri"],
+        **counters,
+        **_total_stats(shard_info),
+        "shard_runs": shard_info,
+        "metrics": metrics.snapshot(),
+    }
+
+
+def _log_missing(counters: Dict[str, int]) -> None:
+    logging.getLogger("shard").info(
+        f"Missing counters | missing_scores={counters['missing_scores']} | missing_any_field={counters['missing_any_field']}"
+    )
+
+
+def _total_stats(shard_runs: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Classification stats summed over shards, under the names a single-process run uses."""
+    keys = ("cache_hits", "cache_misses", "prefilter_hits", "clustered", "rule_hits")
+    return {k: sum(int(s["stats"].get(k, 0)) for s in shard_runs) for k in keys}
+
+
+def _shard_prefix(month: str, run_id: str) -> str:
+    return f"shards/{month}/{run_id}/"
+
+
+def run_shard_task(
+    cfg: Config,
+    month: str,
+    run_id: str,
+    task_index: int,
+    task_count: int,
+    params: Dict[str, Any],
+    bq_client: bigquery.Client | None = None,
+    backend_factory: Callable[[], ModelBackend] | None = None,
+) -> Dict[str, Any]:
+    """
+    One Cloud Run Job task: classify shard `task_index` of `task_count` and save its results
+    under CHECKPOINT_URI for `merge_shards`. Every task derives the same shards from the
+    month's distinct descriptions, so no coordination between tasks is needed.
+    """
+    if not cfg.checkpoint_uri:
+        raise ValueError("sharded Cloud Run tasks require CHECKPOINT_URI to be set")
+    if not 0 <= task_index < task_count:
+        raise ValueError("task_index must be in [0, task_count)")
+    if bq_client is None:
+        bq_client = bigquery.Client(project=cfg.gcp_project_id)
+    distinct = query_month_descriptions(bq_client, cfg.table_id, month, month_table=cfg.bq_month_table)
+    part = split_shards([str(d["item_description"]) for d in distinct], task_count)[task_index]
+    out = classify_shard(cfg, part, dict(params, shards=task_count), backend_factory)
+    store = open_store(cfg.checkpoint_uri)
+    store.write_text(
+        f"{_shard_prefix(month, run_id)}{task_index:05d}.json",
+        json.dumps({"task_count": task_count, "results": out["results"]}, ensure_ascii=False),
+    )
+    logging.getLogger("shard").info(
+        f"Shard task done | run_id={run_id} | task={task_index}/{task_count} | descriptions={len(part)}"
+    )
+    return {k: v for k, v in out.items() if k != "results"}
+
+
+def merge_shards(
+    cfg: Config,
+    month: str,
+    run_id: str,
+    dry_run: bool = False,
+    output_format: str | None = None,
+    bq_client: bigquery.Client | None = None,
+    backend_factory: Callable[[], ModelBackend] | None = None,
+) -> Dict[str, Any]:
+    """
+    Merge the saved results of every task of `run_id` onto the month's rows and write the
+    export. Descriptions that no shard covered (rows that arrived after the tasks queried
+    the month) are classified here.
+    """
+    log = logging.getLogger("shard")
+    if not cfg.checkpoint_uri:
+        raise ValueError("merging shards requires CHECKPOINT_URI to be set")
+    output_format = output_format or cfg.output_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+    store = open_store(cfg.checkpoint_uri)
+    names = store.list(_shard_prefix(month, run_id))
+    results: Dict[str, Dict[str, object]] = {}
+    task_count = None
+    for name in names:
+        saved = json.loads(store.read_text(name) or "{}")
+        task_count = saved.get("task_count", task_count)
+        results.update(saved.get("results", {}))
+    if task_count is None or len(names) != task_count:
+        raise ValueError(f"run {run_id} has {len(names)} of {task_count or '?'} shard results for {month}")
+
+    if bq_client is None:
+        bq_client = bigquery.Client(project=cfg.gcp_project_id)
+    metrics = Metrics(parent=REGISTRY)
+    with metrics.stage("query"):
+        rows = query_invoices_by_month(
+            bq_client, cfg.table_id, month, columns=_columns(cfg), month_table=cfg.bq_month_table
+        )
+    descriptions = [str(r.get("item_description") or "").strip() for r in rows]
+    missing = [d for d in dict.fromkeys(descriptions) if _norm(d) not in results]
+    if missing:
+        log.info(f"Classifying descriptions not covered by any shard | count={len(missing)}")
+        params = _params(
+            None,
+            cfg,
+            progress_every=1,
+            batch_size=cfg.classify_batch_size or 8,
+            concurrency=cfg.classify_concurrency or 4,
+            prefilter=True,
+            shards=1,
+        )
+        results.update(classify_shard(cfg, missing, params, backend_factory)["results"])
+
+    counters: Dict[str, int] = {"missing_scores": 0, "missing_any_field": 0}
+    enriched = [_enrich_row(r, results[_norm(d)], counters) for r, d in zip(rows, descriptions)]
+    _log_missing(counters)
+    export = _export_month(
+        cfg, month, enriched, output_format, dry_run, metrics, lambda *a, **k: None, bq_client=bq_client
+    )
+    metrics.inc("pipeline_runs_total")
+    metrics.inc("pipeline_rows_total", len(rows))
+    return {
+        "month": month,
+        "run_id": run_id,
+        "shards": task_count,
+        "total_rows": len(rows),
+        "processed": len(enriched),
+        **counters,
+        "classified_at_merge": len(missing),
+        "output_format": output_format,
+        "local_path": export["local_path"],
+        "gcs_uri": export["gcs_uri"],
+        "metrics": metrics.snapshot(),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Sharded classification of one month as Cloud Run Job tasks",
+    )
+    parser.add_argument("command", choices=["task", "merge"], help="task: classify this task's shard; merge: write the export")
+    parser.add_argument("--month", required=True, help="Month to query, format MM-YYYY")
+    parser.add_argument(
+        "--run-id",
+        default=os.getenv("CLOUD_RUN_EXECUTION"),
+        help="Identifier shared by the tasks and the merge (default: CLOUD_RUN_EXECUTION)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="merge: do not upload to GCS")
+    parser.add_argument("--engine", choices=["threads", "async"], default=None)
+    parser.add_argument("--format", dest="output_format", choices=["csv", "parquet"], default=None)
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"],
+        help="Logging level (default: INFO)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.INFO),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    if not args.run_id:
+        parser.error("--run-id is required outside Cloud Run Jobs")
+    if not MONTH_RE.match(args.month):
+        parser.error("--month must be MM-YYYY")
+
+    cfg = load_config()
+    if args.command == "task":
+        params = _params(
+            args.engine,
+            cfg,
+            progress_every=max(1, cfg.classify_progress_every or 1),
+            batch_size=max(1, cfg.classify_batch_size or 8),
+            concurrency=max(1, cfg.classify_concurrency or 4),
+            prefilter=True,
+        )
+        result = run_shard_task(
+            cfg,
+            args.month,
+            args.run_id,
+            task_index=int(os.getenv("CLOUD_RUN_TASK_INDEX", "0")),
+            task_count=int(os.getenv("CLOUD_RUN_TASK_COUNT", "1")),
+            params=params,
+        )
+    else:
+        result = merge_shards(cfg, args.month, args.run_id, dry_run=args.dry_run, output_format=args.output_format)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,13 +1,46 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
 from google.cloud import storage
 import logging
 
 
-def upload_to_gcs(bucket: str, blob_path: str, local_file: str) -> str:
+def upload_to_gcs(bucket: str, blob_path: str, local_file: str, client: storage.Client | None = None) -> str:
     log = logging.getLogger("gcs")
-    client = storage.Client()
+    client = client or storage.Client()
     b = client.bucket(bucket)
     blob = b.blob(blob_path)
     blob.upload_from_filename(local_file)
     return f"gs://{bucket}/{blob_path}"
+
+
+@contextmanager
+def gcs_upload_stream(
+    bucket: str,
+    blob_path: str,
+    content_type: str | None = None,
+    chunk_size: int = 8 * 1024 * 1024,
+    client: storage.Client | None = None,
+) -> Iterator[BinaryIO]:
+    """
+    Binary file object that uploads to `gs://bucket/blob_path` with a chunked resumable
+    upload as it is written, so the output never has to exist on local disk. Only
+    `chunk_size` bytes are buffered. If the body raises, the partial object is deleted.
+    """
+    log = logging.getLogger("gcs")
+    blob = (client or storage.Client()).bucket(bucket).blob(blob_path)
+    if content_type:
+        blob.content_type = content_type
+    f = blob.open("wb", chunk_size=chunk_size, ignore_flush=True)
+    try:
+        yield f
+    except BaseException:
+        try:
+            f.close()
+            blob.delete()
+        except Exception:
+            log.warning(f"Could not remove partial upload | blob={blob_path}")
+        raise
+    f.close()
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import csv
+import io
+from typing import Any, BinaryIO, Dict, List, Protocol, Sequence
+
+import numpy as np
+
+from .predictions import PredictionTable
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+PRED_COLS = [
+    "predicted_category",
+    "relevance_score",
+    "second_category",
+    "second_relevance_score",
+]
+# Optional columns written after the predictions when present (near-duplicate clustering)
+AUDIT_COLS = ["cluster_representative"]
+CATEGORY_COLS = ("predicted_category", "second_category")
+SCORE_COLS = ("relevance_score", "second_relevance_score")
+OUTPUT_FORMATS = ("csv", "parquet")
+# Prediction key behind each prediction column
+PRED_KEYS = dict(zip(PRED_COLS, ("c1", "s1", "c2", "s2")))
+
+
+def output_fieldnames(first_row: Dict[str, Any] | None) -> List[str]:
+    if first_row is None:
+        return ["product_description"] + PRED_COLS
+    # Ensure product_description is placed before the prediction columns
+    base_fields = [k for k in first_row.keys() if k not in PRED_COLS and k not in AUDIT_COLS]
+    if "product_description" in base_fields:
+        base_fields = [k for k in base_fields if k != "product_description"] + [
+            "product_description"
+        ]
+    return base_fields + PRED_COLS + [k for k in AUDIT_COLS if k in first_row]
+
+
+def enrich_row(r: Dict[str, Any], pred: Dict[str, object]) -> Dict[str, Any]:
+    """Copy of source row `r` with `product_description` and the prediction (and audit) columns."""
+    rr = dict(r)
+    # add product_description from item_description
+    rr["product_description"] = str(r.get("item_description") or "").strip()
+    # take model output directly; if model failed, values may be None
+    for col, key in PRED_KEYS.items():
+        rr[col] = pred.get(key)
+    if "representative" in pred:
+        # Near-duplicate clustering: the description whose classification this row received
+        rr["cluster_representative"] = pred["representative"]
+    return rr
+
+
+class OutputWriter(Protocol):
+    """
+    Incremental writer for enriched rows; `close()` finalizes the file but not the sink.
+
+    `write_predictions(rows, preds)` writes the same output as
+    `write_rows([enrich_row(r, p) for r, p in zip(rows, preds)])`; writers may read a
+    `PredictionTable` by column instead of building the enriched rows.
+    """
+
+    rows: int
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None: ...
+
+    def write_predictions(self, rows: List[Dict[str, Any]], preds: Sequence[Dict[str, object]]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class CsvOutput:
+    def __init__(self, sink: BinaryIO):
+        self._text = io.TextIOWrapper(sink, encoding="utf-8", newline="", write_through=True)
+        self._writer: csv.DictWriter | None = None
+        self.rows = 0
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for rr in rows:
+            if self._writer is None:
+                self._writer = csv.DictWriter(self._text, fieldnames=output_fieldnames(rr))
+                self._writer.writeheader()
+            self._writer.writerow(rr)
+        self.rows += len(rows)
+
+    def write_predictions(self, rows: List[Dict[str, Any]], preds: Sequence[Dict[str, object]]) -> None:
+        # Category names are only looked up here, one write batch at a time
+        self.write_rows([enrich_row(r, p) for r, p in zip(rows, preds)])
+
+    def close(self) -> None:
+        if self._writer is None:
+            csv.DictWriter(self._text, fieldnames=output_fieldnames(None)).writeheader()
+        self._text.flush()
+        # Leave the underlying sink open; the caller owns it
+        self._text.detach()
+
+
+class ParquetOutput:
+    """
+    Parquet writer that buffers rows and emits a row group every `row_group_size` rows.
+
+    The schema is inferred from the first row group. Category columns are dictionary
+    encoded (a few dozen distinct labels per file) and scores are float64; source columns
+    that are entirely null in the first row group are written as strings. Once the schema
+    is known, each write is converted to Arrow right away, and `write_predictions` builds
+    the prediction columns straight from a `PredictionTable`'s codes and score arrays.
+    """
+
+    def __init__(self, sink: BinaryIO, row_group_size: int = 50_000):
+        if pa is None:
+            raise ValueError("parquet output requires pyarrow to be installed")
+        self._sink = sink
+        self.row_group_size = max(1, int(row_group_size))
+        # Rows before the schema is known, then Arrow tables not yet written
+        self._buf: List[Dict[str, Any]] = []
+        self._tables: List[Any] = []
+        self._pending = 0
+        self._groups = 0
+        self._writer: Any = None
+        self._schema: Any = None
+        self._as_str: List[str] = []
+        self.rows = 0
+
+    @property
+    def schema(self) -> Any:
+        """Arrow schema of the file; None until the first row group is written."""
+        return self._schema
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows += len(rows)
+        if self._schema is None:
+            self._buf.extend(rows)
+            if len(self._buf) >= self.row_group_size:
+                self._start()
+            return
+        self._push(self._table(rows))
+
+    def write_predictions(self, rows: List[Dict[str, Any]], preds: Sequence[Dict[str, object]]) -> None:
+        if self._schema is None or not isinstance(preds, PredictionTable):
+            self.write_rows([enrich_row(r, p) for r, p in zip(rows, preds)])
+            return
+        self.rows += len(rows)
+        self._push(self._prediction_table(rows, preds))
+
+    def close(self) -> None:
+        if self._schema is None:
+            self._start()
+        if self._pending or not self._groups:
+            self._write_group(self._pending)
+        self._writer.close()
+
+    def _start(self) -> None:
+        self._schema = self._infer_schema(self._buf[: self.row_group_size])
+        self._writer = pq.ParquetWriter(self._sink, self._schema, compression="snappy")
+        rows, self._buf = self._buf, []
+        self._push(self._table(rows))
+
+    def _push(self, table: Any) -> None:
+        self._tables.append(table)
+        self._pending += table.num_rows
+        while self._pending >= self.row_group_size:
+            self._write_group(self.row_group_size)
+
+    def _write_group(self, n: int) -> None:
+        combined = pa.concat_tables(self._tables) if self._tables else self._schema.empty_table()
+        self._writer.write_table(combined.slice(0, n), row_group_size=n or None)
+        self._groups += 1
+        rest = combined.slice(n)
+        self._tables = [rest] if rest.num_rows else []
+        self._pending = rest.num_rows
+
+    def _table(self, rows: List[Dict[str, Any]]) -> Any:
+        names = self._schema.names
+        columns: Dict[str, List[Any]] = {name: [r.get(name) for r in rows] for name in names}
+        for name in self._as_str:
+            columns[name] = [None if v is None else str(v) for v in columns[name]]
+        return pa.Table.from_pydict(columns, schema=self._schema)
+
+    def _prediction_table(self, rows: List[Dict[str, Any]], preds: PredictionTable) -> Any:
+        arrays = []
+        for field in self._schema:
+            name = field.name
+            key = PRED_KEYS.get(name)
+            if name in CATEGORY_COLS:
+                codes = preds.category_codes(key)
+                # Every category is in the dictionary; names are resolved by readers
+                arrays.append(
+                    pa.DictionaryArray.from_arrays(
+                        pa.array(codes.astype(np.int32), mask=codes < 0), pa.array(preds.categories, pa.string())
+                    )
+                )
+                continue
+            if name in SCORE_COLS:
+                scores = preds.scores(key)
+                arrays.append(pa.array(scores, mask=np.isnan(scores)))
+                continue
+            if name == "cluster_representative":
+                reps = preds.representative
+                values = [reps[u] for u in preds.index.tolist()] if reps is not None else [None] * len(rows)
+            elif name == "product_description":
+                values = [str(r.get("item_description") or "").strip() for r in rows]
+            else:
+                values = [r.get(name) for r in rows]
+                if name in self._as_str:
+                    values = [None if v is None else str(v) for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=self._schema)
+
+    def _infer_schema(self, rows: List[Dict[str, Any]]) -> Any:
+        names = output_fieldnames(rows[0] if rows else None)
+        sample = pa.Table.from_pylist([{n: r.get(n) for n in names} for r in rows]) if rows else None
+        fields = []
+        for name in names:
+            if name in CATEGORY_COLS:
+                typ = pa.dictionary(pa.int32(), pa.string())
+            elif name in SCORE_COLS:
+                typ = pa.float64()
+            else:
+                typ = sample.schema.field(name).type if sample is not None else pa.string()
+                if pa.types.is_null(typ):
+                    typ = pa.string()
+                    self._as_str.append(name)
+            fields.append(pa.field(name, typ))
+        return pa.schema(fields)
+
+
+class TeeOutput:
+    """Writes the same rows to several writers and closes them in order; `rows` is counted once."""
+
+    def __init__(self, writers: List[OutputWriter]):
+        self._writers = writers
+        self.rows = 0
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for w in self._writers:
+            w.write_rows(rows)
+        self.rows += len(rows)
+
+    def write_predictions(self, rows: List[Dict[str, Any]], preds: Sequence[Dict[str, object]]) -> None:
+        for w in self._writers:
+            w.write_predictions(rows, preds)
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        for w in self._writers:
+            w.close()
+
+
+def open_writer(output_format: str, sink: BinaryIO, row_group_size: int = 50_000) -> OutputWriter:
+    if output_format == "csv":
+        return CsvOutput(sink)
+    if output_format == "parquet":
+        return ParquetOutput(sink, row_group_size=row_group_size)
+    raise ValueError(f"output format must be one of {', '.join(OUTPUT_FORMATS)}")
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import dataclasses
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from app.config import Config
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def make_config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Callable[..., Config]:
+    """Config for offline runs against `app.fakes`; outputs land under a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+
+    def make(**overrides: Any) -> Config:
+        cfg = Config(
+            gcp_project_id="test",
+            gcp_location="local",
+            gemini_model="fake-gemini",
+            service_account_path=None,
+            table_id="test.invoices",
+            categories_path=str(REPO_ROOT / "allowed_categories.json"),
+            gcs_bucket="unused",
+            gcs_output_prefix="unused",
+            classify_batch_size=None,
+            classify_concurrency=None,
+            classify_progress_every=None,
+            category_aliases_path=str(REPO_ROOT / "category_aliases.json"),
+        )
+        return dataclasses.replace(cfg, **overrides)
+
+    return make
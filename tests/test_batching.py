@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from collections import deque
+
+from app.batching import BatchPacker, BatchSizeLearner, fixed_chunks
+
+# Eight characters: two estimated tokens plus three of per-item framing
+ITEM = "abcdefgh"
+
+
+def test_packer_fills_batches_up_to_the_input_budget():
+    packer = BatchPacker(BatchSizeLearner(initial=64), max_input_tokens=25, overhead_tokens=10)
+    queue = deque([ITEM] * 7)
+    assert [len(packer.next_chunk(queue)) for _ in range(3)] == [3, 3, 1]
+    assert not queue and packer.next_chunk(queue) == []
+
+
+def test_packer_respects_the_output_budget_and_the_learned_cap():
+    queue = deque([ITEM] * 5)
+    assert len(BatchPacker(BatchSizeLearner(initial=64), max_output_tokens=50).next_chunk(queue)) == 2
+    assert len(BatchPacker(BatchSizeLearner(initial=2)).next_chunk(queue)) == 2
+
+
+def test_packer_sends_an_oversized_item_on_its_own():
+    packer = BatchPacker(BatchSizeLearner(initial=8), max_input_tokens=20, overhead_tokens=10)
+    queue = deque(["x" * 200, ITEM])
+    assert packer.next_chunk(queue) == ["x" * 200]
+    assert packer.next_chunk(queue) == [ITEM]
+
+
+def test_learner_shrinks_on_failures_and_does_not_grow_back_into_them():
+    learner = BatchSizeLearner(initial=8, min_samples=5)
+    for _ in range(5):
+        learner.record(8, ok=False)
+    assert learner.cap == 6
+
+    for _ in range(20):
+        learner.record(6, ok=True)
+    # Size 7 and above is known to fail, so clean batches of 6 do not raise the cap
+    assert learner.cap == 6
+
+
+def test_learner_grows_after_a_clean_streak_up_to_the_maximum():
+    learner = BatchSizeLearner(initial=8, maximum=9, min_samples=5)
+    for _ in range(9):
+        learner.record(8, ok=True)
+    assert learner.cap == 8
+    learner.record(8, ok=True)
+    assert learner.cap == 9
+    for _ in range(30):
+        learner.record(9, ok=True)
+    assert learner.cap == 9
+
+
+def test_fixed_chunks():
+    assert list(fixed_chunks(list("abcde"), 2)) == [["a", "b"], ["c", "d"], ["e"]]
+    assert list(fixed_chunks(list("ab"), 0)) == [["a"], ["b"]]
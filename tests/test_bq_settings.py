@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import csv
+
+from app.fakes import FakeBigQueryClient, FakeGeminiBackend, synthetic_invoices
+from app.pipeline import run_backfill, run_pipeline
+from app.writers import PRED_COLS
+
+COLUMNS = ("invoice_id", "check_invoice_date", "item_description")
+MONTH_TABLE = "test.invoices_by_month"
+
+
+class RecordingBigQueryClient(FakeBigQueryClient):
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.sql = []
+
+    def query(self, sql, job_config=None):
+        self.sql.append(sql)
+        return super().query(sql, job_config)
+
+
+def _backend() -> FakeGeminiBackend:
+    return FakeGeminiBackend(base_latency=0.0, per_item_latency=0.0, jitter=0.0)
+
+
+def _header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f))
+
+
+def test_incremental_runs_use_bq_columns_and_month_table(make_config, tmp_path):
+    cfg = make_config(checkpoint_uri=str(tmp_path / "checkpoints"), bq_columns=COLUMNS, bq_month_table=MONTH_TABLE)
+    rows = synthetic_invoices(200, month="03-2025", seed=5)
+
+    for expected_new in (len(rows), 0):
+        bq = RecordingBigQueryClient(rows)
+        summary = run_pipeline(cfg, "03-2025", dry_run=True, incremental=True, bq_client=bq, model_backend=_backend())
+        assert summary["incremental_new"] == expected_new
+        assert summary["total_rows"] == len(rows)
+        assert bq.sql and all(f"`{MONTH_TABLE}`" in sql and f"`{cfg.table_id}`" not in sql for sql in bq.sql)
+        assert _header(summary["local_path"])[: len(COLUMNS)] == list(COLUMNS)
+        assert not {"vendor", "amount"} & set(_header(summary["local_path"]))
+
+
+def test_backfill_uses_bq_columns_and_month_table(make_config):
+    cfg = make_config(bq_columns=COLUMNS, bq_month_table=MONTH_TABLE)
+    rows = synthetic_invoices(100, month="01-2025", seed=6) + synthetic_invoices(100, month="02-2025", seed=7)
+    bq = RecordingBigQueryClient(rows)
+
+    summary = run_backfill(cfg, "01-2025", "02-2025", dry_run=True, bq_client=bq, model_backend=_backend())
+
+    assert [m["rows"] for m in summary["months"]] == [100, 100]
+    assert len(bq.sql) == 1 and f"`{MONTH_TABLE}`" in bq.sql[0] and f"`{cfg.table_id}`" not in bq.sql[0]
+    for month in summary["months"]:
+        header = _header(month["local_path"])
+        assert header[: len(COLUMNS)] == list(COLUMNS)
+        assert set(PRED_COLS) <= set(header)
+        assert not {"vendor", "amount"} & set(header)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from app.cache import ResultCache
+
+FP = "fp"
+
+
+def _result(label: str) -> dict:
+    return {"c1": label, "s1": 0.9, "c2": None, "s2": None}
+
+
+def _keys(cache: ResultCache) -> set:
+    return {key for (key,) in cache._conn.execute("SELECT key FROM predictions")}
+
+
+def test_eviction_keeps_a_running_count_instead_of_scanning(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(path, max_entries=3)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    cache.put_many(FP, {"a": _result("x"), "b": _result("x")})
+    # Replacing existing rows must not count them twice
+    cache.put_many(FP, {"a": _result("y"), "b": _result("y")})
+    assert _keys(cache) == {"a", "b"}
+    cache.get_many(FP, ["b"])
+    cache.put_many(FP, {"c": _result("x"), "d": _result("x")})
+
+    assert _keys(cache) == {"b", "c", "d"}
+    assert not [s for s in statements if "COUNT(" in s.upper()]
+    cache.close()
+
+    reopened = ResultCache(path, max_entries=2)
+    assert len(_keys(reopened)) == 2
+    reopened.close()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import csv
+import threading
+
+import pytest
+
+from app.classifier import GeminiClassifier
+from app.fakes import FakeBigQueryClient, FakeGeminiBackend, synthetic_invoices
+from app.pipeline import PipelineCancelled, run_pipeline
+
+MONTH = "03-2025"
+
+
+def _backend(**kwargs) -> FakeGeminiBackend:
+    return FakeGeminiBackend(base_latency=0.0, per_item_latency=0.0, jitter=0.0, **kwargs)
+
+
+def _run(cfg, rows, backend, **kwargs):
+    return run_pipeline(
+        cfg,
+        MONTH,
+        dry_run=True,
+        batch_size=8,
+        concurrency=1,
+        prefilter=False,
+        bq_client=FakeBigQueryClient(rows),
+        model_backend=backend,
+        **kwargs,
+    )
+
+
+def _read(summary):
+    with open(summary["local_path"], newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_resume_does_not_repeat_model_calls(make_config, tmp_path):
+    cfg = make_config(checkpoint_uri=str(tmp_path / "checkpoints"))
+    rows = synthetic_invoices(400, month=MONTH, seed=1)
+
+    full_backend = _backend()
+    full = _run(cfg, rows, full_backend, checkpoint=False)
+
+    cancel = threading.Event()
+
+    def on_progress(p):
+        if p["stage"] == "classify" and p.get("classified_unique", 0) * 2 >= p.get("unique_total", 1):
+            cancel.set()
+
+    first_backend = _backend()
+    with pytest.raises(PipelineCancelled):
+        _run(cfg, rows, first_backend, on_progress=on_progress, cancel_event=cancel)
+    (run_dir,) = (tmp_path / "checkpoints").iterdir()
+    assert 0 < first_backend.items_requested < full_backend.items_requested
+
+    resumed_backend = _backend()
+    resumed = _run(cfg, rows, resumed_backend, resume=run_dir.name)
+
+    assert resumed["resumed"] == first_backend.items_requested
+    assert first_backend.items_requested + resumed_backend.items_requested == full_backend.items_requested
+    assert _read(resumed) == _read(full)
+
+
+def test_resume_retries_items_that_were_not_classified(make_config, tmp_path, monkeypatch):
+    cfg = make_config(checkpoint_uri=str(tmp_path / "checkpoints"))
+    rows = synthetic_invoices(200, month=MONTH, seed=2)
+    monkeypatch.setattr(GeminiClassifier, "max_retries", 0)
+
+    throttled = _run(cfg, rows, _backend(rate_limit_rate=1.0))
+    assert all(not r["predicted_category"] for r in _read(throttled))
+
+    backend = _backend()
+    resumed = _run(cfg, rows, backend, resume=throttled["run_id"])
+
+    assert resumed["resumed"] == 0
+    assert backend.items_requested > 0
+    assert all(r["predicted_category"] for r in _read(resumed))
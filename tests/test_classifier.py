@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.backends import ModelResponse
+from app.classifier import GeminiClassifier, ModelCallTimeout, _LatencyWindow, _salvage_json_objects
+from app.fakes import FakeGeminiBackend
+from app.metrics import Metrics
+from app.ratelimit import AdaptiveConcurrency
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def categories():
+    with open(REPO_ROOT / "allowed_categories.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _backend(**kwargs) -> FakeGeminiBackend:
+    return FakeGeminiBackend(**{"base_latency": 0.0, "per_item_latency": 0.0, "jitter": 0.0, **kwargs})
+
+
+class ScriptedBackend:
+    """Backend whose n-th call takes `delays[n]` seconds and answers "call <n>"."""
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            n = self.calls
+            self.calls += 1
+        return n, self.delays[min(n, len(self.delays) - 1)]
+
+    def generate(self, contents, json_output=True, system_instruction=None):
+        n, delay = self._next()
+        time.sleep(delay)
+        return ModelResponse(text=f"call {n}")
+
+    async def agenerate(self, contents, json_output=True, system_instruction=None):
+        n, delay = self._next()
+        await asyncio.sleep(delay)
+        return ModelResponse(text=f"call {n}")
+
+
+def test_per_run_copies_share_the_call_pool(categories):
+    classifier = GeminiClassifier("test", "local", "fake-gemini", categories, backend=_backend(), call_timeout=5.0)
+    runs = [classifier.with_metrics(Metrics()) for _ in range(3)]
+    for run in runs:
+        run.classify_batch(["Copy Paper A4", "Bleach 5L"], concurrency=1, deduplicate=False)
+
+    pool = classifier._call_pool
+    assert pool is not None
+    assert all(run._pool() is pool and run._call_pool is None for run in runs)
+    classifier.close()
+    assert classifier._call_pool is None and pool._shutdown
+
+
+def test_async_failure_still_stores_chunks_that_completed(categories):
+    classifier = GeminiClassifier("test", "local", "fake-gemini", categories, backend=_backend())
+    stored = []
+
+    def on_progress(done, total):
+        raise RuntimeError("stop")
+
+    descriptions = ["Copy Paper A4", "Bleach 5L", "Beef Mince 1kg", "Apples 1kg", "Dish Soap", "Rubbish Bags"]
+    with pytest.raises(RuntimeError, match="stop"):
+        asyncio.run(
+            classifier.classify_batch_async(
+                descriptions, batch_size=2, concurrency=4, on_chunk_done=stored.append, on_progress=on_progress
+            )
+        )
+    # Every chunk finished in the same round; the failure on the first must not drop the rest
+    assert len(stored) == 3 and sum(len(chunk) for chunk in stored) == len(descriptions)
+
+
+def test_adaptive_concurrency_grows_only_near_the_baseline_latency():
+    ctl = AdaptiveConcurrency(initial=2, maximum=8)
+
+    async def observe(latencies):
+        for latency in latencies:
+            await ctl.on_success(latency)
+
+    asyncio.run(observe([1.0] * 4))
+    grown = ctl.limit
+    assert grown > 2 and ctl.healthy_latency() == pytest.approx(2.0)
+    asyncio.run(observe([5.0]))
+    assert ctl.limit == grown
+
+    fixed = AdaptiveConcurrency(initial=2, maximum=8, target_latency=10.0)
+    asyncio.run(fixed.on_success(5.0))
+    assert fixed.limit > 2 and fixed.healthy_latency() == 10.0
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('[{"i": 1}, {"i": 2}]', [{"i": 1}, {"i": 2}]),
+        ('Here you go:\n[{"i": 1}, {"i": 2}]\nAnything else?', [{"i": 1}, {"i": 2}]),
+        # Truncated output keeps the complete objects
+        ('[{"i": 1}, {"i": 2}, {"i": 3, "c1": "Bak', [{"i": 1}, {"i": 2}]),
+        # One malformed element does not lose its neighbours
+        ('[{"i": 1}, {"i": 2, "c1": Bakery}, {"i": 3}]', [{"i": 1}, {"i": 3}]),
+        ("no json here", []),
+    ],
+)
+def test_salvage_recovers_well_formed_objects(text, expected):
+    assert _salvage_json_objects(text) == expected
+
+
+def test_partial_batch_response_keeps_items_by_their_echoed_number(categories):
+    classifier = GeminiClassifier("test", "local", "fake-gemini", categories, backend=_backend())
+    text = (
+        '[{"i": 3, "c1": "Bakery", "s1": 0.9, "c2": "Seafood", "s2": 0.1}, '
+        '{"i": 1, "c1": "Seafood", "s1": 0.8}, {"i": 2, "c1'
+    )
+
+    out = classifier._parse_chunk(text, 3)
+
+    assert out[0] is not None and out[0]["c1"] == "Seafood" and out[0]["s1"] == 0.8
+    assert out[1] is None
+    assert out[2] == {"c1": "Bakery", "s1": 0.9, "c2": "Seafood", "s2": 0.1}
+
+
+def test_latency_window_p95_needs_enough_samples():
+    window = _LatencyWindow(size=100, min_samples=20)
+    for i in range(19):
+        window.add("batch", i / 100)
+    assert window.p95("batch") is None
+    window.add("batch", 0.19)
+    assert window.p95("batch") == pytest.approx(0.19)
+    for _ in range(100):
+        window.add("batch", 0.5)
+    # Only the most recent `size` calls count
+    assert window.p95("batch") == 0.5 and window.p95("strict") is None
+
+
+def test_calls_past_the_deadline_raise_model_call_timeout(categories):
+    classifier = GeminiClassifier(
+        "test", "local", "fake-gemini", categories, backend=ScriptedBackend([0.3]), call_timeout=0.05
+    )
+    started = time.perf_counter()
+    with pytest.raises(ModelCallTimeout):
+        classifier._call(["x"], "batch", None)
+    with pytest.raises(ModelCallTimeout):
+        asyncio.run(classifier._acall(["x"], "batch", AdaptiveConcurrency()))
+    assert time.perf_counter() - started < 0.25
+    classifier.close()
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_a_straggling_call_is_hedged(categories, engine):
+    backend = ScriptedBackend([0.5, 0.0])
+    classifier = GeminiClassifier(
+        "test", "local", "fake-gemini", categories, backend=backend, call_timeout=5.0, hedge=True, hedge_min_delay=0.02
+    )
+    for _ in range(20):
+        classifier._latency.add("batch", 0.01)
+
+    if engine == "threads":
+        resp = classifier._call(["x"], "batch", None)
+    else:
+        resp = asyncio.run(classifier._acall(["x"], "batch", AdaptiveConcurrency()))
+
+    assert resp.text == "call 1" and backend.calls == 2
+    assert 'model_hedge_wins_total{tier="batch"} 1' in classifier.metrics.render_prometheus()
+    classifier.close()
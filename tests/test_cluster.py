@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import csv
+
+import pytest
+
+from app.cluster import ClusterIndex, cluster_descriptions
+from app.config import load_config
+from app.fakes import FakeBigQueryClient, FakeGeminiBackend, synthetic_invoices
+from app.pipeline import run_pipeline
+
+VARIANTS = ["CHICKEN BRST 5KG", "chicken breast 5 kg", "Chicken Breast-5kg", "Chicken Breast 10kg"]
+
+
+def test_cluster_descriptions_picks_the_most_common_variant():
+    descriptions = ["chicken breast 5 kg", "CHICKEN BREAST 5KG", "Copy Paper A4"]
+    assert cluster_descriptions(descriptions, 90, [1, 3, 1]) == [1, 1, 2]
+
+
+def test_cluster_index_keeps_representatives_across_batches():
+    index = ClusterIndex(90)
+    assert index.assign(["Chicken Breast 5kg", "Copy Paper A4"]) == ["Chicken Breast 5kg", "Copy Paper A4"]
+    assert index.assign(["chicken breast 10 kg", "COPY PAPER A4 500 SHEETS", "Bleach 5L"]) == [
+        "Chicken Breast 5kg",
+        "Copy Paper A4",
+        "Bleach 5L",
+    ]
+    assert len(index) == 3
+
+
+def test_streamed_run_clusters_across_pages(make_config):
+    cfg = make_config(classify_cluster_threshold=90)
+    rows = synthetic_invoices(len(VARIANTS), month="03-2025", seed=8)
+    for r, d in zip(rows, VARIANTS):
+        r["item_description"] = d
+    backend = FakeGeminiBackend(base_latency=0.0, per_item_latency=0.0, jitter=0.0)
+
+    summary = run_pipeline(
+        cfg,
+        "03-2025",
+        dry_run=True,
+        stream=True,
+        page_size=1,
+        prefilter=False,
+        checkpoint=False,
+        bq_client=FakeBigQueryClient(rows),
+        model_backend=backend,
+    )
+
+    with open(summary["local_path"], newline="", encoding="utf-8") as f:
+        out = list(csv.DictReader(f))
+    assert len(out) == len(VARIANTS)
+    assert {r["cluster_representative"] for r in out} == {VARIANTS[0]}
+    assert len({(r["predicted_category"], r["relevance_score"]) for r in out}) == 1
+    assert backend.items_requested == 1
+    assert summary["clustered"] == len(VARIANTS) - 1
+
+
+@pytest.mark.parametrize("threshold", [0.9, 1, 0, 101])
+def test_thresholds_off_the_0_100_scale_are_rejected(threshold, tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        ClusterIndex(threshold)
+    with pytest.raises(ValueError):
+        cluster_descriptions(VARIANTS, threshold)
+
+    monkeypatch.chdir(tmp_path)
+    for key in ("GCP_PROJECT_ID", "GCP_LOCATION", "GEMINI_MODEL", "TABLE_ID", "CATEGORIES_PATH", "GCS_BUCKET", "GCS_OUTPUT_PREFIX"):
+        monkeypatch.setenv(key, "test")
+    monkeypatch.setenv("CLASSIFY_CLUSTER_THRESHOLD", str(threshold))
+    with pytest.raises(RuntimeError, match="CLASSIFY_CLUSTER_THRESHOLD"):
+        load_config()
+    monkeypatch.setenv("CLASSIFY_CLUSTER_THRESHOLD", "90")
+    assert load_config().classify_cluster_threshold == 90
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import pytest
+
+from app import pipeline
+from app.fakes import FakeBigQueryClient, FakeGeminiBackend, synthetic_invoices
+from app.pipeline import run_pipeline
+
+MONTH = "03-2025"
+
+
+def _backend() -> FakeGeminiBackend:
+    return FakeGeminiBackend(base_latency=0.0, per_item_latency=0.0, jitter=0.0)
+
+
+def test_failed_upload_does_not_advance_incremental_state(make_config, tmp_path, monkeypatch):
+    cfg = make_config(checkpoint_uri=str(tmp_path / "checkpoints"))
+    rows = synthetic_invoices(120, month=MONTH, seed=8)
+
+    def run():
+        return run_pipeline(cfg, MONTH, incremental=True, bq_client=FakeBigQueryClient(rows), model_backend=_backend())
+
+    def failing_upload(bucket, blob, path, client=None):
+        raise RuntimeError("upload failed")
+
+    monkeypatch.setattr(pipeline, "upload_to_gcs", failing_upload)
+    with pytest.raises(RuntimeError, match="upload failed"):
+        run()
+
+    monkeypatch.setattr(pipeline, "upload_to_gcs", lambda bucket, blob, path, client=None: f"gs://{bucket}/{blob}")
+    assert run()["incremental_new"] == len(rows)
+    assert run()["incremental_new"] == 0
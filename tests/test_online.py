@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from pathlib import Path
+
+from app.cache import ResultCache
+from app.classifier import GeminiClassifier
+from app.fakes import FakeGeminiBackend
+from app.online import MicroBatcher
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class RecordingCache(ResultCache):
+    """Result cache that records which thread each call ran on."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.threads: list[tuple[str, int]] = []
+
+    def get_many(self, fp, keys):
+        self.threads.append(("get", threading.get_ident()))
+        return super().get_many(fp, keys)
+
+    def put_many(self, fp, results):
+        self.threads.append(("put", threading.get_ident()))
+        return super().put_many(fp, results)
+
+
+def _classifier(backend: FakeGeminiBackend) -> GeminiClassifier:
+    with open(REPO_ROOT / "allowed_categories.json", encoding="utf-8") as f:
+        categories = json.load(f)
+    return GeminiClassifier("test", "local", "fake-gemini", categories, backend=backend)
+
+
+def test_concurrent_requests_share_batches_and_the_cache_stays_off_the_loop(tmp_path):
+    backend = FakeGeminiBackend(base_latency=0.01, per_item_latency=0.0, jitter=0.0)
+    classifier = _classifier(backend)
+    cache = RecordingCache(str(tmp_path / "cache.sqlite"))
+
+    async def main():
+        batcher = MicroBatcher(lambda: classifier, max_batch=16, max_wait=0.05, cache=cache)
+        try:
+            loop_thread = threading.get_ident()
+            requests = [["Copy Paper A4"], ["Bleach 5L", "copy paper a4"], ["Bleach 5L"]]
+            first = await asyncio.gather(*(batcher.classify(r) for r in requests))
+            again = await batcher.classify(["Copy Paper A4", "Bleach 5L"])
+            return loop_thread, first, again
+        finally:
+            await batcher.close()
+
+    try:
+        loop_thread, first, again = asyncio.run(main())
+    finally:
+        classifier.close()
+        cache.close()
+
+    assert backend.calls["batch"] == 1
+    assert first[0][0] == first[1][1]
+    assert first[1][0] == first[2][0]
+    assert again == [first[0][0], first[2][0]]
+    assert {kind for kind, _ in cache.threads} == {"get", "put"}
+    assert all(thread != loop_thread for _, thread in cache.threads)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import csv
+from datetime import datetime
+
+from app import pipeline
+from app.fakes import FakeBigQueryClient, FakeGeminiBackend, synthetic_invoices
+from app.pipeline import run_pipeline
+
+MONTH = "03-2025"
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls(2025, 4, 1, 12, 0, 0)
+
+
+def test_runs_in_the_same_second_write_separate_outputs(make_config, monkeypatch):
+    monkeypatch.setattr(pipeline, "datetime", FrozenDatetime)
+    cfg = make_config()
+    summaries = [
+        run_pipeline(
+            cfg,
+            MONTH,
+            dry_run=True,
+            checkpoint=False,
+            bq_client=FakeBigQueryClient(synthetic_invoices(n, month=MONTH, seed=n)),
+            model_backend=FakeGeminiBackend(base_latency=0.0, per_item_latency=0.0, jitter=0.0),
+        )
+        for n in (30, 40)
+    ]
+
+    paths = [s["local_path"] for s in summaries]
+    assert paths[0] != paths[1]
+    for path, n in zip(paths, (30, 40)):
+        with open(path, newline="", encoding="utf-8") as f:
+            assert len(list(csv.DictReader(f))) == n
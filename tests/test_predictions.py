@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.predictions import PredictionTable
+
+CATEGORIES = ["Bakery", "Seafood", "Stationery"]
+UNIQUE = [
+    {"c1": "Bakery", "s1": 0.91, "c2": "Seafood", "s2": 0.07},
+    {"c1": "Stationery", "s1": 0.333333333, "c2": None, "s2": None},
+    {"c1": None, "s1": None, "c2": None, "s2": None},
+]
+
+
+def test_predictions_round_trip_through_the_columns():
+    table = PredictionTable.from_predictions(CATEGORIES, UNIQUE, [0, 1, 0, 2, 1])
+
+    assert len(table) == 5
+    # Scores come back rounded to SCORE_DECIMALS
+    stationery = {**UNIQUE[1], "s1": 0.333333}
+    assert list(table) == [UNIQUE[0], stationery, UNIQUE[0], UNIQUE[2], stationery]
+    # Rows with the same prediction share one dict
+    rows = list(table)
+    assert rows[0] is rows[2]
+    assert table[3] == UNIQUE[2] and table[-1] == table[1]
+    assert table.missing() == (3, 3)
+
+
+def test_slices_and_positions_share_the_columns():
+    table = PredictionTable.from_predictions(CATEGORIES, UNIQUE, [0, 1, 0, 2, 1])
+
+    part = table[1:3]
+    assert isinstance(part, PredictionTable) and part.c1 is table.c1
+    assert list(part) == [table[1], table[2]]
+    assert list(table.rows([4, 0])) == [table[4], table[0]]
+    assert table.category_codes("c1").tolist() == [0, 2, 0, -1, 2]
+    assert np.isnan(table.scores("s2")).tolist() == [False, True, False, True, True]
+
+
+def test_from_keys_keeps_unknown_labels_and_representatives():
+    lookup = {
+        "rolls": {"c1": "Bakery", "s1": 0.9, "c2": "Seafood", "s2": 0.1, "representative": "bread rolls"},
+        "prawns": {"c1": "Crustaceans", "s1": 0.8, "c2": "Seafood", "s2": 0.2, "representative": None},
+    }
+    table = PredictionTable.from_keys(CATEGORIES, ["prawns", "rolls", "prawns"], lookup)
+
+    assert list(table) == [lookup["prawns"], lookup["rolls"], lookup["prawns"]]
+    assert table.categories[len(CATEGORIES):] == ["Crustaceans"]
+    assert CATEGORIES == ["Bakery", "Seafood", "Stationery"]
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from app.prefilter import KeywordPreClassifier
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def categories():
+    with open(REPO_ROOT / "allowed_categories.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def shipped(categories):
+    return KeywordPreClassifier.from_file(str(REPO_ROOT / "category_keywords.json"), categories)
+
+
+@pytest.mark.parametrize(
+    "description",
+    [
+        "ginger beer",
+        "root beer",
+        "non alcoholic beer",
+        "non-alcoholic beer",
+        "alcohol free lager",
+        "cheese grater",
+        "milk frother",
+        "coconut milk",
+        "almond milk",
+        "lettuce spinner",
+        "apple ipad charger",
+        "salmon oil capsules",
+    ],
+)
+def test_shipped_table_leaves_misleading_items_to_the_model(shipped, description):
+    assert shipped.predict(description) is None
+
+
+@pytest.mark.parametrize("threshold", [0.9, 0.5])
+def test_ambiguous_terms_block_even_single_keyword_matches(categories, threshold):
+    pre = KeywordPreClassifier.from_file(str(REPO_ROOT / "category_keywords.json"), categories, threshold=threshold)
+    for description in ("ginger beer", "coconut milk", "cheese grater", "lettuce spinner", "salmon oil capsules"):
+        assert pre.predict(description) is None
+
+
+def test_default_threshold_needs_two_keywords(categories):
+    table = {"categories": {categories[0]: ["alpha", "beta"]}}
+    pre = KeywordPreClassifier(table, categories)
+    assert pre.predict("alpha") is None
+    assert pre.predict("alpha beta") == {"c1": categories[0], "s1": 0.94, "c2": None, "s2": None}
+    assert KeywordPreClassifier(table, categories, threshold=0.9).predict("alpha")["s1"] == 0.9
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import pytest
+
+from app.resolve import CategoryResolver, _LRU, _norm
+
+CATEGORIES = ["Fruit and Vegetables", "Meat and Poultry", "Seafood", "Cleaning and Janitorial"]
+CODES = ["C01", "C02", "C03", "C04"]
+
+
+@pytest.fixture
+def resolver() -> CategoryResolver:
+    return CategoryResolver(CATEGORIES, CODES, aliases={"produce": "Fruit and Vegetables"}, cache_size=4)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("C02", "Meat and Poultry"),
+        ("c2", "Meat and Poultry"),
+        ("C03: Seafood", "Seafood"),
+        ("C04 - Cleaning and Janitorial", "Cleaning and Janitorial"),
+        ("  meat   &  poultry ", "Meat and Poultry"),
+        ("Fruit Vegetables", "Fruit and Vegetables"),
+        ("PRODUCE", "Fruit and Vegetables"),
+    ],
+)
+def test_aliases_resolve_exactly(resolver, value, expected):
+    assert resolver.resolve(value) == expected
+    assert _norm(value) not in resolver._fuzzy
+
+
+def test_free_text_is_fuzzy_matched_once_and_memoized(resolver, monkeypatch):
+    assert resolver.resolve("sea food") == "Seafood"
+    monkeypatch.setattr("app.resolve.process.extractOne", _fail)
+    assert resolver.resolve("Sea Food ") == "Seafood"
+    # Nothing close enough falls back to the first category
+    monkeypatch.undo()
+    assert resolver.resolve("xyzzy") == "Fruit and Vegetables"
+
+
+def test_prime_scores_a_chunk_in_one_pass(resolver, monkeypatch):
+    resolver.prime(["sea food", "janitorial cleaning", "C01"])
+    monkeypatch.setattr("app.resolve.process.extractOne", _fail)
+    assert resolver.resolve("sea food") == "Seafood"
+    assert resolver.resolve("janitorial cleaning") == "Cleaning and Janitorial"
+
+
+def test_second_best_differs_from_the_first(resolver):
+    assert resolver.second_best("Seafood", hint="Seafood") != "Seafood"
+
+
+def test_unknown_alias_target_is_rejected():
+    with pytest.raises(ValueError, match="not an allowed category"):
+        CategoryResolver(CATEGORIES, CODES, aliases={"fish": "Fish"})
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    lru = _LRU(2)
+    lru.put("a", "1")
+    lru.put("b", "2")
+    assert lru.get("a") == "1"
+    lru.put("c", "3")
+    assert "a" in lru and "c" in lru and "b" not in lru
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError("fuzzy matched again")
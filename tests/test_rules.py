@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from app.rules import CategoryRules
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def categories():
+    with open(REPO_ROOT / "allowed_categories.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _pred(c1, s1=0.8, c2=None, s2=None):
+    return {"c1": c1, "s1": s1, "c2": c2, "s2": s2}
+
+
+def test_longest_keyword_wins_where_keywords_overlap(categories):
+    rules = CategoryRules(
+        {
+            "rules": [
+                {"name": "fish", "keywords": ["fish"], "force": "Seafood"},
+                {"name": "fish-sauce", "keywords": ["fish sauce"], "force": "Food Preparation Ingredients"},
+            ]
+        },
+        categories,
+    )
+    out, hits = rules.apply(
+        {
+            "Thai Fish Sauce 700ml": _pred("Seafood", 0.7),
+            "Fresh fishes 1kg": _pred("Fruit and Vegetables", 0.6),
+        }
+    )
+
+    assert out["Thai Fish Sauce 700ml"] == _pred("Food Preparation Ingredients", 0.9, "Seafood", 0.1)
+    assert out["Fresh fishes 1kg"] == _pred("Seafood", 0.9, "Fruit and Vegetables", 0.1)
+    assert hits == {"fish-sauce": 1, "fish": 1}
+
+
+def test_forbid_swaps_only_with_an_allowed_second_choice(categories):
+    rules = CategoryRules(
+        {"rules": [{"name": "no-food", "keywords": ["glove"], "forbid": ["Meat and Poultry", "Seafood"]}]},
+        categories,
+    )
+    preds = {
+        "nitrile gloves": _pred("Meat and Poultry", 0.6, "Medical Equipment and Supplies", 0.3),
+        "glove box": _pred("Meat and Poultry", 0.6, "Seafood", 0.2),
+        "vinyl glove": _pred("Meat and Poultry", 0.6),
+        "latex glove": _pred("Medical Equipment and Supplies", 0.9, "Meat and Poultry", 0.1),
+    }
+    out, hits = rules.apply(preds)
+
+    assert out["nitrile gloves"] == _pred("Medical Equipment and Supplies", 0.3, "Meat and Poultry", 0.1)
+    # Predictions are never emptied or replaced by another forbidden category
+    for key in ("glove box", "vinyl glove", "latex glove"):
+        assert out[key] is preds[key]
+    assert hits == {"no-food": 1}
+
+
+def test_unless_when_and_unclassified_items_stop_a_rule(categories):
+    rules = CategoryRules(
+        {
+            "rules": [
+                {
+                    "name": "meat",
+                    "keywords": ["chicken"],
+                    "unless": ["stock"],
+                    "when": ["Fruit and Vegetables"],
+                    "force": "Meat and Poultry",
+                }
+            ]
+        },
+        categories,
+    )
+    preds = {
+        "chicken stock 2l": _pred("Fruit and Vegetables"),
+        "chicken thigh": _pred("Prepared Food and Meals"),
+        "chicken wings": _pred(None, None),
+        "chicken breast": _pred("Fruit and Vegetables"),
+    }
+    out, hits = rules.apply(preds)
+
+    assert [k for k in preds if out[k] is not preds[k]] == ["chicken breast"]
+    assert out["chicken breast"]["c1"] == "Meat and Poultry"
+    assert hits == {"meat": 1}
+
+
+def test_rules_run_in_file_order_on_earlier_results(categories):
+    table = {
+        "rules": [
+            {"name": "not-seafood", "keywords": ["tuna"], "forbid": ["Seafood"]},
+            {"name": "seafood", "patterns": [r"\btuna\b"], "force": "Seafood", "score": 0.95},
+        ]
+    }
+    preds = {"tuna in oil": _pred("Seafood", 0.8, "Prepared Food and Meals", 0.2)}
+    out, hits = CategoryRules(table, categories).apply(preds)
+
+    # The swap by the first rule is undone by the second, which sees its result
+    assert out["tuna in oil"] == _pred("Seafood", 0.95, "Prepared Food and Meals", 0.1)
+    assert hits == {"not-seafood": 1, "seafood": 1}
+
+
+@pytest.mark.parametrize(
+    "spec, message",
+    [
+        ({"keywords": ["fish"], "force": "Seafood", "forbid": ["Seafood"]}, "forces a category it forbids"),
+        ({"keywords": ["fish"], "force": "Fish"}, "not in allowed categories"),
+        ({"keywords": ["fish"]}, "must have `force` and/or `forbid`"),
+        ({"force": "Seafood"}, "must have `keywords` and/or `patterns`"),
+        ({"keywords": [""], "force": "Seafood"}, "non-empty strings"),
+        ({"patterns": ["(fish"], "force": "Seafood"}, "Invalid category rule pattern"),
+    ],
+)
+def test_invalid_rules_are_rejected(categories, spec, message):
+    with pytest.raises(ValueError, match=message):
+        CategoryRules({"rules": [dict(spec, name="bad")]}, categories)
+
+
+def test_shipped_rules_file_loads(categories):
+    rules = CategoryRules.from_file(str(REPO_ROOT / "category_rules.json"), categories)
+    out, _ = rules.apply(
+        {
+            "ginger beer 24x375ml": _pred("Nonalcoholic Beverages"),
+            "lager 24x375ml": _pred("Nonalcoholic Beverages", 0.6, "Beer", 0.3),
+        }
+    )
+    assert out["ginger beer 24x375ml"]["c1"] == "Nonalcoholic Beverages"
+    assert out["lager 24x375ml"]["c1"] == "Beer"
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import csv
+import functools
+
+import pytest
+
+from app.cli import main
+from app.fakes import FakeBigQueryClient, FakeGeminiBackend, synthetic_invoices
+from app.pipeline import run_pipeline
+from app.shard import classify_shard, run_sharded, shard_limiter, split_shards
+
+MONTH = "03-2025"
+
+# Picklable, so the spawned shard workers can build their own backend
+BACKEND = functools.partial(FakeGeminiBackend, base_latency=0.0, per_item_latency=0.0, jitter=0.0)
+
+
+def _read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_split_shards_is_stable_and_complete():
+    descriptions = ["Beef Mince", "beef  mince", "Apples", "Bleach", "Apples"]
+    parts = split_shards(descriptions, 3)
+    assert parts == split_shards(descriptions, 3)
+    assert sorted(d for p in parts for d in p) == ["Apples", "Beef Mince", "Bleach"]
+
+
+def test_two_shards_match_an_unsharded_run(make_config):
+    cfg = make_config()
+    rows = synthetic_invoices(600, month=MONTH, seed=3)
+
+    full = run_pipeline(
+        cfg, MONTH, dry_run=True, concurrency=1, checkpoint=False, bq_client=FakeBigQueryClient(rows), model_backend=BACKEND()
+    )
+    sharded = run_sharded(
+        cfg, MONTH, 2, dry_run=True, concurrency=1, bq_client=FakeBigQueryClient(rows), backend_factory=BACKEND
+    )
+
+    assert sharded["total_rows"] == sharded["processed"] == full["processed"] == len(rows)
+    for key in ("missing_scores", "missing_any_field", "cache_hits", "prefilter_hits", "rule_hits"):
+        assert sharded[key] == full[key], key
+    assert len(sharded["shard_runs"]) == 2
+    assert _read(sharded["local_path"]) == _read(full["local_path"])
+
+
+def test_shard_uses_the_result_cache_and_clustering(make_config, tmp_path):
+    cfg = make_config(classify_cache_path=str(tmp_path / "cache.sqlite"), classify_cluster_threshold=90)
+    descriptions = ["Heavy Duty Rubbish Bags 50pk", "Heavy Duty Rubbish Bag 50pk", "Copy Paper A4 500 Sheets"]
+    params = dict(progress_every=1, batch_size=8, concurrency=1, engine="threads", prefilter=False, shards=2)
+
+    first = classify_shard(cfg, descriptions, params, BACKEND)
+    second = classify_shard(cfg, descriptions, params, BACKEND)
+
+    assert first["stats"]["clustered"] == 1
+    assert first["stats"]["cache_hits"] == 0
+    assert second["stats"]["cache_hits"] > 0
+    assert second["results"] == first["results"]
+
+
+def test_shard_limiter_never_drops_a_tight_quota(make_config):
+    limiter = shard_limiter(make_config(gemini_requests_per_minute=3, gemini_tokens_per_minute=5), 4)
+    assert limiter._requests is not None and limiter._requests.rate == pytest.approx(1 / 60)
+    assert limiter._tokens is not None and limiter._tokens.rate == pytest.approx(1 / 60)
+    unlimited = shard_limiter(make_config(), 4)
+    assert unlimited._requests is None and unlimited._tokens is None
+
+
+@pytest.mark.parametrize("flag", [["--no-dedupe"], ["--page-size", "100"], ["--no-checkpoint"], ["--stream"]])
+def test_cli_rejects_options_sharded_runs_ignore(flag):
+    with pytest.raises(SystemExit) as exc:
+        main(["--month", "03-2025", "--shards", "2", *flag])
+    assert exc.value.code == 2